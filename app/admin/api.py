@@ -8,6 +8,7 @@ from app.admin.routers import (
     alerts,
     auth,
     channels,
+    dashboard,
     facturas,
     financials,
     investors,
@@ -32,4 +33,5 @@ router.include_router(facturas.router)
 router.include_router(financials.router)
 router.include_router(investors.router)
 router.include_router(alerts.router)
+router.include_router(dashboard.router)
 router.include_router(tools.router)
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials
 
 from app.admin.deps import _audit, _get_actor, _require_admin, security
+from app.core import live_metrics
 from app.database import get_pool
 
 logger = logging.getLogger(__name__)
@@ -82,7 +83,17 @@ async def mark_alert_read(
         )
         if not alert:
             raise HTTPException(status_code=403)
-    await pool.execute("UPDATE project_alerts SET leida = TRUE WHERE id = $1", alert_id)
+    row = await pool.fetchrow(
+        """UPDATE project_alerts pa SET leida = TRUE
+           WHERE pa.id = $1
+           RETURNING pa.project_id, pa.organization_id""",
+        alert_id,
+    )
+    if row:
+        if row["organization_id"]:
+            live_metrics.touch(row["organization_id"])
+        else:
+            await live_metrics.touch_project(row["project_id"])
     return {"ok": True}
 
 
@@ -97,8 +108,10 @@ async def mark_all_alerts_read(
     pool = await get_pool()
     if project_id:
         await pool.execute("UPDATE project_alerts SET leida = TRUE WHERE project_id = $1 AND leida = FALSE", project_id)
+        await live_metrics.touch_project(project_id)
     elif caller_role == "superadmin":
         await pool.execute("UPDATE project_alerts SET leida = TRUE WHERE leida = FALSE")
+        live_metrics.touch(caller_org)
     else:
         await pool.execute(
             """UPDATE project_alerts SET leida = TRUE
@@ -109,11 +122,11 @@ async def mark_all_alerts_read(
                  )""",
             caller_org,
         )
+        live_metrics.touch(caller_org)
     return {"ok": True}
 
 
 @router.post("/jobs/alerts")
 async def run_alerts_job():
     from app.services.alerts_service import evaluate_alerts
-    created = await evaluate_alerts()
-    return {"alerts_created": created}
+    return await evaluate_alerts()
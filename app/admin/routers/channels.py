@@ -1,4 +1,5 @@
 # app/admin/routers/channels.py
+import asyncio
 import logging
 from typing import Optional
 
@@ -58,6 +59,9 @@ class AgentConfigUpdate(BaseModel):
     model: Optional[str] = None
     max_tokens: Optional[int] = None
     temperature: Optional[float] = None
+    response_cache: Optional[str] = None
+    degradation: Optional[str] = None
+    degraded_ack: Optional[str] = None
 
 
 @router.get("/tenant-channels")
@@ -405,6 +409,9 @@ async def get_agent_config_endpoint(
             "model": "claude-haiku-4-5-20251001",
             "max_tokens": 800,
             "temperature": 0.7,
+            "response_cache": "off",
+            "degradation": "auto",
+            "degraded_ack": None,
         }
     return dict(row)
 
@@ -440,6 +447,10 @@ async def update_agent_config_endpoint(
         raise HTTPException(400, f"model no válido. Opciones: {', '.join(sorted(_ALLOWED_MODELS))}")
     if "max_tokens" in updates and not (100 <= updates["max_tokens"] <= 4096):
         raise HTTPException(400, "max_tokens debe estar entre 100 y 4096")
+    if "response_cache" in updates and updates["response_cache"] not in ("off", "exact", "semantic"):
+        raise HTTPException(400, "response_cache no válido. Opciones: off, exact, semantic")
+    if "degradation" in updates and updates["degradation"] not in ("auto", "off", "forced"):
+        raise HTTPException(400, "degradation no válido. Opciones: auto, off, forced")
 
     set_clause = ", ".join(f"{k} = ${i+2}" for i, k in enumerate(updates))
     values = list(updates.values())
@@ -453,3 +464,51 @@ async def update_agent_config_endpoint(
     )
     logger.info("Agent config updated org=%s fields=%s", target_org, list(updates.keys()))
     return dict(row)
+
+
+@router.get("/agent-config/cache-stats")
+async def get_response_cache_stats(
+    org_id: Optional[str] = None,
+    days: int = 30,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Lead answer cache report: daily lookups, hits, bypassed turns and the
+    generation time saved, plus totals and the current number of entries."""
+    payload = _require_admin(credentials)
+    pool = await get_pool()
+
+    target_org = org_id if (payload.get("role") == "superadmin" and org_id) else payload.get("organization_id")
+    days = max(1, min(days, 365))
+
+    rows, summary = await asyncio.gather(
+        pool.fetch(
+            """SELECT day, lookups, hits, bypassed, saved_ms
+               FROM response_cache_stats
+               WHERE organization_id = $1 AND day > CURRENT_DATE - $2::int
+               ORDER BY day DESC""",
+            target_org, days,
+        ),
+        pool.fetchrow(
+            """SELECT (SELECT response_cache FROM agent_configs WHERE organization_id = $1) AS mode,
+                      (SELECT COUNT(*) FROM response_cache WHERE organization_id = $1) AS entries""",
+            target_org,
+        ),
+    )
+    lookups = sum(r["lookups"] for r in rows)
+    hits = sum(r["hits"] for r in rows)
+    return {
+        "organization_id": target_org,
+        "mode": summary["mode"] or "off",
+        "entries": summary["entries"],
+        "totals": {
+            "lookups": lookups,
+            "hits": hits,
+            "bypassed": sum(r["bypassed"] for r in rows),
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "saved_ms": sum(r["saved_ms"] for r in rows),
+        },
+        "days": [
+            {**dict(r), "hit_rate": round(r["hits"] / r["lookups"], 3) if r["lookups"] else None}
+            for r in rows
+        ],
+    }
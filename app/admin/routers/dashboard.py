@@ -0,0 +1,193 @@
+# app/admin/routers/dashboard.py
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.admin.auth import verify_token
+from app.admin.deps import security
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/dashboard")
+async def get_dashboard(
+    organization_id: Optional[str] = None,
+    include_deleted: bool = False,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """Portfolio overview: lead funnel, unit stats, budget deviation and obra progress
+    for every project of the organization.
+
+    Replaces calling /metrics, /analytics, /financials/{id}/summary and /obra/{id}
+    per project: one query for the project list plus four grouped queries over
+    ANY($1::uuid[]), run concurrently, whatever the number of projects.
+    Superadmins see every project, or one organization via organization_id.
+    """
+    if not credentials:
+        raise HTTPException(status_code=401, detail="No autorizado")
+    payload = verify_token(credentials.credentials)
+    if not payload:
+        raise HTTPException(status_code=401, detail="Token inválido o expirado")
+    if payload.get("role") != "superadmin":
+        organization_id = payload.get("organization_id")
+    pool = await get_pool()
+
+    deleted_clause = "" if include_deleted else "AND deleted_at IS NULL"
+    projects = await pool.fetch(
+        f"""SELECT id, organization_id, name, status, delivery_status, deleted_at
+            FROM projects
+            WHERE ($1::uuid IS NULL OR organization_id = $1) {deleted_clause}
+            ORDER BY name""",
+        organization_id,
+    )
+    if not projects:
+        return {"projects": [], "totals": _totals([])}
+    project_ids = [r["id"] for r in projects]
+
+    lead_rows, unit_rows, budget_rows, obra_rows = await asyncio.gather(
+        pool.fetch(
+            """SELECT project_id,
+                      COUNT(*) AS total,
+                      COUNT(*) FILTER (WHERE score = 'hot') AS hot,
+                      COUNT(*) FILTER (WHERE score = 'warm') AS warm,
+                      COUNT(*) FILTER (WHERE score = 'cold') AS cold,
+                      COUNT(*) FILTER (WHERE created_at >= NOW() - INTERVAL '7 days') AS nuevos_7d
+               FROM leads
+               WHERE project_id = ANY($1::uuid[])
+               GROUP BY project_id""",
+            project_ids,
+        ),
+        pool.fetch(
+            """SELECT project_id,
+                      COUNT(*) AS total,
+                      COUNT(*) FILTER (WHERE status = 'available') AS available,
+                      COUNT(*) FILTER (WHERE status = 'reserved') AS reserved,
+                      COUNT(*) FILTER (WHERE status = 'sold') AS sold,
+                      COALESCE(SUM(price_usd), 0) AS potential_usd,
+                      COALESCE(SUM(price_usd) FILTER (WHERE status = 'reserved'), 0) AS reserved_usd,
+                      COALESCE(SUM(price_usd) FILTER (WHERE status = 'sold'), 0) AS sold_usd
+               FROM units
+               WHERE project_id = ANY($1::uuid[])
+               GROUP BY project_id""",
+            project_ids,
+        ),
+        # Same figures as /financials/{id}/summary
+        pool.fetch(
+            """SELECT p.id AS project_id,
+                      COALESCE(b.presupuesto, 0) AS presupuesto_total_usd,
+                      COALESCE(e.ejecutado, 0) AS ejecutado_usd
+               FROM unnest($1::uuid[]) AS p(id)
+               LEFT JOIN (
+                   SELECT project_id, SUM(monto_usd) AS presupuesto
+                   FROM project_budget
+                   WHERE project_id = ANY($1::uuid[])
+                   GROUP BY project_id
+               ) b ON b.project_id = p.id
+               LEFT JOIN (
+                   SELECT project_id,
+                          SUM(COALESCE(monto_usd, CASE WHEN moneda = 'USD' THEN monto_total ELSE 0 END)) AS ejecutado
+                   FROM facturas
+                   WHERE project_id = ANY($1::uuid[])
+                     AND categoria = 'egreso'
+                     AND deleted_at IS NULL
+                   GROUP BY project_id
+               ) e ON e.project_id = p.id""",
+            project_ids,
+        ),
+        # Same weighting as /obra/{id}: active etapas, weighted by peso_pct
+        pool.fetch(
+            """SELECT e.project_id,
+                      COUNT(*) FILTER (WHERE e.activa) AS etapas,
+                      COUNT(*) FILTER (WHERE e.activa AND e.porcentaje_completado >= 100) AS etapas_completadas,
+                      SUM(e.peso_pct) FILTER (WHERE e.activa) AS peso_total,
+                      SUM(e.peso_pct * e.porcentaje_completado / 100.0) FILTER (WHERE e.activa) AS peso_completado,
+                      (SELECT MAX(u.fecha) FROM obra_updates u WHERE u.project_id = e.project_id) AS ultima_actualizacion
+               FROM obra_etapas e
+               WHERE e.project_id = ANY($1::uuid[])
+               GROUP BY e.project_id""",
+            project_ids,
+        ),
+    )
+
+    leads_by = {r["project_id"]: r for r in lead_rows}
+    units_by = {r["project_id"]: r for r in unit_rows}
+    budget_by = {r["project_id"]: r for r in budget_rows}
+    obra_by = {r["project_id"]: r for r in obra_rows}
+
+    result = []
+    for p in projects:
+        pid = p["id"]
+        leads = leads_by.get(pid)
+        units = units_by.get(pid)
+        budget = budget_by.get(pid)
+        obra = obra_by.get(pid)
+
+        presupuesto = float(budget["presupuesto_total_usd"]) if budget else 0.0
+        ejecutado = float(budget["ejecutado_usd"]) if budget else 0.0
+        revenue = float(units["potential_usd"]) if units else 0.0
+        desvio = ejecutado - presupuesto
+        peso_total = float(obra["peso_total"] or 0) if obra else 0.0
+
+        result.append({
+            "project_id": str(pid),
+            "organization_id": str(p["organization_id"]) if p["organization_id"] else None,
+            "name": p["name"],
+            "status": p["status"],
+            "delivery_status": p["delivery_status"],
+            "deleted_at": p["deleted_at"],
+            "leads": {
+                "total": leads["total"] if leads else 0,
+                "hot": leads["hot"] if leads else 0,
+                "warm": leads["warm"] if leads else 0,
+                "cold": leads["cold"] if leads else 0,
+                "nuevos_7d": leads["nuevos_7d"] if leads else 0,
+            },
+            "units": {
+                "total": units["total"] if units else 0,
+                "available": units["available"] if units else 0,
+                "reserved": units["reserved"] if units else 0,
+                "sold": units["sold"] if units else 0,
+                "potential_usd": revenue,
+                "reserved_usd": float(units["reserved_usd"]) if units else 0.0,
+                "sold_usd": float(units["sold_usd"]) if units else 0.0,
+            },
+            "budget": {
+                "presupuesto_total_usd": presupuesto,
+                "ejecutado_usd": ejecutado,
+                "desvio_usd": desvio,
+                "desvio_pct": round(desvio / presupuesto * 100, 1) if presupuesto else 0.0,
+                "margen_esperado_pct": round((revenue - presupuesto) / revenue * 100, 1) if revenue else 0.0,
+            },
+            "obra": {
+                "progress": round(float(obra["peso_completado"] or 0) / peso_total * 100) if peso_total else 0,
+                "etapas": obra["etapas"] if obra else 0,
+                "etapas_completadas": obra["etapas_completadas"] if obra else 0,
+                "ultima_actualizacion": obra["ultima_actualizacion"] if obra else None,
+            },
+        })
+
+    return {"projects": result, "totals": _totals(result)}
+
+
+def _totals(projects: list[dict]) -> dict:
+    presupuesto = sum(p["budget"]["presupuesto_total_usd"] for p in projects)
+    ejecutado = sum(p["budget"]["ejecutado_usd"] for p in projects)
+    return {
+        "projects": len(projects),
+        "leads": {k: sum(p["leads"][k] for p in projects) for k in ("total", "hot", "warm", "cold", "nuevos_7d")},
+        "units": {
+            k: sum(p["units"][k] for p in projects)
+            for k in ("total", "available", "reserved", "sold", "potential_usd", "reserved_usd", "sold_usd")
+        },
+        "budget": {
+            "presupuesto_total_usd": presupuesto,
+            "ejecutado_usd": ejecutado,
+            "desvio_usd": ejecutado - presupuesto,
+            "desvio_pct": round((ejecutado - presupuesto) / presupuesto * 100, 1) if presupuesto else 0.0,
+        },
+    }
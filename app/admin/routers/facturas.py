@@ -11,6 +11,7 @@ from app.admin.auth import verify_token
 from app.admin.deps import _audit, _get_actor, _require_admin, security
 from app.database import get_pool
 from app.modules.storage import upload_factura_pdf
+from app.services import alerts_service, cashflow_rollup
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -183,7 +184,7 @@ async def create_factura(
                     moneda, categoria, file_url, payment_record_id, reservation_id, estado, notas,
                     etapa_id, budget_id)
                    VALUES ($1,$2,$3,$4,$5,$6,$7,$8,$9,$10,$11,$12,$13,$14,$15,$16,$17,$18,$19,$20,$21)
-                   RETURNING id""",
+                   RETURNING id, fecha_emision""",
                 project_id, body.tipo, body.numero_factura, body.proveedor_nombre,
                 body.supplier_id or None,
                 body.cuit_emisor,
@@ -198,6 +199,9 @@ async def create_factura(
                 await conn.execute(
                     "UPDATE facturas SET estado='vinculada' WHERE id=$1", row["id"]
                 )
+            await cashflow_rollup.refresh_months(conn, project_id, [row["fecha_emision"]])
+    if body.categoria == "egreso" and body.budget_id:
+        alerts_service.check(["DESVIO_PRESUPUESTO"], resource_id=body.budget_id)
     await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="INSERT",
                  table_name="facturas", record_id=str(row["id"]), project_id=project_id,
                  details={"numero_factura": body.numero_factura, "proveedor_nombre": body.proveedor_nombre,
@@ -225,7 +229,24 @@ async def patch_factura(
         return {"ok": True}
     set_clause = ", ".join(f"{k} = ${i+2}" for i, k in enumerate(updates.keys()))
     values = [factura_id] + list(updates.values())
-    await pool.execute(f"UPDATE facturas SET {set_clause} WHERE id = $1 AND deleted_at IS NULL", *values)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                f"""UPDATE facturas f SET {set_clause}
+                    FROM (SELECT id, fecha_emision FROM facturas WHERE id = $1) prev
+                    WHERE f.id = prev.id AND f.deleted_at IS NULL
+                    RETURNING f.project_id, f.fecha_emision, f.budget_id, f.categoria,
+                              prev.fecha_emision AS prev_fecha_emision""",
+                *values,
+            )
+            if row:
+                await cashflow_rollup.refresh_months(
+                    conn, row["project_id"], [row["fecha_emision"], row["prev_fecha_emision"]]
+                )
+    # Deleting or moving spend away from a line can't raise a deviation; only
+    # the line the factura ends up on needs a re-check.
+    if row and row["categoria"] == "egreso" and row["budget_id"]:
+        alerts_service.check(["DESVIO_PRESUPUESTO"], resource_id=row["budget_id"])
     await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="UPDATE",
                  table_name="facturas", record_id=factura_id,
                  details={k: str(v) for k, v in updates.items()})
@@ -239,7 +260,15 @@ async def delete_factura(
 ):
     pool = await get_pool()
     user_id, user_nombre = _get_actor(credentials)
-    await pool.execute("UPDATE facturas SET deleted_at = NOW() WHERE id = $1 AND deleted_at IS NULL", factura_id)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """UPDATE facturas SET deleted_at = NOW() WHERE id = $1 AND deleted_at IS NULL
+                   RETURNING project_id, fecha_emision""",
+                factura_id,
+            )
+            if row:
+                await cashflow_rollup.refresh_months(conn, row["project_id"], [row["fecha_emision"]])
     await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="DELETE",
                  table_name="facturas", record_id=factura_id)
     return {"ok": True}
@@ -10,6 +10,7 @@ from pydantic import BaseModel
 from app.admin.auth import verify_token
 from app.admin.deps import _audit, _get_actor, _require_admin, security
 from app.database import get_pool
+from app.services import cashflow_rollup
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -47,6 +48,13 @@ class BuyerBody(BaseModel):
     signed_at: Optional[str] = None
 
 
+def _month_range(desde: Optional[str], hasta: Optional[str]):
+    try:
+        return cashflow_rollup.parse_month(desde), cashflow_rollup.parse_month(hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de mes inválido (usar YYYY-MM)")
+
+
 @router.get("/cash-flow/{project_id}")
 async def get_cash_flow(
     project_id: str,
@@ -54,93 +62,11 @@ async def get_cash_flow(
     hasta: Optional[str] = None,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ):
-    """Monthly cash flow: ingresos (payment_records) vs egresos (expenses + obra_payments)."""
+    """Monthly cash flow: ingresos (payment_records) vs egresos (facturas), from cashflow_monthly."""
     if not credentials:
         raise HTTPException(status_code=401, detail="No autorizado")
     verify_token(credentials.credentials)
-    pool = await get_pool()
-    # Cobros reales de cuotas (convertidos a USD si es ARS usando tipo_cambio del proyecto)
-    ingresos_rows = await pool.fetch(
-        """SELECT
-             to_char(pr.fecha_pago, 'YYYY-MM') AS mes,
-             SUM(CASE WHEN pr.moneda='USD' THEN pr.monto_pagado
-                      ELSE pr.monto_pagado / COALESCE(fc.tipo_cambio_usd_ars,1) END) AS total
-           FROM payment_records pr
-           JOIN payment_installments pi ON pi.id = pr.installment_id
-           JOIN payment_plans pp ON pp.id = pi.plan_id
-           JOIN reservations r ON r.id = pp.reservation_id
-           LEFT JOIN project_financials_config fc ON fc.project_id = r.project_id
-           WHERE r.project_id = $1 AND pr.deleted_at IS NULL
-             AND ($2::text IS NULL OR to_char(pr.fecha_pago, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(pr.fecha_pago, 'YYYY-MM') <= $3)
-           GROUP BY mes
-           ORDER BY mes""",
-        project_id, desde, hasta,
-    )
-    # Egresos unificados desde facturas
-    egresos_rows = await pool.fetch(
-        """SELECT
-             to_char(f.fecha_emision, 'YYYY-MM') AS mes,
-             SUM(CASE
-               WHEN f.moneda = 'USD' THEN f.monto_total
-               WHEN f.monto_usd IS NOT NULL THEN f.monto_usd
-               ELSE f.monto_total / COALESCE(fc.tipo_cambio_usd_ars, 1)
-             END) AS total
-           FROM facturas f
-           LEFT JOIN project_financials_config fc ON fc.project_id = f.project_id
-           WHERE f.project_id = $1
-             AND f.categoria = 'egreso'
-             AND f.deleted_at IS NULL
-             AND ($2::text IS NULL OR to_char(f.fecha_emision, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(f.fecha_emision, 'YYYY-MM') <= $3)
-           GROUP BY mes
-           ORDER BY mes""",
-        project_id, desde, hasta,
-    )
-    # Proyección: cuotas futuras pendientes/vencidas
-    proyeccion_rows = await pool.fetch(
-        """SELECT
-             to_char(pi.fecha_vencimiento, 'YYYY-MM') AS mes,
-             SUM(CASE WHEN pi.moneda='USD' THEN pi.monto
-                      ELSE pi.monto / COALESCE(fc.tipo_cambio_usd_ars,1) END) AS total
-           FROM payment_installments pi
-           JOIN payment_plans pp ON pp.id = pi.plan_id
-           JOIN reservations r ON r.id = pp.reservation_id
-           LEFT JOIN project_financials_config fc ON fc.project_id = r.project_id
-           WHERE r.project_id = $1
-             AND pi.estado IN ('pendiente','vencido')
-             AND pi.fecha_vencimiento >= CURRENT_DATE
-             AND ($2::text IS NULL OR to_char(pi.fecha_vencimiento, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(pi.fecha_vencimiento, 'YYYY-MM') <= $3)
-           GROUP BY mes
-           ORDER BY mes""",
-        project_id, desde, hasta,
-    )
-    # Merge into unified month buckets
-    meses: dict = {}
-    for r in ingresos_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["ingresos"] += float(r["total"] or 0)
-    for r in egresos_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["egresos"] += float(r["total"] or 0)
-    for r in proyeccion_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["proyeccion"] += float(r["total"] or 0)
-    # Sort and add saldo/acumulado
-    result = sorted(meses.values(), key=lambda x: x["mes"])
-    acumulado = 0.0
-    for row in result:
-        row["saldo"] = round(row["ingresos"] - row["egresos"], 2)
-        acumulado += row["saldo"]
-        row["acumulado"] = round(acumulado, 2)
-        row["ingresos"] = round(row["ingresos"], 2)
-        row["egresos"] = round(row["egresos"], 2)
-        row["proyeccion"] = round(row["proyeccion"], 2)
-    return result
+    return await cashflow_rollup.read_cash_flow([project_id], *_month_range(desde, hasta))
 
 
 @router.get("/movimientos/{project_id}")
@@ -272,82 +198,7 @@ async def get_cash_flow_consolidated(
     if not project_ids:
         return []
 
-    ingresos_rows = await pool.fetch(
-        """SELECT
-             to_char(pr.fecha_pago, 'YYYY-MM') AS mes,
-             SUM(CASE WHEN pr.moneda='USD' THEN pr.monto_pagado
-                      ELSE pr.monto_pagado / COALESCE(fc.tipo_cambio_usd_ars,1) END) AS total
-           FROM payment_records pr
-           JOIN payment_installments pi ON pi.id = pr.installment_id
-           JOIN payment_plans pp ON pp.id = pi.plan_id
-           JOIN reservations r ON r.id = pp.reservation_id
-           LEFT JOIN project_financials_config fc ON fc.project_id = r.project_id
-           WHERE r.project_id = ANY($1::uuid[]) AND pr.deleted_at IS NULL
-             AND ($2::text IS NULL OR to_char(pr.fecha_pago, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(pr.fecha_pago, 'YYYY-MM') <= $3)
-           GROUP BY mes ORDER BY mes""",
-        project_ids, desde, hasta,
-    )
-    egresos_rows = await pool.fetch(
-        """SELECT
-             to_char(f.fecha_emision, 'YYYY-MM') AS mes,
-             SUM(CASE
-               WHEN f.moneda = 'USD' THEN f.monto_total
-               WHEN f.monto_usd IS NOT NULL THEN f.monto_usd
-               ELSE f.monto_total / COALESCE(fc.tipo_cambio_usd_ars, 1)
-             END) AS total
-           FROM facturas f
-           LEFT JOIN project_financials_config fc ON fc.project_id = f.project_id
-           WHERE f.project_id = ANY($1::uuid[])
-             AND f.categoria = 'egreso'
-             AND f.deleted_at IS NULL
-             AND ($2::text IS NULL OR to_char(f.fecha_emision, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(f.fecha_emision, 'YYYY-MM') <= $3)
-           GROUP BY mes ORDER BY mes""",
-        project_ids, desde, hasta,
-    )
-    proyeccion_rows = await pool.fetch(
-        """SELECT
-             to_char(pi.fecha_vencimiento, 'YYYY-MM') AS mes,
-             SUM(CASE WHEN pi.moneda='USD' THEN pi.monto
-                      ELSE pi.monto / COALESCE(fc.tipo_cambio_usd_ars,1) END) AS total
-           FROM payment_installments pi
-           JOIN payment_plans pp ON pp.id = pi.plan_id
-           JOIN reservations r ON r.id = pp.reservation_id
-           LEFT JOIN project_financials_config fc ON fc.project_id = r.project_id
-           WHERE r.project_id = ANY($1::uuid[])
-             AND pi.estado IN ('pendiente','vencido')
-             AND pi.fecha_vencimiento >= CURRENT_DATE
-             AND ($2::text IS NULL OR to_char(pi.fecha_vencimiento, 'YYYY-MM') >= $2)
-             AND ($3::text IS NULL OR to_char(pi.fecha_vencimiento, 'YYYY-MM') <= $3)
-           GROUP BY mes ORDER BY mes""",
-        project_ids, desde, hasta,
-    )
-
-    meses: dict = {}
-    for r in ingresos_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["ingresos"] += float(r["total"] or 0)
-    for r in egresos_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["egresos"] += float(r["total"] or 0)
-    for r in proyeccion_rows:
-        mes = r["mes"]
-        meses.setdefault(mes, {"mes": mes, "ingresos": 0.0, "egresos": 0.0, "proyeccion": 0.0})
-        meses[mes]["proyeccion"] += float(r["total"] or 0)
-
-    result = sorted(meses.values(), key=lambda x: x["mes"])
-    acumulado = 0.0
-    for row in result:
-        row["saldo"] = round(row["ingresos"] - row["egresos"], 2)
-        acumulado += row["saldo"]
-        row["acumulado"] = round(acumulado, 2)
-        row["ingresos"] = round(row["ingresos"], 2)
-        row["egresos"] = round(row["egresos"], 2)
-        row["proyeccion"] = round(row["proyeccion"], 2)
-    return result
+    return await cashflow_rollup.read_cash_flow(project_ids, *_month_range(desde, hasta))
 
 
 @router.get("/cobranza")
@@ -1,22 +1,27 @@
 # app/admin/routers/leads.py
 import asyncio
+import base64
 import logging
+import uuid
+from datetime import datetime, timezone
 from typing import AsyncGenerator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 
 from app.admin.auth import verify_token
 from app.admin.deps import _audit, _get_actor, _require_admin, security
-from app.core.sse import connection_manager
+from app.core import live_metrics
+from app.core.sse import connection_manager, format_sse
 from app.database import get_pool
 from app.modules.handoff.manager import (
     close_handoff_by_lead_id,
     ensure_handoff_for_human_reply,
     get_active_handoff_by_lead_id,
 )
+from app.modules.handoff.registry import handoff_registry
 from app.modules.leads.nurturing import process_nurturing_batch
 from app.modules.whatsapp.sender import send_text_message
 from app.modules.whatsapp.providers.factory import get_provider as _get_channel_provider
@@ -55,13 +60,43 @@ async def run_obra_notifications():
     return {"status": "ok"}
 
 
+_INBOX_SORT = "COALESCE(l.last_message_at, l.last_contact, l.created_at)"
+_INBOX_MAX_LIMIT = 200
+
+
+def _encode_cursor(sort_at: datetime, lead_id) -> str:
+    raw = f"{sort_at.isoformat()}|{lead_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        ts, lead_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), uuid.UUID(lead_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
 @router.get("/leads")
 async def list_leads(
     project_id: str | None = None,
     score: str | None = None,
+    tags: list[str] | None = Query(default=None),
+    handoff: bool | None = None,
+    limit: int | None = Query(default=None, ge=1, le=_INBOX_MAX_LIMIT),
+    cursor: str | None = None,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ):
-    """List leads. Automatically scoped to the caller's organization unless superadmin."""
+    """List leads. Automatically scoped to the caller's organization unless superadmin.
+
+    Reads the denormalized inbox fields on leads (last_message_*, handoff_active),
+    sorted by last activity. Filters: project_id, score, tags (any of), handoff.
+
+    Pagination is opt-in: pass limit (and the returned next_cursor as cursor)
+    to get {"items": [...], "next_cursor": str | null}. Without limit/cursor the
+    full list is returned as before.
+    """
     pool = await get_pool()
     conditions = []
     params = []
@@ -74,14 +109,33 @@ async def list_leads(
         if payload and payload.get("role") != "superadmin":
             org_id = payload.get("organization_id")
             if org_id:
-                conditions.append(f"p.organization_id = ${len(params) + 1}")
+                conditions.append(f"l.organization_id = ${len(params) + 1}")
                 params.append(org_id)
 
     if score:
         conditions.append(f"l.score = ${len(params) + 1}")
         params.append(score)
 
+    if tags:
+        conditions.append(f"l.tags && ${len(params) + 1}::text[]")
+        params.append(tags)
+
+    if handoff is not None:
+        conditions.append(f"l.handoff_active = ${len(params) + 1}")
+        params.append(handoff)
+
+    paginated = limit is not None or cursor is not None
+    if cursor:
+        cursor_at, cursor_id = _decode_cursor(cursor)
+        conditions.append(f"({_INBOX_SORT}, l.id) < (${len(params) + 1}, ${len(params) + 2})")
+        params.extend([cursor_at, cursor_id])
+
     where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_clause = ""
+    if paginated:
+        page_size = limit or 50
+        limit_clause = f"LIMIT ${len(params) + 1}"
+        params.append(page_size + 1)
 
     query = f"""
         SELECT
@@ -89,28 +143,35 @@ async def list_leads(
             l.budget_usd, l.bedrooms, l.location_pref, l.score, l.source,
             l.created_at, l.last_contact, l.tags, l.internal_notes,
             p.name as project_name,
-            EXISTS(
-                SELECT 1 FROM handoffs h
-                WHERE h.lead_id = l.id AND h.status = 'active'
-            ) as handoff_active,
-            lm.content as last_message_preview,
-            lm.created_at as last_message_at,
-            lm.role as last_message_role
+            l.handoff_active,
+            l.last_message_preview,
+            l.last_message_at,
+            l.last_message_role,
+            {_INBOX_SORT} as sort_at
         FROM leads l
         LEFT JOIN projects p ON l.project_id = p.id
-        LEFT JOIN LATERAL (
-            SELECT content, created_at, role
-            FROM conversations
-            WHERE lead_id = l.id
-            ORDER BY created_at DESC
-            LIMIT 1
-        ) lm ON true
         {where_clause}
-        ORDER BY COALESCE(lm.created_at, l.last_contact, l.created_at) DESC NULLS LAST
+        ORDER BY {_INBOX_SORT} DESC NULLS LAST, l.id DESC
+        {limit_clause}
     """
 
     rows = await pool.fetch(query, *params)
-    return [dict(r) for r in rows]
+    items = [dict(r) for r in rows]
+
+    if not paginated:
+        for item in items:
+            item.pop("sort_at", None)
+        return items
+
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        if last["sort_at"] is not None:
+            next_cursor = _encode_cursor(last["sort_at"], last["id"])
+    for item in items:
+        item.pop("sort_at", None)
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.patch("/leads/{lead_id}")
@@ -137,10 +198,12 @@ async def update_lead(
         set_clauses.append(f"{col} = ${i}")
         params.append(value)
 
-    sql = f"UPDATE leads SET {', '.join(set_clauses)} WHERE id = $1 RETURNING id, name, score"
+    sql = f"UPDATE leads SET {', '.join(set_clauses)} WHERE id = $1 RETURNING id, name, score, organization_id"
     row = await pool.fetchrow(sql, *params)
     if not row:
         raise HTTPException(status_code=404, detail=f"Lead {lead_id} not found")
+    if "score" in fields_to_update:
+        live_metrics.touch(row["organization_id"])
 
     logger.info("Lead %s updated: %s", lead_id, list(fields_to_update.keys()))
     return {"updated": list(fields_to_update.keys()), "lead_id": str(row["id"]), "name": row["name"], "score": row["score"]}
@@ -274,9 +337,14 @@ async def get_analytics(
 @router.get("/leads/{lead_id}")
 async def get_lead(
     lead_id: str,
+    include_conversations: bool = True,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ):
-    """Get full lead detail including conversation history."""
+    """Get full lead detail including conversation history.
+
+    Pass include_conversations=false and page the transcript with
+    GET /leads/{lead_id}/messages instead for long-running leads.
+    """
     pool = await get_pool()
     lead = await pool.fetchrow(
         """
@@ -302,6 +370,11 @@ async def get_lead(
             if caller_org and lead_org and caller_org != lead_org:
                 raise HTTPException(status_code=403, detail="No tenés acceso a este lead")
 
+    lead_dict = dict(lead)
+    lead_dict.pop("organization_id", None)
+    if not include_conversations:
+        return lead_dict
+
     conversations = await pool.fetch(
         """
         SELECT id, role, sender_type, content, media_type, created_at
@@ -312,14 +385,132 @@ async def get_lead(
         lead_id,
     )
 
-    lead_dict = dict(lead)
-    lead_dict.pop("organization_id", None)
     return {
         **lead_dict,
         "conversations": [dict(c) for c in conversations],
     }
 
 
+_TRANSCRIPT_MAX_LIMIT = 200
+_TRANSCRIPT_COLUMNS = ("id", "role", "sender_type", "content", "media_type", "media_url", "created_at")
+
+
+def _parse_message_anchor(value: str) -> tuple[str, object]:
+    """A transcript anchor is either a conversations.id (UUID) or an ISO timestamp."""
+    try:
+        return "id", uuid.UUID(value)
+    except ValueError:
+        pass
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Ancla inválida: '{value}' (usar id de mensaje o timestamp ISO)")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return "ts", ts
+
+
+@router.get("/leads/{lead_id}/messages")
+async def get_lead_messages(
+    lead_id: str,
+    before: str | None = None,
+    after: str | None = None,
+    since: str | None = None,
+    limit: int = Query(default=50, ge=1, le=_TRANSCRIPT_MAX_LIMIT),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """Paginated conversation transcript for a lead (oldest → newest in each page).
+
+    - no anchor:     latest `limit` messages
+    - before=<a>:    messages older than anchor a (scroll up)
+    - after=<a>:     messages newer than anchor a (scroll down)
+    - since=<ts|id>: delta sync after an SSE reconnect; same as after, kept as
+                     a separate name so clients can express intent
+
+    Anchors are a message id of this lead (404 otherwise) or an ISO
+    timestamp. Each page is one index range
+    scan on idx_conversations_lead (lead_id, created_at). When an older page runs
+    past the months still in Postgres, it continues transparently from the
+    archived months in object storage (app/services/conversation_archive.py).
+    Returns {"messages": [...], "has_more": bool}.
+    """
+    from app.services.conversation_archive import fetch_archived_messages, find_archived_message
+
+    if sum(x is not None for x in (before, after, since)) > 1:
+        raise HTTPException(status_code=400, detail="Usar solo uno de before, after o since")
+
+    pool = await get_pool()
+    lead = await pool.fetchrow(
+        "SELECT l.id, p.organization_id FROM leads l LEFT JOIN projects p ON l.project_id = p.id WHERE l.id = $1",
+        lead_id,
+    )
+    if not lead:
+        raise HTTPException(status_code=404, detail=f"Lead {lead_id} not found")
+
+    if credentials and credentials.scheme == "Bearer":
+        payload = verify_token(credentials.credentials)
+        if payload and payload.get("role") != "superadmin":
+            caller_org = payload.get("organization_id")
+            lead_org = str(lead["organization_id"]) if lead["organization_id"] else None
+            if caller_org and lead_org and caller_org != lead_org:
+                raise HTTPException(status_code=403, detail="No tenés acceso a este lead")
+
+    anchor = before or after or since
+    newer = before is None and anchor is not None
+    # Keyset bound as (created_at, id); id is None for timestamp anchors.
+    anchor_key: tuple[datetime, str | None] | None = None
+    if anchor is not None:
+        kind, value = _parse_message_anchor(anchor)
+        if kind == "id":
+            ts = await pool.fetchval(
+                "SELECT created_at FROM conversations WHERE id = $1 AND lead_id = $2", value, lead_id,
+            )
+            if ts is None:
+                archived = await find_archived_message(lead_id, str(value))
+                if archived is None:
+                    raise HTTPException(status_code=404, detail=f"Mensaje {value} no encontrado para este lead")
+                ts = archived["created_at"]
+            anchor_key = (ts, str(value))
+        else:
+            anchor_key = (value, None)
+
+    params: list = [lead_id, limit + 1]
+    anchor_clause = ""
+    if anchor_key is not None:
+        op = ">" if newer else "<"
+        params.append(anchor_key[0])
+        if anchor_key[1] is None:
+            anchor_clause = f"AND created_at {op} $3"
+        else:
+            params.append(anchor_key[1])
+            anchor_clause = f"AND (created_at, id) {op} ($3, $4::uuid)"
+
+    order = "ASC" if newer else "DESC"
+    rows = await pool.fetch(
+        f"""
+        SELECT {", ".join(_TRANSCRIPT_COLUMNS)}
+        FROM conversations
+        WHERE lead_id = $1 {anchor_clause}
+        ORDER BY created_at {order}, id {order}
+        LIMIT $2
+        """,
+        *params,
+    )
+
+    messages = [dict(r) for r in rows]
+    if not newer and len(messages) <= limit:
+        # Live months exhausted: continue into the archive, older than what we have.
+        bound = (messages[-1]["created_at"], str(messages[-1]["id"])) if messages else anchor_key
+        older = await fetch_archived_messages(lead_id, limit + 1 - len(messages), before=bound)
+        messages.extend({k: m.get(k) for k in _TRANSCRIPT_COLUMNS} for m in older)
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not newer:
+        messages.reverse()
+    return {"messages": messages, "has_more": has_more}
+
+
 class SendMessageRequest(BaseModel):
     content: str
 
@@ -359,7 +550,7 @@ async def start_lead_handoff(
                     status_code=409,
                     detail="Esta conversación ya fue tomada por otro agente.",
                 )
-            lead = await conn.fetchrow("SELECT project_id FROM leads WHERE id = $1", lead_id)
+            lead = await conn.fetchrow("SELECT project_id, phone FROM leads WHERE id = $1", lead_id)
             if not lead:
                 raise HTTPException(status_code=404, detail=f"Lead {lead_id} not found")
             handoff = await conn.fetchrow(
@@ -371,8 +562,13 @@ async def start_lead_handoff(
                 lead_id,
                 str(lead["project_id"]),
             )
+            lead_org = await conn.fetchval(
+                "UPDATE leads SET handoff_active = TRUE WHERE id = $1 RETURNING organization_id", lead_id,
+            )
+            live_metrics.touch(lead_org)
 
     handoff_dict = dict(handoff)
+    await handoff_registry.mark_active(lead["phone"])
     logger.info("Handoff started (atomic) for lead %s", lead_id)
 
     # Broadcast to all connected admins of this tenant
@@ -439,20 +635,27 @@ async def send_lead_message(
 
     await ensure_handoff_for_human_reply(lead_id)
 
-    # Guardamos en bd
+    # Guardamos en bd y actualizamos el ultimo contacto + campos del inbox
     conv = await pool.fetchrow(
         """
-        INSERT INTO conversations (lead_id, role, sender_type, content)
-        VALUES ($1, 'assistant', 'human', $2)
-        RETURNING id, created_at
+        WITH c AS (
+            INSERT INTO conversations (lead_id, role, sender_type, content)
+            VALUES ($1, 'assistant', 'human', $2)
+            RETURNING id, created_at
+        )
+        UPDATE leads
+        SET last_contact = NOW(),
+            last_message_at = c.created_at,
+            last_message_preview = LEFT($2, 280),
+            last_message_role = 'assistant'
+        FROM c
+        WHERE leads.id = $1
+        RETURNING c.id, c.created_at
         """,
         lead_id, request.content
     )
 
-    # Actualizamos el ultimo contacto y la actividad del handoff (para el timeout de 4h)
-    await pool.execute(
-        "UPDATE leads SET last_contact = NOW() WHERE id = $1", lead_id
-    )
+    # Actualizamos la actividad del handoff (para el timeout de 4h)
     await pool.execute(
         """
         UPDATE handoffs SET last_activity_at = NOW()
@@ -506,22 +709,35 @@ async def send_lead_message(
     return {"status": "ok"}
 
 
-async def _sse_generator(tenant_id: str) -> AsyncGenerator[str, None]:
+async def _sse_generator(tenant_id: str, last_event_id: Optional[int] = None) -> AsyncGenerator[str, None]:
     """Async generator that yields SSE-formatted strings for a single connection.
 
     Keeps the connection alive with a ping every 20 seconds. Render's idle
     connection timeout is ~55s, so 20s gives a comfortable margin.
 
+    The stream opens with a `metrics` snapshot (no id), then events missed
+    since `last_event_id` are replayed (see
+    SSEConnectionManager.connect). If the queue had to drop events because the
+    client fell behind, a `resync` event is sent so it refetches the inbox.
+
     If the client disconnects (browser tab closed, network drop), FastAPI will
     cancel this generator; we clean up in the finally block.
     """
-    queue = connection_manager.connect(tenant_id)
+    queue = connection_manager.connect(tenant_id, last_event_id)
     try:
+        try:
+            yield format_sse(live_metrics.METRICS_EVENT, await live_metrics.snapshot(tenant_id))
+        except Exception as e:
+            logger.warning("SSE metrics snapshot failed for tenant=%s: %s", tenant_id, e)
         while True:
             try:
                 # Wait up to 20s for an event; if none arrives, send a ping
-                message = await asyncio.wait_for(queue.get(), timeout=20.0)
-                yield message
+                ev = await asyncio.wait_for(queue.get(), timeout=20.0)
+                if queue.dropped:
+                    logger.warning("SSE client behind: tenant=%s dropped=%d", tenant_id, queue.dropped)
+                    yield f"event: resync\ndata: {{\"dropped\": {queue.dropped}}}\n\n"
+                    queue.dropped = 0
+                yield ev.message
             except asyncio.TimeoutError:
                 yield "event: ping\ndata: {}\n\n"
     except (asyncio.CancelledError, GeneratorExit):
@@ -533,6 +749,8 @@ async def _sse_generator(tenant_id: str) -> AsyncGenerator[str, None]:
 @router.get("/inbox/stream")
 async def inbox_stream(
     token: Optional[str] = Query(default=None),
+    last_event_id: Optional[str] = Query(default=None),
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ):
     """SSE endpoint — streams real-time inbox events to connected admins.
@@ -542,9 +760,18 @@ async def inbox_stream(
     - ?token=<token>                 query param (EventSource browser API, which
       does not support custom headers natively)
 
-    Events emitted:
+    Resuming: send the last received id as the Last-Event-ID header (EventSource
+    does it automatically on reconnect) or ?last_event_id=. Missed events are
+    replayed from the tenant's ring buffer; if they are no longer available the
+    stream starts with a `resync` event.
+
+    Events emitted (all but ping/resync carry an `id:`):
     - event: message       — new WhatsApp message received or sent
-    - event: handoff_update — HITL state changed for a lead
+    - event: handoff_update — HITL state changed for a lead (coalesced per lead)
+    - event: metrics       — tenant dashboard counters (leads by score, units by
+                             status, unread alerts, active handoffs); a snapshot
+                             is sent on connect, then on every change
+    - event: resync        — events were lost; refetch the inbox
     - event: ping          — keepalive (every 20s, ignore in client)
     """
     raw_token = token or (credentials.credentials if credentials else None)
@@ -556,8 +783,16 @@ async def inbox_stream(
     if not tenant_id:
         raise HTTPException(status_code=403, detail="Token sin organization_id")
 
+    resume_from: Optional[int] = None
+    raw_last_id = last_event_id_header or last_event_id
+    if raw_last_id:
+        try:
+            resume_from = int(raw_last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Last-Event-ID inválido: '{raw_last_id}'")
+
     return StreamingResponse(
-        _sse_generator(tenant_id),
+        _sse_generator(tenant_id, resume_from),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
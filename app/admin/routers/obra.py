@@ -11,6 +11,7 @@ from app.admin.deps import _audit, _get_actor, _require_admin, security
 from app.database import get_pool
 from app.modules.obra.notifier import notify_buyers_of_update
 from app.modules.storage import upload_obra_foto
+from app.services import alerts_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -174,6 +175,7 @@ async def patch_etapa(etapa_id: str, request: Request):
     )
     if not row:
         raise HTTPException(status_code=404, detail="Etapa not found")
+    alerts_service.check(["OBRA_ETAPA_ATRASADA"], resource_id=etapa_id)
     return dict(row)
 
 
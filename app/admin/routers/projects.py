@@ -1,5 +1,8 @@
 # app/admin/routers/projects.py
+import io
 import logging
+import uuid
+from decimal import Decimal, InvalidOperation
 from typing import Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
@@ -7,9 +10,11 @@ from fastapi.security import HTTPAuthorizationCredentials
 
 from app.admin.auth import verify_token
 from app.admin.deps import _audit, _get_actor, _require_admin, security
+from app.core import live_metrics
 from app.database import get_pool
-from app.modules.project_loader import parse_project_csv, create_project_from_parsed, build_summary
+from app.modules.project_loader import load_project_csv
 from app.modules.storage import upload_file
+from app.services import alerts_service
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -127,6 +132,8 @@ async def update_project(project_id: str, request: Request):
     if not row:
         raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
 
+    if fields_to_update.keys() & {"construction_start", "estimated_delivery"}:
+        alerts_service.check(["OBRA_ETAPA_ATRASADA"], project_id=project_id)
     logger.info("Project %s updated: %s", row["name"], list(fields_to_update.keys()))
     return {"updated": list(fields_to_update.keys()), "project_id": str(row["id"]), "project_name": row["name"]}
 
@@ -140,6 +147,8 @@ async def delete_project(project_id: str, credentials: Optional[HTTPAuthorizatio
         project_id,
     )
     deleted = result.split()[-1] != "0"
+    if deleted:
+        await live_metrics.touch_project(project_id)
     return {"deleted": deleted}
 
 
@@ -152,6 +161,8 @@ async def restore_project(project_id: str, credentials: Optional[HTTPAuthorizati
         project_id,
     )
     restored = result.split()[-1] != "0"
+    if restored:
+        await live_metrics.touch_project(project_id)
     return {"restored": restored}
 
 
@@ -194,12 +205,7 @@ async def list_units(project_id: str):
     pool = await get_pool()
     rows = await pool.fetch(
         """
-        SELECT u.id, u.identifier, u.floor, u.bedrooms, u.area_m2, u.price_usd,
-               CASE
-                 WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
-                 WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'active')    THEN 'reserved'
-                 ELSE 'available'
-               END AS status
+        SELECT u.id, u.identifier, u.floor, u.bedrooms, u.area_m2, u.price_usd, u.status
         FROM units u
         WHERE u.project_id = $1
         ORDER BY u.floor, u.identifier
@@ -209,6 +215,126 @@ async def list_units(project_id: str):
     return [dict(r) for r in rows]
 
 
+@router.patch("/units/bulk-status")
+async def bulk_update_unit_status(request: Request):
+    """Update status (and optionally price) for multiple units in one statement.
+
+    Body: {"units": [{"id": "uuid", "status": "reserved", "price_usd": 120000}, ...]}
+
+    Every item is validated up front; valid items are applied together with a
+    single UPDATE ... FROM unnest(...) inside a transaction, so the batch either
+    applies fully or not at all. Price changes are written to unit_field_history
+    in the same statement, and units set to 'available' get their active
+    reservation cancelled (same rule as PATCH /units/{id}/status).
+    Returns one result per input item, in input order.
+
+    Registered before the /units/{unit_id} routes so "bulk-status" is not
+    taken for a unit id.
+    """
+    pool = await get_pool()
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Body must be an object with a 'units' list")
+    updates = body.get("units", [])
+    if not isinstance(updates, list):
+        raise HTTPException(status_code=400, detail="'units' must be a list")
+
+    results: list[dict] = []
+    valid: dict[uuid.UUID, tuple[Optional[str], Optional[Decimal]]] = {}
+    for item in updates:
+        if not isinstance(item, dict):
+            results.append({"id": None, "error": "item must be an object"})
+            continue
+        uid = item.get("id")
+        try:
+            unit_uuid = uuid.UUID(str(uid))
+        except ValueError:
+            results.append({"id": uid, "error": "invalid id"})
+            continue
+
+        raw_status = item.get("status")
+        if raw_status is not None and not isinstance(raw_status, str):
+            results.append({"id": uid, "error": "Invalid status"})
+            continue
+        new_status = (raw_status or "").lower() or None
+        if new_status is not None and new_status not in VALID_UNIT_STATUSES:
+            results.append({"id": uid, "error": f"Invalid status '{new_status}'"})
+            continue
+
+        new_price = None
+        if item.get("price_usd") is not None:
+            try:
+                new_price = Decimal(str(item["price_usd"]))
+            except InvalidOperation:
+                results.append({"id": uid, "error": "Invalid price_usd"})
+                continue
+            if not new_price.is_finite() or new_price < 0:
+                results.append({"id": uid, "error": "Invalid price_usd"})
+                continue
+
+        if new_status is None and new_price is None:
+            results.append({"id": uid, "error": "Nothing to update"})
+            continue
+
+        # Last occurrence wins if the same unit is sent twice
+        valid[unit_uuid] = (new_status, new_price)
+        results.append({"id": uid, "_key": unit_uuid})
+
+    rows_by_id: dict[uuid.UUID, dict] = {}
+    if valid:
+        ids = list(valid)
+        statuses = [valid[i][0] for i in ids]
+        prices = [valid[i][1] for i in ids]
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    """
+                    WITH input AS (
+                        SELECT * FROM unnest($1::uuid[], $2::text[], $3::numeric[])
+                            AS t(id, status, price_usd)
+                    ),
+                    prev AS (
+                        SELECT u.id, u.price_usd FROM units u JOIN input i ON i.id = u.id
+                    ),
+                    upd AS (
+                        UPDATE units u
+                        SET status    = COALESCE(i.status, u.status),
+                            price_usd = COALESCE(i.price_usd, u.price_usd)
+                        FROM input i
+                        WHERE u.id = i.id
+                        RETURNING u.id, u.identifier, u.project_id, u.status, u.price_usd
+                    ),
+                    history AS (
+                        INSERT INTO unit_field_history (unit_id, field, old_value, new_value)
+                        SELECT upd.id, 'price_usd', prev.price_usd, upd.price_usd
+                        FROM upd JOIN prev ON prev.id = upd.id
+                        WHERE upd.price_usd IS DISTINCT FROM prev.price_usd
+                          AND upd.price_usd IS NOT NULL
+                    ),
+                    cancelled AS (
+                        UPDATE reservations r
+                        SET status = 'cancelled', updated_at = NOW()
+                        FROM upd
+                        WHERE r.unit_id = upd.id AND upd.status = 'available' AND r.status = 'active'
+                    )
+                    SELECT id, identifier, project_id, status, price_usd FROM upd
+                    """,
+                    ids, statuses, prices,
+                )
+        rows_by_id = {r["id"]: dict(r) for r in rows}
+        logger.info("Bulk unit update: %d requested, %d applied", len(ids), len(rows_by_id))
+        for project_id in {r["project_id"] for r in rows}:
+            await live_metrics.touch_project(project_id)
+
+    for i, res in enumerate(results):
+        key = res.pop("_key", None)
+        if key is None:
+            continue
+        results[i] = rows_by_id.get(key) or {"id": res["id"], "error": "not found"}
+
+    return {"updated": results}
+
+
 @router.patch("/units/{unit_id}/status")
 async def update_unit_status(unit_id: str, request: Request):
     """Update the status of a unit.
@@ -233,7 +359,7 @@ async def update_unit_status(unit_id: str, request: Request):
                 raise HTTPException(status_code=404, detail=f"Unit {unit_id} not found")
 
             # When reverting to available, cancel any active reservation so the
-            # derived status query (which reads from reservations) stays in sync.
+            # stored status and the reservations table stay in sync.
             if new_status == "available":
                 await conn.execute(
                     "UPDATE reservations SET status = 'cancelled', updated_at = NOW() WHERE unit_id = $1 AND status = 'active'",
@@ -241,6 +367,7 @@ async def update_unit_status(unit_id: str, request: Request):
                 )
 
     logger.info("Unit %s (%s) status changed to %s", row["identifier"], unit_id, new_status)
+    await live_metrics.touch_project(row["project_id"])
     return dict(row)
 
 
@@ -292,35 +419,6 @@ async def get_unit_history(unit_id: str):
     return [dict(r) for r in rows]
 
 
-@router.patch("/units/bulk-status")
-async def bulk_update_unit_status(request: Request):
-    """Update status for multiple units at once.
-
-    Body: {"units": [{"id": "uuid", "status": "reserved"}, ...]}
-    """
-    pool = await get_pool()
-    body = await request.json()
-    updates = body.get("units", [])
-    results = []
-
-    for item in updates:
-        uid = item.get("id")
-        new_status = item.get("status", "").lower()
-        if new_status not in VALID_UNIT_STATUSES:
-            results.append({"id": uid, "error": f"Invalid status '{new_status}'"})
-            continue
-        row = await pool.fetchrow(
-            "UPDATE units SET status = $1 WHERE id = $2 RETURNING id, identifier, status",
-            new_status, uid,
-        )
-        if row:
-            results.append(dict(row))
-        else:
-            results.append({"id": uid, "error": "not found"})
-
-    return {"updated": results}
-
-
 @router.get("/project-template")
 async def get_project_template():
     """Return info about how to download the CSV template."""
@@ -382,32 +480,45 @@ async def download_project_template():
 async def load_project_from_csv(
     developer_id: str = Form(...),  # maps to organization_id in DB
     csv_file: UploadFile = File(...),
+    dry_run: bool = Form(False),
 ):
-    """Parse a CSV file and create a project with units."""
-    content = await csv_file.read()
+    """Parse a CSV file and create a project with units.
 
-    parsed = parse_project_csv(content)
+    The upload is read without blocking the event loop, then parsed row by row
+    and loaded atomically (COPY into a staging table + merge). With
+    dry_run=true the CSV is only validated and summarized.
+    """
+    try:
+        text = (await csv_file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+    result = await load_project_csv(developer_id, io.StringIO(text, newline=""), dry_run=dry_run)
 
-    if not parsed["project"] or not parsed["project"].get("name"):
-        return {"ok": False, "errors": parsed["errors"]}
+    if not result["project"] or not result["project"].get("name"):
+        return {"ok": False, "errors": result["errors"]}
 
-    if parsed["errors"]:
+    if result["errors"]:
         return {
             "ok": False,
-            "summary": build_summary(parsed),
-            "errors": parsed["errors"],
+            "summary": result["stats"],
+            "errors": result["errors"],
             "message": "El CSV tiene errores. Revisá y volvé a subir.",
         }
 
-    result = await create_project_from_parsed(developer_id, parsed)
-
-    if result.get("error"):
-        return {"ok": False, "error": result["error"]}
+    if dry_run:
+        return {
+            "ok": True,
+            "dry_run": True,
+            "project_name": result["project"]["name"],
+            "slug": result["project"]["slug"],
+            "summary": result["stats"],
+        }
 
+    live_metrics.touch(developer_id)
     return {
         "ok": True,
         "project_id": result["project_id"],
-        "project_name": result["project_name"],
-        "slug": result["slug"],
+        "project_name": result["project"]["name"],
+        "slug": result["project"]["slug"],
         "units_created": result["units_created"],
     }
@@ -3,6 +3,7 @@ import logging
 import secrets
 import string
 from datetime import datetime
+from decimal import Decimal
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request
@@ -11,11 +12,16 @@ from pydantic import BaseModel
 
 from app.admin.auth import hash_password, verify_token
 from app.admin.deps import _audit, _get_actor, _require_admin, security
+from app.core import live_metrics
 from app.database import get_pool
+from app.services import alerts_service, cashflow_rollup
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Alert rules an installment's estado, monto or due date can trigger
+_CUOTA_ALERTS = ("CUOTA_VENCIDA", "CUOTA_PROXIMA")
+
 
 class ReservationBody(BaseModel):
     unit_id: str
@@ -74,6 +80,31 @@ class UpdatePaymentRecordBody(BaseModel):
     notas: Optional[str] = None
 
 
+async def _sync_unit_status(conn, unit_id) -> None:
+    """Recompute units.status from the unit's reservations.
+
+    units.status is the single stored source of truth read by the units grid,
+    the agent context, analytics and reports. Every reservation write in this
+    router calls this inside its transaction so the stored value never drifts
+    from the reservations table. Status changes also refresh the live
+    dashboard counters.
+    """
+    row = await conn.fetchrow(
+        """WITH prev AS (SELECT status FROM units WHERE id = $1)
+           UPDATE units u SET status = CASE
+               WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
+               WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'active')    THEN 'reserved'
+               ELSE 'available'
+           END
+           FROM prev
+           WHERE u.id = $1
+           RETURNING u.project_id, u.status, prev.status AS old_status""",
+        unit_id,
+    )
+    if row and row["status"] != row["old_status"]:
+        await live_metrics.touch_project(row["project_id"])
+
+
 async def _auto_create_seña(
     conn,
     reservation_id: str,
@@ -127,11 +158,12 @@ async def _auto_create_seña(
            VALUES ($1, $2, $3, 'USD', $4)""",
         installment_id, fecha, amount_usd, metodo,
     )
+    await cashflow_rollup.refresh_for_installment(conn, installment_id, [fecha])
 
 
 @router.post("/reservations/{project_id}/direct-sale")
 async def create_direct_sale(project_id: str, body: ReservationBody):
-    """Create a reservation already converted (direct sale). Atomic: unit → sold + reservation → converted + buyer created."""
+    """Create a reservation already converted (direct sale). Atomic: reservation → converted + unit → sold + buyer created."""
     pool = await get_pool()
 
     unit = await pool.fetchrow(
@@ -154,10 +186,7 @@ async def create_direct_sale(project_id: str, body: ReservationBody):
 
     async with pool.acquire() as conn:
         async with conn.transaction():
-            # 1. Mark unit as sold
-            await conn.execute("UPDATE units SET status = 'sold' WHERE id = $1", str(unit["id"]))
-
-            # 2. Create reservation already converted
+            # 1. Create reservation already converted
             res = await conn.fetchrow(
                 """INSERT INTO reservations
                    (project_id, unit_id, lead_id, buyer_name, buyer_phone, buyer_email,
@@ -170,6 +199,9 @@ async def create_direct_sale(project_id: str, body: ReservationBody):
             )
             reservation_id = str(res["id"])
 
+            # 2. Mark unit as sold
+            await _sync_unit_status(conn, str(unit["id"]))
+
             # Auto-create señal payment record if amount provided
             await _auto_create_seña(
                 conn,
@@ -196,7 +228,7 @@ async def create_reservation(
     body: ReservationBody,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
 ):
-    """Create a reservation for a unit. Also marks the unit as 'reserved' if it was 'available'."""
+    """Create a reservation for a unit. Also marks the unit as 'reserved'."""
     pool = await get_pool()
     user_id, user_nombre = _get_actor(credentials)
 
@@ -219,12 +251,6 @@ async def create_reservation(
 
     async with pool.acquire() as conn:
         async with conn.transaction():
-            if unit["status"] == "available":
-                await conn.execute(
-                    "UPDATE units SET status = 'reserved' WHERE id = $1",
-                    body.unit_id,
-                )
-
             signed_at_val = (
                 datetime.strptime(body.signed_at, "%Y-%m-%d").date()
                 if body.signed_at else None
@@ -244,6 +270,7 @@ async def create_reservation(
                 body.amount_usd, body.payment_method, body.notes,
                 signed_at_val,
             )
+            await _sync_unit_status(conn, body.unit_id)
 
             # Auto-create señal payment record if amount provided
             await _auto_create_seña(
@@ -393,16 +420,9 @@ async def patch_reservation(
                 body.status, reservation_id,
             )
 
-            if body.status == "cancelled":
-                await conn.execute(
-                    "UPDATE units SET status = 'available' WHERE id = $1",
-                    unit_id,
-                )
-            elif body.status == "converted":
-                await conn.execute(
-                    "UPDATE units SET status = 'sold' WHERE id = $1",
-                    unit_id,
-                )
+            await _sync_unit_status(conn, unit_id)
+
+            if body.status == "converted":
                 # Register buyer using reservation data
                 res_data = await conn.fetchrow(
                     "SELECT project_id, lead_id, buyer_name, buyer_phone, signed_at FROM reservations WHERE id = $1",
@@ -458,69 +478,114 @@ async def get_payment_plan(reservation_id: str):
 
 @router.post("/payment-plans/{reservation_id}")
 async def create_payment_plan(reservation_id: str, body: PaymentPlanBody):
-    """Create a payment plan with installments for a reservation."""
+    """Create (or rebuild) a payment plan with installments for a reservation.
+
+    The whole rebuild runs as one statement, so latency does not grow with the
+    number of cuotas: the old plan is deleted (cascading to installments and
+    records), the new installments are inserted from unnest() arrays, and paid
+    records of the old plan are re-attached in SQL. Matching is by
+    (concepto, monto): the n-th new installment with a given key gets the n-th
+    paid record that had that key.
+    """
     pool = await get_pool()
 
     # Check reservation exists
-    res = await pool.fetchrow("SELECT id FROM reservations WHERE id = $1", reservation_id)
+    res = await pool.fetchrow("SELECT id, project_id FROM reservations WHERE id = $1", reservation_id)
     if not res:
         raise HTTPException(status_code=404, detail="Reserva no encontrada")
 
+    insts = body.installments
+    fechas_vencimiento = [datetime.strptime(i.fecha_vencimiento, "%Y-%m-%d").date() for i in insts]
     async with pool.acquire() as conn:
         async with conn.transaction():
-            # Snapshot paid installments before deleting — keyed by (concepto, monto)
-            paid_records = await conn.fetch(
-                """SELECT pi.concepto, pi.monto, pr.fecha_pago, pr.monto_pagado,
-                          pr.moneda, pr.metodo_pago, pr.referencia, pr.notas
-                   FROM payment_plans pp
-                   JOIN payment_installments pi ON pi.plan_id = pp.id
-                   JOIN payment_records pr ON pr.installment_id = pi.id AND pr.deleted_at IS NULL
-                   WHERE pp.reservation_id = $1 AND pi.estado = 'pagado'""",
+            # Months of the plan being replaced (re-attached records keep their fecha_pago)
+            old_dates = await conn.fetchval(
+                """SELECT array_agg(DISTINCT d) FROM (
+                       SELECT pi.fecha_vencimiento AS d
+                       FROM payment_plans pp
+                       JOIN payment_installments pi ON pi.plan_id = pp.id
+                       WHERE pp.reservation_id = $1
+                       UNION ALL
+                       SELECT pr.fecha_pago
+                       FROM payment_plans pp
+                       JOIN payment_installments pi ON pi.plan_id = pp.id
+                       JOIN payment_records pr ON pr.installment_id = pi.id
+                       WHERE pp.reservation_id = $1
+                   ) s""",
                 reservation_id,
             )
-            paid_map: dict[tuple, list] = {}
-            for r in paid_records:
-                key = (r["concepto"], float(r["monto"]))
-                paid_map.setdefault(key, []).append(r)
-
-            # Delete existing plan (cascades to installments + records)
-            await conn.execute(
-                "DELETE FROM payment_plans WHERE reservation_id = $1", reservation_id
-            )
-
-            plan = await conn.fetchrow(
-                """INSERT INTO payment_plans
-                   (reservation_id, descripcion, moneda_base, monto_total, tipo_ajuste, porcentaje_ajuste)
-                   VALUES ($1,$2,$3,$4,$5,$6) RETURNING id""",
+            row = await conn.fetchrow(
+                """
+                WITH paid AS (
+                    SELECT pi.concepto, pi.monto, pr.fecha_pago, pr.monto_pagado,
+                           pr.moneda, pr.metodo_pago, pr.referencia, pr.notas,
+                           row_number() OVER (
+                               PARTITION BY pi.concepto, pi.monto
+                               ORDER BY pi.numero_cuota, pr.created_at
+                           ) AS rn
+                    FROM payment_plans pp
+                    JOIN payment_installments pi ON pi.plan_id = pp.id
+                    JOIN payment_records pr ON pr.installment_id = pi.id AND pr.deleted_at IS NULL
+                    WHERE pp.reservation_id = $1 AND pi.estado = 'pagado'
+                ),
+                old_plan AS (
+                    DELETE FROM payment_plans WHERE reservation_id = $1
+                ),
+                plan AS (
+                    INSERT INTO payment_plans
+                        (reservation_id, descripcion, moneda_base, monto_total, tipo_ajuste, porcentaje_ajuste)
+                    VALUES ($1, $2, $3, $4, $5, $6)
+                    RETURNING id
+                ),
+                new_inst AS MATERIALIZED (
+                    SELECT gen_random_uuid() AS id, t.numero_cuota,
+                           t.concepto::installment_concepto AS concepto, t.monto,
+                           t.moneda::payment_moneda AS moneda, t.fecha_vencimiento, t.notas,
+                           row_number() OVER (PARTITION BY t.concepto, t.monto ORDER BY t.ord) AS rn
+                    FROM unnest($7::int[], $8::text[], $9::numeric[], $10::text[], $11::date[], $12::text[])
+                        WITH ORDINALITY AS t(numero_cuota, concepto, monto, moneda, fecha_vencimiento, notas, ord)
+                ),
+                inst AS (
+                    INSERT INTO payment_installments
+                        (id, plan_id, numero_cuota, concepto, monto, moneda, fecha_vencimiento, notas, estado)
+                    SELECT n.id, plan.id, n.numero_cuota, n.concepto, n.monto, n.moneda,
+                           n.fecha_vencimiento, n.notas,
+                           CASE WHEN p.rn IS NULL THEN 'pendiente' ELSE 'pagado' END::installment_estado
+                    FROM new_inst n
+                    CROSS JOIN plan
+                    LEFT JOIN paid p ON p.concepto = n.concepto AND p.monto = n.monto AND p.rn = n.rn
+                    RETURNING id
+                ),
+                records AS (
+                    INSERT INTO payment_records
+                        (installment_id, fecha_pago, monto_pagado, moneda, metodo_pago, referencia, notas)
+                    SELECT n.id, p.fecha_pago, p.monto_pagado, p.moneda, p.metodo_pago, p.referencia, p.notas
+                    FROM new_inst n
+                    JOIN paid p ON p.concepto = n.concepto AND p.monto = n.monto AND p.rn = n.rn
+                    RETURNING id
+                )
+                SELECT (SELECT id FROM plan) AS plan_id,
+                       (SELECT COUNT(*) FROM inst) AS installments_created,
+                       (SELECT COUNT(*) FROM records) AS records_reattached
+                """,
                 reservation_id, body.descripcion, body.moneda_base,
                 body.monto_total, body.tipo_ajuste, body.porcentaje_ajuste,
+                [i.numero_cuota for i in insts],
+                [i.concepto for i in insts],
+                [Decimal(str(i.monto)) for i in insts],
+                [i.moneda for i in insts],
+                fechas_vencimiento,
+                [i.notas for i in insts],
+            )
+            await cashflow_rollup.refresh_months(
+                conn, res["project_id"], [*(old_dates or []), *fechas_vencimiento]
             )
-            plan_id = str(plan["id"])
-            for inst in body.installments:
-                inst_row = await conn.fetchrow(
-                    """INSERT INTO payment_installments
-                       (plan_id, numero_cuota, concepto, monto, moneda, fecha_vencimiento, notas)
-                       VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING id""",
-                    plan_id, inst.numero_cuota, inst.concepto, inst.monto,
-                    inst.moneda, datetime.strptime(inst.fecha_vencimiento, "%Y-%m-%d").date(), inst.notas,
-                )
-                inst_id = str(inst_row["id"])
-                # Re-attach payment_records from matching paid installment
-                key = (inst.concepto, float(inst.monto))
-                if key in paid_map and paid_map[key]:
-                    prev = paid_map[key].pop(0)
-                    await conn.execute(
-                        """INSERT INTO payment_records
-                           (installment_id, fecha_pago, monto_pagado, moneda, metodo_pago, referencia, notas)
-                           VALUES ($1,$2,$3,$4,$5,$6,$7)""",
-                        inst_id, prev["fecha_pago"], prev["monto_pagado"],
-                        prev["moneda"], prev["metodo_pago"], prev["referencia"], prev["notas"],
-                    )
-                    await conn.execute(
-                        "UPDATE payment_installments SET estado = 'pagado' WHERE id = $1", inst_id
-                    )
 
-    return {"plan_id": plan_id, "installments_created": len(body.installments)}
+    return {
+        "plan_id": str(row["plan_id"]),
+        "installments_created": row["installments_created"],
+        "records_reattached": row["records_reattached"],
+    }
 
 
 @router.patch("/payment-installments/{installment_id}")
@@ -540,13 +605,44 @@ async def patch_installment(installment_id: str, request: Request):
     if not updates:
         raise HTTPException(status_code=400, detail="Sin campos válidos")
     set_clause = ", ".join(f"{k} = ${i+2}" for i, k in enumerate(updates))
-    row = await pool.fetchrow(
-        f"UPDATE payment_installments SET {set_clause} WHERE id = $1 RETURNING id, estado, monto, fecha_vencimiento",
-        installment_id, *updates.values(),
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                f"""UPDATE payment_installments pi SET {set_clause}
+                    FROM (SELECT id, fecha_vencimiento FROM payment_installments WHERE id = $1) prev
+                    WHERE pi.id = prev.id
+                    RETURNING pi.id, pi.estado, pi.monto, pi.fecha_vencimiento,
+                              prev.fecha_vencimiento AS prev_fecha_vencimiento""",
+                installment_id, *updates.values(),
+            )
+            if not row:
+                raise HTTPException(status_code=404, detail="Cuota no encontrada")
+            await cashflow_rollup.refresh_for_installment(conn, installment_id, [row["prev_fecha_vencimiento"]])
+    alerts_service.check(_CUOTA_ALERTS, resource_id=installment_id)
+    result = dict(row)
+    result.pop("prev_fecha_vencimiento")
+    return result
+
+
+async def _recalc_installment_estado(conn, installment_id) -> None:
+    """Set an installment's estado from the sum of its live payment records."""
+    total_paid = await conn.fetchval(
+        "SELECT COALESCE(SUM(monto_pagado),0) FROM payment_records WHERE installment_id = $1 AND deleted_at IS NULL",
+        installment_id,
+    )
+    inst_monto = await conn.fetchval(
+        "SELECT monto FROM payment_installments WHERE id = $1", installment_id
+    )
+    if total_paid >= inst_monto:
+        new_estado = "pagado"
+    elif total_paid > 0:
+        new_estado = "parcial"
+    else:
+        new_estado = "pendiente"
+    await conn.execute(
+        "UPDATE payment_installments SET estado = $1 WHERE id = $2",
+        new_estado, installment_id,
     )
-    if not row:
-        raise HTTPException(status_code=404, detail="Cuota no encontrada")
-    return dict(row)
 
 
 @router.post("/payment-records")
@@ -557,18 +653,22 @@ async def create_payment_record(
     """Register a payment against an installment."""
     pool = await get_pool()
     user_id, user_nombre = _get_actor(credentials)
-    row = await pool.fetchrow(
-        """INSERT INTO payment_records
-           (installment_id, fecha_pago, monto_pagado, moneda, metodo_pago, referencia, notas)
-           VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING id""",
-        body.installment_id, datetime.strptime(body.fecha_pago, "%Y-%m-%d").date(),
-        body.monto_pagado, body.moneda, body.metodo_pago, body.referencia, body.notas,
-    )
-    # Auto-update installment estado
-    await pool.execute(
-        "UPDATE payment_installments SET estado = 'pagado' WHERE id = $1",
-        body.installment_id,
-    )
+    fecha_pago = datetime.strptime(body.fecha_pago, "%Y-%m-%d").date()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """INSERT INTO payment_records
+                   (installment_id, fecha_pago, monto_pagado, moneda, metodo_pago, referencia, notas)
+                   VALUES ($1,$2,$3,$4,$5,$6,$7) RETURNING id""",
+                body.installment_id, fecha_pago,
+                body.monto_pagado, body.moneda, body.metodo_pago, body.referencia, body.notas,
+            )
+            # Auto-update installment estado
+            await conn.execute(
+                "UPDATE payment_installments SET estado = 'pagado' WHERE id = $1",
+                body.installment_id,
+            )
+            await cashflow_rollup.refresh_for_installment(conn, body.installment_id, [fecha_pago])
     await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="INSERT",
                  table_name="payment_records", record_id=str(row["id"]),
                  details={"installment_id": body.installment_id, "fecha_pago": body.fecha_pago,
@@ -585,12 +685,6 @@ async def update_payment_record(
     """Update a payment record field."""
     pool = await get_pool()
     user_id, user_nombre = _get_actor(credentials)
-    row = await pool.fetchrow(
-        "SELECT installment_id FROM payment_records WHERE id = $1 AND deleted_at IS NULL", record_id
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Payment record not found")
-    installment_id = row["installment_id"]
     # Build SET clause dynamically
     updates = {}
     if body.fecha_pago is not None:
@@ -605,30 +699,26 @@ async def update_payment_record(
         updates["referencia"] = body.referencia
     if body.notas is not None:
         updates["notas"] = body.notas
-    if updates:
-        set_clause = ", ".join(f"{k} = ${i+2}" for i, k in enumerate(updates.keys()))
-        values = [record_id] + list(updates.values())
-        await pool.execute(
-            f"UPDATE payment_records SET {set_clause} WHERE id = $1", *values
-        )
-    # Recalculate installment estado
-    total_paid = await pool.fetchval(
-        "SELECT COALESCE(SUM(monto_pagado),0) FROM payment_records WHERE installment_id = $1 AND deleted_at IS NULL",
-        installment_id,
-    )
-    inst_monto = await pool.fetchval(
-        "SELECT monto FROM payment_installments WHERE id = $1", installment_id
-    )
-    if total_paid >= inst_monto:
-        new_estado = "pagado"
-    elif total_paid > 0:
-        new_estado = "parcial"
-    else:
-        new_estado = "pendiente"
-    await pool.execute(
-        "UPDATE payment_installments SET estado = $1 WHERE id = $2",
-        new_estado, installment_id,
-    )
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                "SELECT installment_id, fecha_pago FROM payment_records WHERE id = $1 AND deleted_at IS NULL FOR UPDATE",
+                record_id,
+            )
+            if not row:
+                raise HTTPException(status_code=404, detail="Payment record not found")
+            installment_id = row["installment_id"]
+            if updates:
+                set_clause = ", ".join(f"{k} = ${i+2}" for i, k in enumerate(updates.keys()))
+                values = [record_id] + list(updates.values())
+                await conn.execute(
+                    f"UPDATE payment_records SET {set_clause} WHERE id = $1", *values
+                )
+            await _recalc_installment_estado(conn, installment_id)
+            await cashflow_rollup.refresh_for_installment(
+                conn, installment_id, [row["fecha_pago"], updates.get("fecha_pago")]
+            )
+    alerts_service.check(_CUOTA_ALERTS, resource_id=installment_id)
     if updates:
         await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="UPDATE",
                      table_name="payment_records", record_id=record_id,
@@ -644,33 +734,20 @@ async def delete_payment_record(
     """Soft-delete a payment record and recalculate installment estado."""
     pool = await get_pool()
     user_id, user_nombre = _get_actor(credentials)
-    row = await pool.fetchrow(
-        "SELECT installment_id FROM payment_records WHERE id = $1 AND deleted_at IS NULL", record_id
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Payment record not found")
-    installment_id = row["installment_id"]
-    await pool.execute("UPDATE payment_records SET deleted_at = NOW() WHERE id = $1", record_id)
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """UPDATE payment_records SET deleted_at = NOW() WHERE id = $1 AND deleted_at IS NULL
+                   RETURNING installment_id, fecha_pago""",
+                record_id,
+            )
+            if not row:
+                raise HTTPException(status_code=404, detail="Payment record not found")
+            await _recalc_installment_estado(conn, row["installment_id"])
+            await cashflow_rollup.refresh_for_installment(conn, row["installment_id"], [row["fecha_pago"]])
+    alerts_service.check(_CUOTA_ALERTS, resource_id=row["installment_id"])
     await _audit(pool, user_id=user_id, user_nombre=user_nombre, action="DELETE",
                  table_name="payment_records", record_id=record_id)
-    # Recalculate estado
-    total_paid = await pool.fetchval(
-        "SELECT COALESCE(SUM(monto_pagado),0) FROM payment_records WHERE installment_id = $1 AND deleted_at IS NULL",
-        installment_id,
-    )
-    inst_monto = await pool.fetchval(
-        "SELECT monto FROM payment_installments WHERE id = $1", installment_id
-    )
-    if total_paid >= inst_monto:
-        new_estado = "pagado"
-    elif total_paid > 0:
-        new_estado = "parcial"
-    else:
-        new_estado = "pendiente"
-    await pool.execute(
-        "UPDATE payment_installments SET estado = $1 WHERE id = $2",
-        new_estado, installment_id,
-    )
     return {"ok": True}
 
 
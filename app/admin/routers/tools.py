@@ -39,30 +39,9 @@ async def get_exchange_rate_history(tipo: str, days: int = 30):
 
 @router.post("/jobs/close-stale-handoffs")
 async def close_stale_handoffs():
-    """Close handoffs where the lead hasn't replied in 2 hours (called by cron every 30 min)."""
-    from app.modules.handoff.manager import close_handoff
-    pool = await get_pool()
-    cutoff = "NOW() - INTERVAL '2 hours'"
-    stale = await pool.fetch(
-        f"""
-        SELECT h.id, h.lead_id FROM handoffs h
-        WHERE h.status = 'active'
-          AND (
-            SELECT MAX(c.created_at) FROM conversations c
-            WHERE c.lead_id = h.lead_id AND c.role = 'user'
-          ) < {cutoff}
-          AND h.started_at < {cutoff}
-        """
-    )
-    closed = 0
-    for row in stale:
-        try:
-            await close_handoff(str(row["id"]), lead_note="timeout_2h_cron", send_goodbye=False)
-            closed += 1
-        except Exception as e:
-            logger.warning("Failed to close stale handoff %s: %s", row["id"], e)
-    logger.info("close-stale-handoffs: closed %d handoffs", closed)
-    return {"closed": closed}
+    """Close handoffs where the lead hasn't replied in 2 hours (scheduled every 30 min)."""
+    from app.modules.handoff.manager import close_stale_handoffs as _close_stale
+    return {"closed": await _close_stale(lead_note="timeout_2h_cron")}
 
 
 @router.post("/jobs/update-payment-states")
@@ -78,9 +57,171 @@ async def update_payment_states():
     )
     updated_obra = int(r1.split()[-1])
     updated_installments = int(r2.split()[-1])
+    if updated_installments:
+        from app.services.alerts_service import evaluate_alerts
+        await evaluate_alerts(rules=["CUOTA_VENCIDA"])
     return {"updated_obra": updated_obra, "updated_installments": updated_installments}
 
 
+@router.post("/jobs/archive-conversations")
+async def archive_conversations(
+    keep_months: Optional[int] = None,
+    dry_run: bool = False,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """Export conversation partitions older than keep_months to S3 and detach them
+    (the scheduler runs this monthly). Also creates the upcoming monthly
+    partitions. Superadmin only."""
+    from app.services.conversation_archive import archive_old_partitions
+    payload = _require_admin(credentials)
+    if payload.get("role") != "superadmin":
+        raise HTTPException(status_code=403, detail="Solo superadmin puede archivar conversaciones")
+    if keep_months is not None and keep_months < 1:
+        raise HTTPException(status_code=400, detail="keep_months debe ser >= 1")
+    return await archive_old_partitions(keep_months=keep_months, dry_run=dry_run)
+
+
+@router.post("/jobs/rebuild-cashflow")
+async def rebuild_cashflow(
+    project_id: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """Recompute the cashflow_monthly rollup from payment_records, facturas and
+    installments (all projects, or one). Write paths keep it current; this is for
+    backfills and manual repairs. Superadmin only."""
+    from app.services.cashflow_rollup import rebuild
+    payload = _require_admin(credentials)
+    if payload.get("role") != "superadmin":
+        raise HTTPException(status_code=403, detail="Solo superadmin puede recalcular el cashflow")
+    return {"buckets": await rebuild(project_id)}
+
+
+@router.get("/jobs/runs")
+async def get_job_runs(
+    job_name: Optional[str] = None,
+    limit: int = 50,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """Scheduled jobs with their next firing, and the latest runs (newest first)."""
+    from datetime import datetime, timezone
+    from app.core.scheduler import scheduler
+    _require_admin(credentials)
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """SELECT id, job_name, scheduled_for, worker_id, status, started_at, finished_at,
+                  duration_ms, result, error
+           FROM job_runs
+           WHERE ($1::text IS NULL OR job_name = $1)
+           ORDER BY started_at DESC
+           LIMIT $2""",
+        job_name, min(limit, 500),
+    )
+    now = datetime.now(timezone.utc)
+    return {
+        "jobs": [
+            {"name": j.name, "schedule": j.schedule.expr, "next_run": j.schedule.next_after(now)}
+            for j in scheduler.jobs
+        ],
+        "runs": [dict(r) for r in rows],
+    }
+
+
+@router.get("/llm-usage")
+async def get_llm_usage(
+    organization_id: Optional[str] = None,
+    days: int = 30,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
+):
+    """LLM calls aggregated per organization, day, purpose and model (newest day
+    first), plus per-organization totals sorted by input tokens. Superadmins see
+    every organization, or one via organization_id; admins their own."""
+    payload = _require_admin(credentials)
+    if payload.get("role") != "superadmin":
+        organization_id = payload.get("organization_id")
+    days = max(1, min(days, 365))
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """SELECT c.organization_id, o.name AS organization_name,
+                  (c.created_at AT TIME ZONE 'UTC')::date AS day, c.purpose, c.model,
+                  COUNT(*) AS calls,
+                  COUNT(*) FILTER (WHERE c.status = 'error') AS errors,
+                  SUM(c.input_tokens) AS input_tokens,
+                  SUM(c.output_tokens) AS output_tokens,
+                  SUM(c.cache_read_tokens) AS cache_read_tokens,
+                  SUM(c.cache_write_tokens) AS cache_write_tokens,
+                  SUM(cardinality(c.tool_calls)) AS tool_calls,
+                  ROUND(AVG(c.latency_ms)) AS avg_latency_ms,
+                  percentile_cont(0.95) WITHIN GROUP (ORDER BY c.latency_ms) AS p95_latency_ms,
+                  ROUND(AVG(c.queue_wait_ms)) AS avg_queue_wait_ms,
+                  percentile_cont(0.95) WITHIN GROUP (ORDER BY c.queue_wait_ms) AS p95_queue_wait_ms
+           FROM llm_calls c
+           LEFT JOIN organizations o ON o.id = c.organization_id
+           WHERE c.created_at >= (NOW() AT TIME ZONE 'UTC')::date - ($1::int - 1)
+             AND ($2::uuid IS NULL OR c.organization_id = $2)
+           GROUP BY 1, 2, 3, 4, 5
+           ORDER BY day DESC, input_tokens DESC""",
+        days, organization_id,
+    )
+    totals: dict = {}
+    for r in rows:
+        t = totals.setdefault(str(r["organization_id"]), {
+            "organization_id": r["organization_id"], "organization_name": r["organization_name"],
+            "calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0,
+            "cache_read_tokens": 0, "cache_write_tokens": 0, "tool_calls": 0,
+        })
+        for k in ("calls", "errors", "input_tokens", "output_tokens",
+                  "cache_read_tokens", "cache_write_tokens", "tool_calls"):
+            t[k] += r[k] or 0
+    return {
+        "days": days,
+        "organizations": sorted(totals.values(), key=lambda t: t["input_tokens"], reverse=True),
+        "daily": [dict(r) for r in rows],
+    }
+
+
+@router.get("/llm-status")
+async def get_llm_status(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """Live state of this worker's Anthropic rate limiter (queued calls and recent
+    queue waits per priority, what is left of the global budgets) and of the lead
+    agent's overload detection (normal/degraded, pending calls, p95 latency)."""
+    from app.core.llm_limiter import limiter
+    from app.core.overload import monitor
+    _require_admin(credentials)
+    return {**limiter.snapshot(), "overload": monitor.snapshot()}
+
+
+@router.get("/health/dependencies")
+async def get_dependency_health(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
+    """Circuit breaker state of this worker's external dependencies (Anthropic,
+    S3, each WhatsApp channel) and the sends parked while a channel's circuit is
+    open. Superadmins see every channel; admins the shared dependencies and the
+    channels of their organization."""
+    from app.core.circuit_breaker import breakers
+    from app.modules.whatsapp import outbound
+    payload = _require_admin(credentials)
+    dependencies = breakers.snapshot()
+    queues = outbound.snapshot()
+    if payload.get("role") != "superadmin":
+        pool = await get_pool()
+        rows = await pool.fetch(
+            "SELECT provider, id FROM tenant_channels WHERE organization_id = $1",
+            payload.get("organization_id"),
+        )
+        own = {f"{r['provider']}:{r['id']}" for r in rows}
+
+        def visible(name: str) -> bool:
+            # "<provider>:<channel id>" are tenant channels; the rest are shared
+            return ":" not in name or name.endswith(":default") or name in own
+
+        dependencies = [d for d in dependencies if visible(d["name"])]
+        queues = [q for q in queues if visible(q["channel"])]
+    return {
+        "status": "degraded" if any(d["state"] != "closed" for d in dependencies) else "ok",
+        "dependencies": dependencies,
+        "outbound_queues": queues,
+    }
+
+
 @router.get("/audit-log")
 async def get_audit_log(
     project_id: Optional[str] = None,
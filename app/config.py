@@ -50,6 +50,45 @@ class Settings(BaseSettings):
     s3_public_url: str = ""
     s3_region: str = ""
 
+    # Conversation retention: months kept in Postgres before export to S3
+    conversation_retention_months: int = 12
+    conversation_partitions_ahead: int = 2
+
+    # SSE fan-out: "memory" (single worker) or "postgres" (LISTEN/NOTIFY across workers)
+    sse_broker: str = "memory"
+
+    # Active-handoff phone registry: "memory", "postgres" (synced across workers
+    # with LISTEN/NOTIFY) or "off" (always query); empty = same as sse_broker
+    handoff_registry: str = ""
+
+    # In-process job scheduler (app/core/scheduler.py); comma-separated job names to skip
+    scheduler_enabled: bool = True
+    scheduler_jitter_seconds: int = 30
+    scheduler_disabled_jobs: str = ""
+
+    # Lead agent: estimated input tokens per request (system + docs + history + units + message)
+    lead_prompt_token_budget: int = 60000
+
+    # Anthropic rate limiter (app/core/llm_limiter.py), per worker, per minute; 0 = unlimited.
+    # Background calls (extraction, media) leave llm_background_reserve of the global budget to live replies.
+    llm_global_rpm: int = 400
+    llm_global_input_tpm: int = 400000
+    llm_org_rpm: int = 60
+    llm_org_input_tpm: int = 100000
+    llm_background_reserve: float = 0.25
+
+    # Overload / degraded mode for the lead agent (app/core/overload.py), per worker
+    overload_pending_calls: int = 30
+    overload_p95_seconds: float = 20.0
+    overload_min_seconds: int = 60
+
+    # LLM call ledger (llm_calls): days of rows kept by the purge-llm-calls job
+    llm_ledger_retention_days: int = 180
+
+    # Lead answer cache (opt-in per org via agent_configs.response_cache)
+    response_cache_ttl_hours: int = 168
+    response_cache_similarity: float = 0.92
+
     # Dev: force a specific developer (useful when all projects share the Twilio sandbox number)
     active_developer_id: str = ""
 
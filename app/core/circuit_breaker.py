@@ -0,0 +1,229 @@
+"""
+Circuit breakers for the external dependencies: Anthropic, S3 storage and each
+WhatsApp channel (Kapso, Meta, YCloud, Twilio; one breaker per tenant channel,
+since one tenant's credentials or number can fail alone).
+
+A breaker watches the calls of the last `window` seconds. Once there are at
+least `min_calls` and `failure_rate` of them failed, it opens: calls fail at
+once with CircuitOpenError instead of waiting out a timeout, so coroutines (and
+the DB connections they hold) do not pile up behind a dead dependency. After
+`open_seconds` it lets a single probe call through (half-open): success closes
+it, failure opens it again for twice as long (up to `max_open_seconds`).
+
+Failures are timeouts (every call is bounded by the policy's `timeout`),
+connection errors and HTTP 5xx / 408; a 4xx answer means the dependency is up
+and counts as a success for the breaker (the error still reaches the caller).
+
+WhatsApp sends that hit an open breaker are parked and re-sent in order when
+it closes (app/modules/whatsapp/outbound.py). State: GET /admin/health/dependencies.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"{name}: circuit open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    timeout: float
+    window: float = 60.0
+    min_calls: int = 5
+    failure_rate: float = 0.5
+    open_seconds: float = 30.0
+    max_open_seconds: float = 300.0
+
+
+POLICIES = {
+    "anthropic": BreakerPolicy(timeout=90.0, min_calls=5, open_seconds=20.0),
+    "s3": BreakerPolicy(timeout=30.0),
+    "kapso": BreakerPolicy(timeout=15.0),
+    "meta": BreakerPolicy(timeout=15.0),
+    "ycloud": BreakerPolicy(timeout=15.0),
+    "twilio": BreakerPolicy(timeout=15.0),
+}
+DEFAULT_POLICY = BreakerPolicy(timeout=30.0)
+
+
+def _http_status(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an httpx / anthropic / botocore exception, if any."""
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):  # botocore ClientError
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_failure(exc: BaseException) -> bool:
+    """Whether an exception means the dependency is unhealthy."""
+    status = _http_status(exc)
+    if status is None:
+        return True  # timeout, connection error, ...
+    return status >= 500 or status == 408
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, policy: BreakerPolicy) -> None:
+        self.name = name
+        self.policy = policy
+        self.state = CLOSED
+        self._calls: deque = deque()  # (monotonic, ok)
+        self._open_seconds = policy.open_seconds
+        self._open_until = 0.0
+        self._probe_inflight = False
+        self._lock = threading.Lock()  # sync callers run in worker threads (to_thread)
+        self.opened_count = 0
+        self.rejected = 0
+        self.changed_at = datetime.now(timezone.utc)
+        self.last_error: Optional[str] = None
+
+    # ---- state machine ----
+
+    def retry_in(self) -> float:
+        return max(0.0, self._open_until - time.monotonic()) if self.state == OPEN else 0.0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe when half-opening)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self._open_until:
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probe_inflight:
+                self._probe_inflight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, error: Optional[str] = None) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not ok:
+                self.last_error = error
+            if self.state == HALF_OPEN:
+                self._probe_inflight = False
+                if ok:
+                    self._calls.clear()
+                    self._open_seconds = self.policy.open_seconds
+                    self._set(CLOSED)
+                else:
+                    self._open_seconds = min(self._open_seconds * 2, self.policy.max_open_seconds)
+                    self._trip(now)
+                return
+            if self.state != CLOSED:
+                return
+            self._calls.append((now, ok))
+            while self._calls and self._calls[0][0] < now - self.policy.window:
+                self._calls.popleft()
+            failures = sum(1 for _, success in self._calls if not success)
+            if (
+                len(self._calls) >= self.policy.min_calls
+                and failures / len(self._calls) >= self.policy.failure_rate
+            ):
+                self._trip(now)
+
+    def release_probe(self) -> None:
+        """The probe was cancelled before finishing: let the next call probe."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probe_inflight = False
+
+    def _trip(self, now: float) -> None:
+        self._open_until = now + self._open_seconds
+        self.opened_count += 1
+        self._set(OPEN)
+        logger.warning(
+            "Circuit %s OPEN for %.0fs (last error: %s)", self.name, self._open_seconds, self.last_error,
+        )
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            if state == CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self.state = state
+            self.changed_at = datetime.now(timezone.utc)
+
+    # ---- call wrappers ----
+
+    async def call(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory() through the breaker, bounded by the policy timeout."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            result = await asyncio.wait_for(factory(), timeout=self.policy.timeout)
+        except asyncio.CancelledError:
+            self.release_probe()
+            raise
+        except Exception as e:
+            self.record(not is_failure(e), f"{type(e).__name__}: {e}"[:300])
+            raise
+        self.record(True)
+        return result
+
+    @contextmanager
+    def guard(self):
+        """Synchronous variant (blocking clients run via asyncio.to_thread); the
+        client's own timeouts apply."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        try:
+            yield
+        except Exception as e:
+            self.record(not is_failure(e), f"{type(e).__name__}: {e}"[:300])
+            raise
+        self.record(True)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        window = [ok for t, ok in self._calls if t >= now - self.policy.window]
+        return {
+            "name": self.name,
+            "state": self.state,
+            "since": self.changed_at,
+            "retry_in_s": round(self.retry_in(), 1),
+            "window_calls": len(window),
+            "window_failures": sum(1 for ok in window if not ok),
+            "times_opened": self.opened_count,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self) -> None:
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, dependency: str, key: Optional[str] = None) -> CircuitBreaker:
+        """Breaker for a dependency, or for one instance of it (e.g. a tenant channel)."""
+        name = f"{dependency}:{key}" if key else dependency
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, POLICIES.get(dependency, DEFAULT_POLICY))
+        return breaker
+
+    def snapshot(self) -> list[dict]:
+        return [b.snapshot() for b in sorted(self._breakers.values(), key=lambda b: b.name)]
+
+
+breakers = BreakerRegistry()
@@ -0,0 +1,144 @@
+"""
+Live dashboard counters, pushed over SSE as `metrics` events.
+
+Per tenant (organization_id):
+- leads_by_score   {hot, warm, cold, sin_score}
+- units_by_status  {available, reserved, sold}  (non-deleted projects)
+- unread_alerts    project + org level alerts with leida = FALSE
+- active_handoffs  leads with handoff_active
+
+Write paths call touch(org_id) / touch_project(project_id) after changing any of
+these. Touches are debounced per tenant: one recount (a single statement over
+indexed columns) per burst of writes, broadcast once to every open dashboard on
+every worker. The latest snapshot is cached by the SSE manager, so connecting a
+dashboard normally costs no query at all. Load therefore scales with writes, not
+with the number of open dashboards.
+
+Nobody watching, nothing counted: a worker without an open connection for the
+tenant only drops its cached snapshot and signals the other workers
+(METRICS_STALE); those with connections recount, the rest drop their cache too.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.core.sse import connection_manager
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+METRICS_EVENT = "metrics"
+METRICS_STALE = "metrics_stale"  # control event between workers, never sent to browsers
+DEBOUNCE_SECONDS = 1.0
+
+_pending: dict[str, asyncio.Task] = {}
+# Tenants touched by a local write since their last flush (signal other workers)
+_propagate: set[str] = set()
+# project_id -> organization_id (a project never changes organization)
+_project_org: dict[str, str] = {}
+
+_SNAPSHOT_SQL = """
+SELECT
+    (SELECT COALESCE(jsonb_object_agg(s.score, s.n), '{}'::jsonb)
+     FROM (SELECT COALESCE(score, 'sin_score') AS score, COUNT(*) AS n
+           FROM leads WHERE organization_id = $1
+           GROUP BY 1) s) AS leads_by_score,
+    (SELECT COALESCE(jsonb_object_agg(s.status, s.n), '{}'::jsonb)
+     FROM (SELECT u.status, COUNT(*) AS n
+           FROM units u JOIN projects p ON p.id = u.project_id
+           WHERE p.organization_id = $1 AND p.deleted_at IS NULL
+           GROUP BY u.status) s) AS units_by_status,
+    (SELECT COUNT(*) FROM project_alerts pa
+     WHERE pa.leida = FALSE
+       AND (pa.organization_id = $1
+            OR pa.project_id IN (SELECT id FROM projects WHERE organization_id = $1 AND deleted_at IS NULL))
+    ) AS unread_alerts,
+    (SELECT COUNT(*) FROM leads WHERE organization_id = $1 AND handoff_active) AS active_handoffs
+"""
+
+
+async def compute_snapshot(org_id: str) -> dict:
+    """Recount every counter for one tenant (one round-trip)."""
+    pool = await get_pool()
+    row = await pool.fetchrow(_SNAPSHOT_SQL, org_id)
+    return {
+        "organization_id": org_id,
+        "leads_by_score": json.loads(row["leads_by_score"]),
+        "units_by_status": json.loads(row["units_by_status"]),
+        "unread_alerts": row["unread_alerts"],
+        "active_handoffs": row["active_handoffs"],
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def snapshot(org_id: str) -> dict:
+    """Latest counters for a tenant: the cached broadcast, or a fresh recount."""
+    cached = connection_manager.latest(org_id, METRICS_EVENT)
+    if cached is not None:
+        return cached
+    data = await compute_snapshot(org_id)
+    connection_manager.remember(org_id, METRICS_EVENT, data)
+    return data
+
+
+def touch(org_id: Optional[str], propagate: bool = True) -> None:
+    """Schedule a debounced recount + `metrics` broadcast for a tenant, if this
+    worker has a dashboard open for it (see the module docstring otherwise).
+
+    Safe to call from inside a transaction: the recount runs DEBOUNCE_SECONDS
+    later, after the caller has committed.
+    """
+    if not org_id:
+        return
+    org_id = str(org_id)
+    if propagate:
+        _propagate.add(org_id)
+    if org_id in _pending:
+        return
+    try:
+        _pending[org_id] = asyncio.get_running_loop().create_task(_flush(org_id))
+    except RuntimeError:
+        pass  # no event loop (scripts)
+
+
+connection_manager.on_control(METRICS_STALE, lambda org_id: touch(org_id, propagate=False))
+
+
+async def touch_project(project_id: Optional[str]) -> None:
+    """touch() for the organization that owns a project."""
+    if not project_id:
+        return
+    project_id = str(project_id)
+    org_id = _project_org.get(project_id)
+    if org_id is None:
+        pool = await get_pool()
+        org = await pool.fetchval("SELECT organization_id FROM projects WHERE id = $1", project_id)
+        if org is None:
+            return
+        org_id = _project_org[project_id] = str(org)
+    touch(org_id)
+
+
+async def _flush(org_id: str) -> None:
+    try:
+        await asyncio.sleep(DEBOUNCE_SECONDS)
+        # Touches arriving from here on schedule a new flush, so nothing is lost
+        # between the recount and the broadcast.
+        _pending.pop(org_id, None)
+        propagate = org_id in _propagate
+        _propagate.discard(org_id)
+        if not connection_manager.has_connections(org_id):
+            connection_manager.forget(org_id, METRICS_EVENT)
+            if propagate:
+                await connection_manager.signal(org_id, METRICS_STALE)
+            return
+        data = await compute_snapshot(org_id)
+        await connection_manager.broadcast(org_id, METRICS_EVENT, data)
+    except Exception as e:
+        logger.error("Live metrics refresh failed for org=%s: %s", org_id, e)
+    finally:
+        if _pending.get(org_id) is asyncio.current_task():
+            _pending.pop(org_id, None)
@@ -0,0 +1,191 @@
+"""
+LLM call ledger: one llm_calls row per Claude request.
+
+Every messages.create goes through create_message(), which waits for a slot
+from the rate limiter (app/core/llm_limiter.py), calls Anthropic through its
+circuit breaker (app/core/circuit_breaker.py), times the call and records
+organization, lead, purpose, model, input/output/cache tokens (from
+response.usage), latency, time spent queued in the limiter, the tools the model
+called and whether it failed.
+
+Rows are buffered in memory and written by a background task in batches
+(every FLUSH_SECONDS, or sooner once BATCH_SIZE rows are waiting), so the reply
+path never waits on the insert. If the database is unreachable the buffer is
+kept, up to MAX_BUFFERED rows (the oldest are dropped beyond that). The buffer
+is flushed on shutdown.
+
+Per-organization daily aggregates: GET /admin/llm-usage.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import anthropic
+
+from app.core.circuit_breaker import CircuitOpenError, breakers
+from app.core.llm_limiter import estimate_request_tokens, limiter
+from app.core.overload import monitor
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SECONDS = 5.0
+BATCH_SIZE = 200
+MAX_BUFFERED = 10_000
+
+_COLUMNS = (
+    "created_at", "organization_id", "lead_id", "purpose", "model",
+    "input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens",
+    "latency_ms", "queue_wait_ms", "tool_calls", "status", "error",
+)
+
+
+class LLMLedger:
+    def __init__(self) -> None:
+        self._buffer: list[tuple] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        *,
+        purpose: str,
+        model: str,
+        latency_ms: int,
+        queue_wait_ms: int = 0,
+        organization_id: Optional[str] = None,
+        lead_id: Optional[str] = None,
+        usage: Any = None,
+        tool_calls: Optional[list[str]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Queue one call for the next batch write."""
+        self._buffer.append((
+            datetime.now(timezone.utc), organization_id, lead_id, purpose, model,
+            getattr(usage, "input_tokens", None) or 0,
+            getattr(usage, "output_tokens", None) or 0,
+            getattr(usage, "cache_read_input_tokens", None) or 0,
+            getattr(usage, "cache_creation_input_tokens", None) or 0,
+            latency_ms, queue_wait_ms, tool_calls or [], "error" if error else "ok", error,
+        ))
+        if len(self._buffer) > MAX_BUFFERED:
+            dropped = len(self._buffer) - MAX_BUFFERED
+            del self._buffer[:dropped]
+            logger.warning("LLM ledger buffer full, dropped %d oldest rows", dropped)
+        if len(self._buffer) >= BATCH_SIZE:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything buffered. Returns the number of rows written."""
+        if not self._buffer:
+            return 0
+        from app.database import get_pool
+
+        batch, self._buffer = self._buffer, []
+        try:
+            pool = await get_pool()
+            await pool.copy_records_to_table("llm_calls", records=batch, columns=_COLUMNS)
+        except Exception as e:
+            # Keep the rows for the next attempt, behind anything recorded meanwhile
+            self._buffer[:0] = batch
+            logger.error("LLM ledger flush failed (%d rows kept): %s", len(batch), e)
+            return 0
+        return len(batch)
+
+    async def _flush_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+ledger = LLMLedger()
+
+
+async def purge_old_calls() -> dict:
+    """Delete rows older than llm_ledger_retention_days (scheduled job)."""
+    from app.config import get_settings
+    from app.database import get_pool
+
+    pool = await get_pool()
+    result = await pool.execute(
+        "DELETE FROM llm_calls WHERE created_at < NOW() - make_interval(days => $1)",
+        get_settings().llm_ledger_retention_days,
+    )
+    return {"deleted": int(result.split()[-1])}
+
+
+async def create_message(
+    client,
+    *,
+    purpose: str,
+    organization_id: Optional[str] = None,
+    lead_id: Optional[str] = None,
+    estimated_tokens: Optional[int] = None,
+    **kwargs,
+):
+    """client.messages.create(**kwargs), rate limited and recorded in the ledger.
+
+    purpose: "reply" (lead agent), "deferred_reply" (lead agent answering after a
+    degraded turn), "extraction" (qualification), "dev" (developer agent),
+    "obra_extraction" (media); it also sets the limiter priority.
+    estimated_tokens: input size when the caller already knows it (otherwise
+    estimated from system + messages).
+    Raises CircuitOpenError, without calling, while the Anthropic breaker is open.
+    """
+    breaker = breakers.get("anthropic")
+    if breaker.retry_in() > 0:
+        # Fail before queueing in the limiter: the slot would be wasted anyway
+        raise CircuitOpenError(breaker.name, breaker.retry_in())
+    if estimated_tokens is None:
+        estimated_tokens = estimate_request_tokens(kwargs.get("system"), kwargs.get("messages", []))
+    queue_wait_ms = int(await limiter.acquire(organization_id, estimated_tokens, purpose) * 1000)
+
+    started = time.monotonic()
+    monitor.call_started(purpose)
+    try:
+        response = await breaker.call(lambda: client.messages.create(**kwargs))
+    except Exception as e:
+        if isinstance(e, anthropic.RateLimitError):
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            limiter.rate_limited(float(retry_after) if retry_after else 10.0)
+        ledger.record(
+            purpose=purpose, model=kwargs.get("model", ""), organization_id=organization_id,
+            lead_id=lead_id, latency_ms=int((time.monotonic() - started) * 1000),
+            queue_wait_ms=queue_wait_ms, error=f"{type(e).__name__}: {e}"[:500],
+        )
+        raise
+    finally:
+        monitor.call_finished(purpose, time.monotonic() - started)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        limiter.settle(
+            organization_id, estimated_tokens,
+            (usage.input_tokens or 0) + (getattr(usage, "cache_creation_input_tokens", None) or 0),
+        )
+    ledger.record(
+        purpose=purpose, model=getattr(response, "model", None) or kwargs.get("model", ""),
+        organization_id=organization_id, lead_id=lead_id,
+        latency_ms=int((time.monotonic() - started) * 1000), queue_wait_ms=queue_wait_ms,
+        usage=usage,
+        tool_calls=[b.name for b in response.content if b.type == "tool_use"],
+    )
+    return response
@@ -0,0 +1,272 @@
+"""
+Priority-aware rate limiter for Anthropic calls, shared by every tenant.
+
+Each call through llm_ledger.create_message() first acquires a slot here. Two
+token buckets per scope, refilled continuously:
+
+- requests per minute       (LLM_GLOBAL_RPM, LLM_ORG_RPM)
+- input tokens per minute   (LLM_GLOBAL_INPUT_TPM, LLM_ORG_INPUT_TPM)
+
+The global buckets protect the Anthropic account limits; the per-organization
+ones keep one tenant's burst from using them up. Input tokens are estimated
+before the call and corrected with response.usage afterwards.
+
+Priorities: live work (lead replies, developer messages) is served first.
+Background work (qualification extraction, media, nurturing) only runs while
+the global buckets stay above LLM_BACKGROUND_RESERVE of their capacity, so it
+is deferred, not dropped, during bursts. Waiters are served in priority, then
+arrival, order; a request blocked by the global buckets blocks everything
+behind it, one blocked by its organization's buckets lets other tenants pass.
+
+A 429 from Anthropic pauses the global buckets for the retry-after period.
+
+Queue wait is returned to the caller (stored per call in llm_calls.queue_wait_ms)
+and summarized in snapshot() for GET /admin/llm-status. Limits are per worker
+process: divide the account limits by the number of workers.
+"""
+
+import asyncio
+import base64
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {LIVE: "live", BACKGROUND: "background"}
+
+_PURPOSE_PRIORITY = {"reply": LIVE, "dev": LIVE}
+
+
+def priority_for(purpose: str) -> int:
+    return _PURPOSE_PRIORITY.get(purpose, BACKGROUND)
+
+
+def estimate_request_tokens(system, messages: list[dict]) -> int:
+    """Input tokens of a messages.create payload (text, tool results and PDFs)."""
+    from app.modules.agent.token_budget import TOKENS_PER_PDF_PAGE, count_pdf_pages, estimate_tokens
+
+    def block_tokens(block) -> int:
+        if isinstance(block, str):
+            return estimate_tokens(block)
+        if not isinstance(block, dict):
+            return estimate_tokens(str(getattr(block, "text", "") or getattr(block, "input", "")))
+        if block.get("type") == "document":
+            data = block.get("source", {}).get("data", "")
+            return count_pdf_pages(base64.b64decode(data)) * TOKENS_PER_PDF_PAGE if data else 0
+        content = block.get("text") or block.get("content") or ""
+        return sum(block_tokens(b) for b in content) if isinstance(content, list) else estimate_tokens(content)
+
+    total = block_tokens(system) if isinstance(system, str) else sum(block_tokens(b) for b in system or [])
+    for msg in messages:
+        content = msg["content"]
+        total += block_tokens(content) if isinstance(content, str) else sum(block_tokens(b) for b in content)
+    return total
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously; <= 0 means unlimited."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def _refill(self, now: float) -> None:
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken leaving `reserve` of the capacity."""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        floor = reserve * self.capacity
+        # A request bigger than the bucket goes through once the bucket is full
+        needed = min(amount, self.capacity - floor) + floor
+        return max(0.0, (needed - self.level) * 60.0 / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= amount
+
+    def drain(self, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    org: Optional[str] = field(compare=False)
+    tokens: int = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class LLMRateLimiter:
+    def __init__(self) -> None:
+        self._configured = False
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._paused_until = 0.0
+        self._org_buckets: dict[str, tuple[TokenBucket, TokenBucket]] = {}
+        self._waits: dict[int, deque] = {LIVE: deque(maxlen=500), BACKGROUND: deque(maxlen=500)}
+        self._granted: dict[int, int] = {LIVE: 0, BACKGROUND: 0}
+
+    def _configure(self) -> None:
+        settings = get_settings()
+        self._global = (TokenBucket(settings.llm_global_rpm), TokenBucket(settings.llm_global_input_tpm))
+        self._org_limits = (settings.llm_org_rpm, settings.llm_org_input_tpm)
+        self._reserve = settings.llm_background_reserve
+        self._configured = True
+
+    def _org(self, org: Optional[str]) -> Optional[tuple[TokenBucket, TokenBucket]]:
+        if not org:
+            return None
+        if org not in self._org_buckets:
+            self._org_buckets[org] = (TokenBucket(self._org_limits[0]), TokenBucket(self._org_limits[1]))
+        return self._org_buckets[org]
+
+    def _global_wait(self, w: _Waiter, now: float) -> float:
+        reserve = self._reserve if w.priority == BACKGROUND else 0.0
+        requests, tokens = self._global
+        return max(
+            self._paused_until - now,
+            requests.wait_time(1, now, reserve),
+            tokens.wait_time(w.tokens, now, reserve),
+        )
+
+    def _org_wait(self, w: _Waiter, now: float) -> float:
+        buckets = self._org(w.org)
+        if not buckets:
+            return 0.0
+        return max(buckets[0].wait_time(1, now), buckets[1].wait_time(w.tokens, now))
+
+    def _grant(self, w: _Waiter, now: float) -> float:
+        for requests, tokens in filter(None, (self._global, self._org(w.org))):
+            requests.take(1, now)
+            tokens.take(w.tokens, now)
+        waited = now - w.enqueued
+        self._waits[w.priority].append(waited)
+        self._granted[w.priority] += 1
+        return waited
+
+    async def acquire(self, org: Optional[str], tokens: int, purpose: str) -> float:
+        """Wait for a slot for one call. Returns the seconds spent queued."""
+        if not self._configured:
+            self._configure()
+        now = time.monotonic()
+        w = _Waiter(priority_for(purpose), next(self._seq), org, tokens, now, asyncio.get_running_loop().create_future())
+        if not self._queue and self._global_wait(w, now) <= 0 and self._org_wait(w, now) <= 0:
+            return self._grant(w, now)
+        heapq.heappush(self._queue, w)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        try:
+            return await w.future
+        except asyncio.CancelledError:
+            if w in self._queue:
+                self._queue.remove(w)
+                heapq.heapify(self._queue)
+            raise
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            now = time.monotonic()
+            next_check = 1.0
+            for w in sorted(self._queue):
+                if w.future.done():
+                    self._queue.remove(w)
+                    continue
+                wait = self._global_wait(w, now)
+                if wait > 0:
+                    next_check = min(next_check, wait)
+                    break
+                wait = self._org_wait(w, now)
+                if wait > 0:
+                    next_check = min(next_check, wait)
+                    continue
+                self._queue.remove(w)
+                w.future.set_result(self._grant(w, now))
+            heapq.heapify(self._queue)
+            if not self._queue:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(next_check, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    def settle(self, org: Optional[str], estimated: int, actual: int) -> None:
+        """Charge (or refund) the difference between estimated and billed input tokens."""
+        if not self._configured or actual == estimated:
+            return
+        now = time.monotonic()
+        for buckets in filter(None, (self._global, self._org(org))):
+            buckets[1].take(actual - estimated, now)
+        self._wakeup.set()
+
+    def rate_limited(self, retry_after: float) -> None:
+        """Anthropic answered 429: hold every caller for `retry_after` seconds."""
+        if not self._configured:
+            self._configure()
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + retry_after)
+        for bucket in self._global:
+            bucket.drain(now)
+        logger.warning("Anthropic rate limit hit, pausing LLM calls for %.0fs", retry_after)
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        return sum(1 for w in self._queue if priority is None or w.priority == priority)
+
+    def snapshot(self) -> dict:
+        """Queue depth, recent queue waits and bucket levels, for the admin status endpoint."""
+        if not self._configured:
+            self._configure()
+        now = time.monotonic()
+        requests, tokens = self._global
+        for bucket in self._global:
+            bucket.wait_time(0, now)  # refill before reading
+        waits = {}
+        for priority, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[PRIORITY_NAMES[priority]] = {
+                "queued": self.queue_depth(priority),
+                "granted": self._granted[priority],
+                "wait_p50_ms": int(ordered[len(ordered) // 2] * 1000) if ordered else 0,
+                "wait_p95_ms": int(ordered[int(len(ordered) * 0.95)] * 1000) if ordered else 0,
+                "wait_max_ms": int(ordered[-1] * 1000) if ordered else 0,
+            }
+        return {
+            "queues": waits,
+            "paused_for_s": round(max(0.0, self._paused_until - now), 1),
+            "global": {
+                "requests_available": None if requests.unlimited else int(requests.level),
+                "requests_per_minute": requests.capacity or None,
+                "input_tokens_available": None if tokens.unlimited else int(tokens.level),
+                "input_tokens_per_minute": tokens.capacity or None,
+            },
+        }
+
+
+limiter = LLMRateLimiter()
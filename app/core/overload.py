@@ -0,0 +1,140 @@
+"""
+Overload detection for the lead agent (admission control).
+
+Two signals, measured in this worker:
+
+- pending live LLM calls: queued in the rate limiter plus in flight
+- p95 latency of the recent lead/developer calls, deferred answers included
+  (last LATENCY_WINDOW samples, at most LATENCY_MAX_AGE seconds old)
+
+The worker turns "degraded" when either passes its threshold (OVERLOAD_PENDING_CALLS,
+OVERLOAD_P95_SECONDS) and back to "normal" once both are under half the
+threshold and at least OVERLOAD_MIN_SECONDS have passed, so it does not flap.
+Lead turns also run degraded while the Anthropic circuit breaker is not closed
+(app/core/circuit_breaker.py): the live call would fail at once.
+
+While degraded the lead handler acknowledges each lead with a template right
+away, answers later in the background without PDFs and skips qualification
+extraction (see lead_handler._degraded_turn; the pending answer is persisted on
+the lead and the answer-deferred-replies job recovers it after a restart).
+Organizations choose per agent_configs.degradation: "auto" (follow this
+monitor), "off" (never degrade) or "forced" (always, e.g. during maintenance).
+
+State, transitions and counters: snapshot(), shown by GET /admin/llm-status.
+"""
+
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 100
+LATENCY_MAX_AGE = 300.0
+MIN_SAMPLES = 5
+
+_LIVE_PURPOSES = ("reply", "dev")
+# Deferred answers keep measuring Anthropic latency while live calls are paused
+_LATENCY_PURPOSES = (*_LIVE_PURPOSES, "deferred_reply")
+
+
+def _anthropic_circuit() -> str:
+    from app.core.circuit_breaker import breakers
+    return breakers.get("anthropic").state
+
+
+class OverloadMonitor:
+    def __init__(self) -> None:
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)  # (monotonic, seconds)
+        self.inflight = 0
+        self.degraded = False
+        self._since = time.monotonic()
+        self._since_wall = datetime.now(timezone.utc)
+        self.transitions = 0
+        self.degraded_turns = 0
+
+    # ---- signals (fed by llm_ledger.create_message) ----
+
+    def call_started(self, purpose: str) -> None:
+        if purpose in _LIVE_PURPOSES:
+            self.inflight += 1
+
+    def call_finished(self, purpose: str, latency_s: float) -> None:
+        if purpose in _LIVE_PURPOSES:
+            self.inflight -= 1
+        if purpose in _LATENCY_PURPOSES:
+            self._latencies.append((time.monotonic(), latency_s))
+
+    def p95_latency(self) -> Optional[float]:
+        cutoff = time.monotonic() - LATENCY_MAX_AGE
+        recent = sorted(s for t, s in self._latencies if t >= cutoff)
+        if len(recent) < MIN_SAMPLES:
+            return None
+        return recent[min(len(recent) - 1, int(len(recent) * 0.95))]
+
+    def pending(self) -> int:
+        from app.core.llm_limiter import LIVE, limiter
+        return limiter.queue_depth(LIVE) + self.inflight
+
+    # ---- decision ----
+
+    def _update(self) -> None:
+        settings = get_settings()
+        pending = self.pending()
+        p95 = self.p95_latency() or 0.0
+        now = time.monotonic()
+        if not self.degraded:
+            if pending >= settings.overload_pending_calls or p95 >= settings.overload_p95_seconds:
+                self._switch(True, now, pending, p95)
+        elif (
+            now - self._since >= settings.overload_min_seconds
+            and pending < settings.overload_pending_calls / 2
+            and p95 < settings.overload_p95_seconds / 2
+        ):
+            self._switch(False, now, pending, p95)
+
+    def _switch(self, degraded: bool, now: float, pending: int, p95: float) -> None:
+        self.degraded = degraded
+        self._since = now
+        self._since_wall = datetime.now(timezone.utc)
+        self.transitions += 1
+        logger.warning(
+            "Lead agent %s (pending live calls=%d, p95 latency=%.1fs)",
+            "DEGRADED" if degraded else "back to normal", pending, p95,
+        )
+
+    def should_degrade(self, org_mode: str = "auto") -> bool:
+        """Whether a lead turn for an organization with `org_mode` runs degraded."""
+        if org_mode == "off":
+            return False
+        if org_mode == "forced":
+            return True
+        if _anthropic_circuit() != "closed":
+            return True
+        self._update()
+        return self.degraded
+
+    def snapshot(self) -> dict:
+        self._update()
+        settings = get_settings()
+        p95 = self.p95_latency()
+        return {
+            "state": "degraded" if self.degraded else "normal",
+            "since": self._since_wall,
+            "anthropic_circuit": _anthropic_circuit(),
+            "pending_live_calls": self.pending(),
+            "p95_latency_s": round(p95, 2) if p95 is not None else None,
+            "thresholds": {
+                "pending_live_calls": settings.overload_pending_calls,
+                "p95_latency_s": settings.overload_p95_seconds,
+            },
+            "transitions": self.transitions,
+            "degraded_turns": self.degraded_turns,
+        }
+
+
+monitor = OverloadMonitor()
@@ -0,0 +1,247 @@
+"""In-process scheduler for the periodic jobs (alerts, stale handoffs, payment states, ...).
+
+Every worker of every instance runs the same schedule; Postgres decides who
+actually runs each firing:
+
+- pg_try_advisory_lock on the job name, held for the whole run on a dedicated
+  connection opened outside the pool (closing it releases the lock), so a job
+  never overlaps with itself and a long run does not tie up a pool connection;
+- a job_runs row keyed by (job_name, scheduled_for), inserted before running,
+  so a firing slot already claimed by another worker is skipped even after that
+  run has finished and released the lock.
+
+Schedules are 5-field cron expressions evaluated in UTC. Each firing waits a
+random 0..scheduler_jitter_seconds first, spreading the workers' attempts (and
+the jobs that share a minute) instead of having them all hit the database at once.
+The /admin/jobs/* endpoints stay available for manual runs.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))  # day of week: 0 and 7 are Sunday
+
+
+def _parse_field(expr: str, lo: int, hi: int) -> frozenset[int]:
+    values: set[int] = set()
+    for part in expr.split(","):
+        rng, _, step = part.partition("/")
+        if rng == "*":
+            start, end = lo, hi
+        elif "-" in rng:
+            start, end = (int(x) for x in rng.split("-", 1))
+        else:
+            start = end = int(rng)
+            if step:
+                end = hi
+        if not (lo <= start <= hi and lo <= end <= hi and start <= end):
+            raise ValueError(f"Cron field out of range: {part!r}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """Standard 5-field cron expression: minute hour day-of-month month day-of-week.
+
+    Supports *, lists, ranges and steps (*/15, 1-5, 0,30, 10-50/10). As in cron,
+    when both day fields are restricted a day matches if either does.
+    """
+
+    def __init__(self, expr: str) -> None:
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELD_RANGES)
+        )
+        self.weekdays = frozenset(d % 7 for d in self.weekdays)
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        weekday = (dt.weekday() + 1) % 7  # cron: 0 = Sunday
+        if self._any_day or self._any_weekday:
+            return dt.day in self.days and weekday in self.weekdays
+        return dt.day in self.days or weekday in self.weekdays
+
+    def next_after(self, dt: datetime) -> datetime:
+        """First firing strictly after dt (same tzinfo as dt)."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
+
+
+@dataclass
+class Job:
+    name: str
+    schedule: CronSchedule
+    func: Callable[[], Awaitable[Any]]
+
+
+class JobScheduler:
+    def __init__(self) -> None:
+        self.worker_id = uuid.uuid4().hex
+        self._jobs: dict[str, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, name: str, cron: str, func: Callable[[], Awaitable[Any]]) -> None:
+        self._jobs[name] = Job(name, CronSchedule(cron), func)
+
+    @property
+    def jobs(self) -> list[Job]:
+        return list(self._jobs.values())
+
+    async def start(self) -> None:
+        settings = get_settings()
+        if not settings.scheduler_enabled:
+            logger.info("Job scheduler disabled (SCHEDULER_ENABLED=false)")
+            return
+        disabled = {n.strip() for n in settings.scheduler_disabled_jobs.split(",") if n.strip()}
+        for job in self._jobs.values():
+            if job.name not in disabled:
+                self._tasks.append(asyncio.create_task(self._loop(job)))
+        logger.info("Job scheduler started: %d jobs (worker=%s)", len(self._tasks), self.worker_id)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _loop(self, job: Job) -> None:
+        jitter = get_settings().scheduler_jitter_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            slot = job.schedule.next_after(now)
+            delay = (slot - now).total_seconds() + random.uniform(0, jitter)
+            await asyncio.sleep(delay)
+            try:
+                await self.run(job, slot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Scheduled job %s could not be started: %s", job.name, e)
+
+    async def run(self, job: Job, slot: datetime) -> Optional[dict]:
+        """Run one firing of `job` if this worker wins it. Returns the run row, or
+        None when another worker holds the job or already ran this slot."""
+        import asyncpg
+
+        from app.database import get_pool
+
+        # The lock lives on its own connection, outside the pool: the job's
+        # queries need pool connections, and a long run must not keep one of
+        # them checked out. Closing the connection releases the lock.
+        lock_conn = await asyncpg.connect(get_settings().database_url)
+        try:
+            if not await lock_conn.fetchval("SELECT pg_try_advisory_lock(hashtext('job:' || $1))", job.name):
+                logger.debug("Job %s is running elsewhere, skipping %s", job.name, slot)
+                return None
+            pool = await get_pool()
+            run_id = await pool.fetchval(
+                """INSERT INTO job_runs (job_name, scheduled_for, worker_id)
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT (job_name, scheduled_for) DO NOTHING
+                   RETURNING id""",
+                job.name, slot, self.worker_id,
+            )
+            if run_id is None:
+                return None
+            started = time.monotonic()
+            status, result, error = "ok", None, None
+            try:
+                result = await job.func()
+            except Exception as e:
+                status, error = "error", str(e)
+                logger.error("Scheduled job %s failed: %s", job.name, e)
+            duration_ms = int((time.monotonic() - started) * 1000)
+            row = await pool.fetchrow(
+                """UPDATE job_runs
+                   SET status = $2, finished_at = NOW(), duration_ms = $3, result = $4::jsonb, error = $5
+                   WHERE id = $1
+                   RETURNING id, job_name, scheduled_for, started_at, finished_at, duration_ms, status""",
+                run_id, status, duration_ms,
+                json.dumps(result, default=str) if result is not None else None, error,
+            )
+            logger.info("Scheduled job %s: %s in %dms", job.name, status, duration_ms)
+            return dict(row)
+        finally:
+            await lock_conn.close()
+
+
+async def _alerts():
+    from app.services.alerts_service import evaluate_alerts
+    return await evaluate_alerts()
+
+
+async def _close_stale_handoffs():
+    from app.admin.routers.tools import close_stale_handoffs
+    return await close_stale_handoffs()
+
+
+async def _update_payment_states():
+    from app.admin.routers.tools import update_payment_states
+    return await update_payment_states()
+
+
+async def _nurturing():
+    from app.modules.leads.nurturing import process_nurturing_batch
+    return {"messages_sent": await process_nurturing_batch()}
+
+
+async def _archive_conversations():
+    from app.services.conversation_archive import archive_old_partitions
+    return await archive_old_partitions()
+
+
+async def _purge_response_cache():
+    from app.modules.agent.response_cache import purge_expired
+    return await purge_expired()
+
+
+async def _answer_deferred_replies():
+    from app.modules.agent.lead_handler import answer_deferred_replies
+    return await answer_deferred_replies()
+
+
+async def _purge_llm_calls():
+    from app.core.llm_ledger import purge_old_calls
+    return await purge_old_calls()
+
+
+scheduler = JobScheduler()
+# Times are UTC (Argentina is UTC-3)
+scheduler.add("alerts", "0 8 * * *", _alerts)
+scheduler.add("close-stale-handoffs", "*/30 * * * *", _close_stale_handoffs)
+scheduler.add("update-payment-states", "5 3 * * *", _update_payment_states)
+scheduler.add("nurturing", "0 14 * * *", _nurturing)
+scheduler.add("archive-conversations", "30 4 1 * *", _archive_conversations)
+scheduler.add("purge-response-cache", "15 5 * * *", _purge_response_cache)
+scheduler.add("purge-llm-calls", "45 5 * * *", _purge_llm_calls)
+scheduler.add("answer-deferred-replies", "*/2 * * * *", _answer_deferred_replies)
@@ -1,40 +1,440 @@
 """
 SSE Connection Manager — manages active Server-Sent Event connections per tenant.
 
-Architecture note: this manager keeps connections in-process memory. It works
-correctly with a single Uvicorn worker (Realia's current Render deploy). If the
-service is ever scaled to multiple workers/instances, this must be replaced with
-a Redis Pub/Sub broker so all instances share the same event bus.
+Architecture note: connections (one bounded queue per browser tab) always live
+in the memory of the worker that accepted them. Fan-out across workers goes
+through a broker, selected with SSE_BROKER:
+
+- "memory"   (default) — broadcast only reaches connections on this worker.
+  Correct for a single Uvicorn worker.
+- "postgres" — every worker holds one dedicated LISTEN connection on the
+  `realia_sse` channel and broadcasts are published with pg_notify, so an event
+  raised by a webhook on worker A reaches a browser connected to worker B.
+  NOTIFY payloads are capped at 8000 bytes: larger events are stored in
+  sse_event_payloads and only their id is notified (id-then-fetch).
+
+Every event carries an id (`id:` line), delivered in increasing order on each
+worker. Per-connection queues are bounded: a newer `handoff_update` for a lead
+replaces the one still queued, and on overflow the oldest events are dropped and
+the client gets a `resync` event. Each tenant keeps a ring buffer of recent
+events so a client reconnecting with Last-Event-ID gets what came after that
+event replayed; when the buffer no longer holds that event (evicted, or a
+worker that never saw it) it gets `resync` instead.
 """
 
+import abc
 import asyncio
+import itertools
 import json
 import logging
-from collections import defaultdict
+import secrets
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import asyncpg
+
+from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+PG_CHANNEL = "realia_sse"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more; keep headroom for the envelope.
+PG_MAX_INLINE_PAYLOAD = 7000
+PG_PAYLOAD_RETENTION = "10 minutes"
+
+SSE_QUEUE_MAXSIZE = 256      # pending events per connection
+SSE_REPLAY_BUFFER = 500      # recent events kept per tenant for Last-Event-ID
+SSE_REORDER_WAIT = 1.0       # seconds an out-of-order event waits for the ids before it
+COALESCED_EVENTS = {"handoff_update"}
+# Events that carry full state: only the latest matters, and it is kept per
+# tenant so new connections can start from it (see app/core/live_metrics.py).
+SNAPSHOT_EVENTS = {"metrics"}
+
+
+def format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    payload = json.dumps(data, default=str)
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event}\ndata: {payload}\n\n"
+
+
+@dataclass(eq=False)
+class SSEEvent:
+    id: Optional[int]
+    event: str
+    data: dict
+    message: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.message = format_sse(self.event, self.data, self.id)
+
+    @property
+    def coalesce_key(self) -> Optional[str]:
+        """Events with the same key supersede each other while still queued."""
+        if self.event in SNAPSHOT_EVENTS:
+            return self.event
+        if self.event in COALESCED_EVENTS and self.data.get("lead_id"):
+            return f"{self.event}:{self.data['lead_id']}"
+        return None
+
+
+class SSEClientQueue:
+    """Bounded per-connection queue with coalescing.
+
+    - a queued event with the same coalesce_key is removed when a newer one
+      arrives (only the latest handoff_update per lead is kept)
+    - when full, the oldest event is dropped and counted in `dropped`; the
+      stream turns that into a `resync` event for the client
+    """
+
+    def __init__(self, maxsize: int = SSE_QUEUE_MAXSIZE) -> None:
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items: deque[SSEEvent] = deque()
+        self._by_key: dict[str, SSEEvent] = {}
+        self._ready = asyncio.Event()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def put_nowait(self, ev: SSEEvent) -> None:
+        key = ev.coalesce_key
+        if key:
+            previous = self._by_key.pop(key, None)
+            if previous is not None:
+                self._items.remove(previous)
+        if len(self._items) >= self.maxsize:
+            oldest = self._items.popleft()
+            if oldest.coalesce_key:
+                self._by_key.pop(oldest.coalesce_key, None)
+            self.dropped += 1
+        self._items.append(ev)
+        if key:
+            self._by_key[key] = ev
+        self._ready.set()
+
+    def get_nowait(self) -> SSEEvent:
+        if not self._items:
+            raise asyncio.QueueEmpty
+        ev = self._items.popleft()
+        if ev.coalesce_key and self._by_key.get(ev.coalesce_key) is ev:
+            del self._by_key[ev.coalesce_key]
+        if not self._items:
+            self._ready.clear()
+        return ev
+
+    async def get(self) -> SSEEvent:
+        while not self._items:
+            await self._ready.wait()
+        return self.get_nowait()
+
+
+class SSEBroker(abc.ABC):
+    """Carries broadcasts to every worker's SSEConnectionManager."""
+
+    async def start(self, manager: "SSEConnectionManager") -> None:
+        self._manager = manager
+
+    async def stop(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, tenant_id: str, event: str, data: dict) -> None:
+        """Deliver an event to the tenant's connections on every worker."""
+
+    async def signal(self, tenant_id: str, event: str) -> None:
+        """Send a control event to the other workers (none for a local broker)."""
+
+
+class InMemoryBroker(SSEBroker):
+    """Single-worker broker: delivers straight to local connections.
+
+    Ids start at a random offset (below 2**52, safe as a JS number), so an id
+    a client kept from a previous process is not mistaken for one of this
+    process: it is not in the ring buffer and the client gets `resync`.
+    """
+
+    def __init__(self) -> None:
+        self._ids = itertools.count(secrets.randbelow(2 ** 52) + 1)
+
+    async def publish(self, tenant_id: str, event: str, data: dict) -> None:
+        self._manager.deliver(tenant_id, event, data, next(self._ids))
+
+
+class PostgresBroker(SSEBroker):
+    """LISTEN/NOTIFY broker: one listener connection per worker, no extra infra.
+
+    Event ids come from the sse_event_seq sequence, allocated in the same
+    statement that sends the NOTIFY, so every worker sees the same id for an
+    event. The publishing worker delivers locally as soon as it has the id; each
+    worker tags its notifications with `worker_id` and skips its own when they
+    come back on the listener.
+
+    Ids reach a worker out of order (its own publishes after the round-trip,
+    NOTIFYs in commit order), so events are delivered in id order: one whose
+    predecessors have not arrived is held until they do, or until
+    SSE_REORDER_WAIT passes (an id whose publish failed never arrives). A
+    straggler arriving after its gap was skipped is delivered at once.
+    """
+
+    def __init__(self, dsn: str) -> None:
+        self._dsn = dsn
+        self.worker_id = uuid.uuid4().hex
+        self._listener: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_cleanup = 0.0
+        # in-order delivery: next id due, events held until it arrives
+        self._next_id: Optional[int] = None
+        self._held: dict[int, tuple[str, str, dict]] = {}
+        self._gap_timer: Optional[asyncio.TimerHandle] = None
+        # payload fetches in flight: the loop only keeps weak references to tasks
+        self._fetches: set[asyncio.Task] = set()
+
+    async def start(self, manager: "SSEConnectionManager") -> None:
+        await super().start(manager)
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listener and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+        if self._gap_timer:
+            self._gap_timer.cancel()
+            self._gap_timer = None
+        for task in list(self._fetches):
+            task.cancel()
+
+    async def _listen_forever(self) -> None:
+        """Hold the LISTEN connection open, reconnecting with backoff if it drops."""
+        backoff = 1.0
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._listener = await asyncpg.connect(self._dsn)
+                self._listener.add_termination_listener(lambda _conn: lost.set())
+                await self._listener.add_listener(PG_CHANNEL, self._on_notify)
+                logger.info("SSE broker listening on %s (worker=%s)", PG_CHANNEL, self.worker_id)
+                backoff = 1.0
+                await lost.wait()
+                logger.warning("SSE broker listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("SSE broker listener error: %s (retry in %.0fs)", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _on_notify(self, _conn, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            logger.warning("SSE broker: unparseable notification dropped")
+            return
+        if msg.get("w") == self.worker_id:
+            return
+        if msg.get("c"):
+            self._manager.deliver(msg["t"], msg["e"], {}, None)
+        elif "id" in msg:
+            task = asyncio.create_task(self._deliver_stored(msg["id"], msg.get("i")))
+            self._fetches.add(task)
+            task.add_done_callback(self._fetches.discard)
+        else:
+            self._deliver_in_order(msg["t"], msg["e"], msg["d"], msg.get("i"))
+
+    async def _deliver_stored(self, payload_id: int, event_id: Optional[int]) -> None:
+        from app.database import get_pool
+
+        try:
+            pool = await get_pool()
+            row = await pool.fetchrow(
+                "SELECT tenant_id, event, data FROM sse_event_payloads WHERE id = $1", payload_id,
+            )
+        except Exception as e:
+            logger.error("SSE broker: failed to fetch payload %s: %s", payload_id, e)
+            return
+        if row:
+            self._deliver_in_order(row["tenant_id"], row["event"], json.loads(row["data"]), event_id)
+
+    def _deliver_in_order(self, tenant_id: str, event: str, data: dict, event_id: Optional[int]) -> None:
+        if event_id is None:
+            self._manager.deliver(tenant_id, event, data, None)
+            return
+        if self._next_id is None:
+            self._next_id = event_id
+        elif event_id < self._next_id:
+            self._manager.deliver(tenant_id, event, data, event_id)
+            return
+        self._held[event_id] = (tenant_id, event, data)
+        self._release()
+
+    def _release(self) -> None:
+        released = False
+        while self._next_id in self._held:
+            tenant_id, event, data = self._held.pop(self._next_id)
+            self._manager.deliver(tenant_id, event, data, self._next_id)
+            self._next_id += 1
+            released = True
+        if self._gap_timer and (released or not self._held):
+            self._gap_timer.cancel()
+            self._gap_timer = None
+        if self._held and self._gap_timer is None:
+            self._gap_timer = asyncio.get_running_loop().call_later(SSE_REORDER_WAIT, self._skip_gap)
+
+    def _skip_gap(self) -> None:
+        self._gap_timer = None
+        if self._held:
+            first = min(self._held)
+            logger.debug("SSE broker: ids %d-%d never arrived, skipping", self._next_id, first - 1)
+            self._next_id = first
+            self._release()
+
+    async def publish(self, tenant_id: str, event: str, data: dict) -> None:
+        from app.database import get_pool
+
+        envelope = {"w": self.worker_id, "t": tenant_id, "e": event, "d": data}
+        payload = json.dumps(envelope, default=str)
+        try:
+            pool = await get_pool()
+            if len(payload.encode("utf-8")) <= PG_MAX_INLINE_PAYLOAD:
+                event_id = await pool.fetchval(
+                    """
+                    WITH s AS (SELECT nextval('sse_event_seq') AS id)
+                    SELECT s.id, pg_notify($1, jsonb_set($2::jsonb, '{i}', to_jsonb(s.id))::text) FROM s
+                    """,
+                    PG_CHANNEL, payload,
+                )
+                self._deliver_in_order(tenant_id, event, data, event_id)
+                return
+            event_id = await pool.fetchval("SELECT nextval('sse_event_seq')")
+            payload_id = await pool.fetchval(
+                "INSERT INTO sse_event_payloads (tenant_id, event, data) VALUES ($1, $2, $3::jsonb) RETURNING id",
+                tenant_id, event, json.dumps(data, default=str),
+            )
+            await pool.execute(
+                "SELECT pg_notify($1, $2)",
+                PG_CHANNEL,
+                json.dumps({"w": self.worker_id, "t": tenant_id, "e": event, "id": payload_id, "i": event_id}),
+            )
+        except Exception as e:
+            # Other workers miss this one; local clients still get it, without an
+            # id so their Last-Event-ID does not move past a gap.
+            logger.error("SSE broker publish failed (tenant=%s event=%s): %s", tenant_id, event, e)
+            self._manager.deliver(tenant_id, event, data, None)
+            return
+        self._deliver_in_order(tenant_id, event, data, event_id)
+        try:
+            await self._cleanup_payloads(pool)
+        except Exception as e:
+            logger.warning("SSE broker payload cleanup failed: %s", e)
+
+    async def signal(self, tenant_id: str, event: str) -> None:
+        """Send a control event to the other workers (no id, no data, not
+        forwarded to browsers)."""
+        from app.database import get_pool
+
+        try:
+            pool = await get_pool()
+            await pool.execute(
+                "SELECT pg_notify($1, $2)",
+                PG_CHANNEL, json.dumps({"w": self.worker_id, "t": tenant_id, "e": event, "c": 1}),
+            )
+        except Exception as e:
+            logger.error("SSE broker signal failed (tenant=%s event=%s): %s", tenant_id, event, e)
+
+    async def _cleanup_payloads(self, pool) -> None:
+        now = time.monotonic()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        await pool.execute(
+            f"DELETE FROM sse_event_payloads WHERE created_at < NOW() - INTERVAL '{PG_PAYLOAD_RETENTION}'"
+        )
+
+
+def _make_broker() -> SSEBroker:
+    settings = get_settings()
+    if settings.sse_broker == "postgres":
+        return PostgresBroker(settings.database_url)
+    if settings.sse_broker != "memory":
+        logger.warning("Unknown SSE_BROKER=%r, falling back to in-memory", settings.sse_broker)
+    return InMemoryBroker()
+
 
 class SSEConnectionManager:
     """Maintains a registry of active SSE queues keyed by tenant (organization_id).
 
-    Each connected browser tab gets its own asyncio.Queue. Broadcasting to a
+    Each connected browser tab gets its own SSEClientQueue. Broadcasting to a
     tenant pushes the same event to all queues for that tenant, so multiple
-    admins (or the same admin in multiple tabs) all receive updates.
+    admins (or the same admin in multiple tabs) all receive updates — on every
+    worker, when the broker is shared.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, broker: Optional[SSEBroker] = None) -> None:
         # tenant_id -> list of queues, one per active SSE connection
-        self._connections: dict[str, list[asyncio.Queue]] = defaultdict(list)
+        self._connections: dict[str, list[SSEClientQueue]] = defaultdict(list)
+        # tenant_id -> recent events in delivery order (for Last-Event-ID replay)
+        self._history: dict[str, deque[SSEEvent]] = {}
+        # tenant_id -> event -> latest data, for SNAPSHOT_EVENTS
+        self._latest: dict[str, dict[str, dict]] = defaultdict(dict)
+        # control event -> handler(tenant_id), see on_control()
+        self._control: dict[str, Callable[[str], None]] = {}
+        self._broker = broker
+        self._started = False
 
-    def connect(self, tenant_id: str) -> asyncio.Queue:
-        """Register a new SSE connection and return its dedicated queue."""
-        q: asyncio.Queue = asyncio.Queue()
+    async def start(self) -> None:
+        """Start the broker (called from the app lifespan)."""
+        if self._broker is None:
+            self._broker = _make_broker()
+        await self._broker.start(self)
+        self._started = True
+        logger.info("SSE broker started: %s", type(self._broker).__name__)
+
+    async def stop(self) -> None:
+        if self._broker is not None and self._started:
+            await self._broker.stop()
+        self._started = False
+
+    def connect(self, tenant_id: str, last_event_id: Optional[int] = None) -> SSEClientQueue:
+        """Register a new SSE connection and return its dedicated queue.
+
+        With `last_event_id` (a reconnecting client), the events delivered after
+        that one are queued first; if the ring buffer no longer holds it, a
+        `resync` event is queued instead so the client refetches.
+        """
+        q = SSEClientQueue()
+        if last_event_id is not None:
+            missed = self._events_after(tenant_id, last_event_id)
+            if missed is None:
+                q.put_nowait(SSEEvent(None, "resync", {"reason": "replay_unavailable"}))
+            else:
+                for ev in missed:
+                    q.put_nowait(ev)
         self._connections[tenant_id].append(q)
-        logger.info("SSE connect: tenant=%s total=%d", tenant_id, len(self._connections[tenant_id]))
+        logger.info(
+            "SSE connect: tenant=%s total=%d replayed=%d",
+            tenant_id, len(self._connections[tenant_id]), q.qsize(),
+        )
         return q
 
-    def disconnect(self, tenant_id: str, queue: asyncio.Queue) -> None:
+    def _events_after(self, tenant_id: str, last_event_id: int) -> Optional[list[SSEEvent]]:
+        """Events delivered after `last_event_id`, or None when it is not in the
+        tenant's ring buffer."""
+        history = list(self._history.get(tenant_id, ()))
+        for i, ev in enumerate(history):
+            if ev.id == last_event_id:
+                return [e for e in history[i + 1:] if e.id is not None]
+        return None
+
+    def disconnect(self, tenant_id: str, queue: SSEClientQueue) -> None:
         """Remove a queue when its client disconnects."""
         queues = self._connections.get(tenant_id, [])
         try:
@@ -45,21 +445,64 @@ class SSEConnectionManager:
             self._connections.pop(tenant_id, None)
         logger.info("SSE disconnect: tenant=%s remaining=%d", tenant_id, len(queues))
 
+    def deliver(self, tenant_id: str, event: str, data: dict, event_id: Optional[int] = None) -> None:
+        """Record an event in the tenant's ring buffer and queue it on this
+        worker's connections for that tenant. Never blocks: slow clients get
+        their queue coalesced/trimmed instead (see SSEClientQueue).
+        """
+        handler = self._control.get(event)
+        if handler is not None:
+            handler(tenant_id)
+            return
+        ev = SSEEvent(event_id, event, data)
+        if event in SNAPSHOT_EVENTS:
+            self._latest[tenant_id][event] = data
+        if event_id is not None:
+            history = self._history.get(tenant_id)
+            if history is None:
+                history = self._history[tenant_id] = deque(maxlen=SSE_REPLAY_BUFFER)
+            history.append(ev)
+        for q in list(self._connections.get(tenant_id, ())):
+            q.put_nowait(ev)
+
+    def latest(self, tenant_id: str, event: str) -> Optional[dict]:
+        """Last data seen on this worker for a snapshot event, if any."""
+        return self._latest.get(tenant_id, {}).get(event)
+
+    def remember(self, tenant_id: str, event: str, data: dict) -> None:
+        """Cache snapshot data computed locally without broadcasting it."""
+        self._latest[tenant_id][event] = data
+
+    def forget(self, tenant_id: str, event: str) -> None:
+        """Drop cached snapshot data that is known to be stale."""
+        self._latest.get(tenant_id, {}).pop(event, None)
+
+    def has_connections(self, tenant_id: str) -> bool:
+        """Whether this worker has an open SSE connection for the tenant."""
+        return bool(self._connections.get(tenant_id))
+
+    def on_control(self, event: str, handler: Callable[[str], None]) -> None:
+        """Handle `event` from signal() on this worker instead of sending it to
+        browsers."""
+        self._control[event] = handler
+
+    async def signal(self, tenant_id: str, event: str) -> None:
+        """Raise a control event on the other workers (see on_control)."""
+        if self._broker is not None:
+            await self._broker.signal(tenant_id, event)
+
     async def broadcast(self, tenant_id: str, event: str, data: dict) -> None:
-        """Push an event to all active connections for a tenant.
+        """Push an event to all active connections for a tenant, on every worker.
 
-        This is a non-blocking fire-and-forget: if a queue is full (client is
-        slow) we drop the event for that connection rather than blocking the
-        caller (e.g. the WhatsApp webhook, which must return 200 quickly).
+        Callers fire this with asyncio.create_task, so it never delays the
+        request that produced the event (e.g. the WhatsApp webhook, which must
+        return 200 quickly).
         """
-        payload = json.dumps(data, default=str)
-        message = f"event: {event}\ndata: {payload}\n\n"
-        queues = self._connections.get(tenant_id, [])
-        for q in list(queues):
-            try:
-                q.put_nowait(message)
-            except asyncio.QueueFull:
-                logger.warning("SSE queue full for tenant=%s, dropping event=%s", tenant_id, event)
+        if self._broker is None:
+            # Not started (scripts, tests): local delivery without ids.
+            self.deliver(tenant_id, event, data)
+            return
+        await self._broker.publish(tenant_id, event, data)
 
 
 # Singleton — imported by the admin router and the WhatsApp webhook handler
@@ -29,6 +29,10 @@ from app.config import get_settings, reload_settings
 
 reload_settings()
 from app.database import get_pool, close_pool
+from app.core.llm_ledger import ledger as llm_ledger
+from app.core.scheduler import scheduler
+from app.core.sse import connection_manager
+from app.modules.handoff.registry import handoff_registry
 from app.modules.whatsapp.webhook import router as whatsapp_router
 from app.modules.nocodb_webhook import router as nocodb_router
 from app.admin.api import router as admin_router
@@ -38,7 +42,15 @@ from app.admin.routers import portal as portal_router
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await get_pool()
+    await llm_ledger.start()
+    await connection_manager.start()
+    await handoff_registry.start()
+    await scheduler.start()
     yield
+    await scheduler.stop()
+    await handoff_registry.stop()
+    await connection_manager.stop()
+    await llm_ledger.stop()
     await close_pool()
 
 
@@ -21,6 +21,9 @@ class AgentConfig:
     model: str = "claude-haiku-4-5-20251001"
     max_tokens: int = 500
     temperature: float = 0.4
+    response_cache: str = "off"  # "off" | "exact" | "semantic" (see response_cache.py)
+    degradation: str = "auto"  # "auto" | "off" | "forced" (see app/core/overload.py)
+    degraded_ack: Optional[str] = None
 
 
 async def get_agent_config(organization_id: str) -> AgentConfig:
@@ -45,4 +48,7 @@ async def get_agent_config(organization_id: str) -> AgentConfig:
         model=row["model"] or "claude-haiku-4-5-20251001",
         max_tokens=row["max_tokens"] or 500,
         temperature=float(row["temperature"] or 0.4),
+        response_cache=row.get("response_cache") or "off",
+        degradation=row.get("degradation") or "auto",
+        degraded_ack=row.get("degraded_ack"),
     )
@@ -12,6 +12,8 @@ import re
 from anthropic import AsyncAnthropic
 
 from app.config import get_settings
+from app.core import live_metrics
+from app.core.llm_ledger import create_message
 from app.database import get_pool
 from app.modules.agent.prompts import DEVELOPER_SYSTEM_PROMPT, DEV_ACTION_PROMPT
 from app.modules.project_loader import parse_project_csv, create_project_from_parsed, build_summary
@@ -438,6 +440,7 @@ async def _handle_csv_confirmation(
     if result.get("error"):
         await send_text_message(to=phone, text=_dev_reply(dev_name, f"⚠️ {result['error']}"))
         return
+    live_metrics.touch(developer_id)
 
     reply = (
         f"✅ *Proyecto creado exitosamente*\n\n"
@@ -513,12 +516,7 @@ async def _build_developer_context(developer_id: str) -> str:
         lines.append(f"Estado obra: {proj['delivery_status']} | Entrega: {proj['estimated_delivery'] or '?'}")
 
         units = await pool.fetch(
-            """SELECT u.id, u.identifier, u.floor, u.bedrooms, u.area_m2, u.price_usd,
-                      CASE
-                        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
-                        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'active')    THEN 'reserved'
-                        ELSE 'available'
-                      END AS status
+            """SELECT u.id, u.identifier, u.floor, u.bedrooms, u.area_m2, u.price_usd, u.status
                FROM units u WHERE u.project_id = $1 ORDER BY u.floor, u.identifier""",
             pid,
         )
@@ -651,7 +649,10 @@ async def _classify_and_respond(
         messages.append({"role": role, "content": msg["content"]})
     messages.append({"role": "user", "content": user_message})
 
-    response = await client.messages.create(
+    response = await create_message(
+        client,
+        purpose="dev",
+        organization_id=developer_id,
         model=settings.anthropic_model,
         max_tokens=600,
         system=system,
@@ -704,17 +705,27 @@ async def _action_update_unit(pool, params: dict, developer_id: str) -> dict:
     if new_status not in valid:
         return {"error": f"Estado inválido '{new_status}'. Opciones: {', '.join(valid)}"}
 
-    row = await pool.fetchrow(
-        """UPDATE units u SET status = $1
-           FROM projects p
-           WHERE u.project_id = p.id AND p.organization_id = $2
-             AND UPPER(u.identifier) = $3 AND p.slug = $4
-           RETURNING u.identifier, p.name as project_name, u.status""",
-        new_status, developer_id, identifier, project_slug,
-    )
-    if not row:
-        return {"error": f"No encontré la unidad {identifier} en {project_slug}"}
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            row = await conn.fetchrow(
+                """UPDATE units u SET status = $1
+                   FROM projects p
+                   WHERE u.project_id = p.id AND p.organization_id = $2
+                     AND UPPER(u.identifier) = $3 AND p.slug = $4
+                   RETURNING u.id, u.identifier, p.name as project_name, u.status""",
+                new_status, developer_id, identifier, project_slug,
+            )
+            if not row:
+                return {"error": f"No encontré la unidad {identifier} en {project_slug}"}
+
+            # Same rule as PATCH /admin/units/{id}/status: freeing a unit cancels its active reservation
+            if new_status == "available":
+                await conn.execute(
+                    "UPDATE reservations SET status = 'cancelled', updated_at = NOW() WHERE unit_id = $1 AND status = 'active'",
+                    row["id"],
+                )
 
+    live_metrics.touch(developer_id)
     status_labels = {"available": "disponible", "reserved": "reservada", "sold": "vendida"}
     return {"confirmation": f"Unidad {row['identifier']} de {row['project_name']} ahora está {status_labels.get(new_status, new_status)}"}
 
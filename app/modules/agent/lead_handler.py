@@ -7,20 +7,26 @@ and document sharing.
 import asyncio
 import logging
 import re
-from datetime import datetime, timezone
+import time
 
 from anthropic import AsyncAnthropic
 
 from app.config import get_settings
+from app.core.circuit_breaker import CircuitOpenError
+from app.core.llm_ledger import create_message
+from app.core.overload import monitor as overload_monitor
 from app.core.sse import connection_manager
 from app.database import get_pool
+from app.modules.agent import response_cache
+from app.modules.agent.config_loader import AgentConfig, get_agent_config
 from app.modules.agent.prompts import build_lead_system_prompt
+from app.modules.agent.token_budget import fit_prompt
+from app.modules.agent.unit_search import BUSCAR_UNIDADES_TOOL, run_buscar_unidades
 from app.modules.agent.session import (
-    get_or_create_session,
-    get_conversation_history,
     get_lead_qualification,
     get_developer_context,
     get_developer_projects,
+    load_lead_turn_state,
     save_conversation_message,
     update_lead_qualification,
     update_lead_project,
@@ -29,6 +35,7 @@ from app.modules.handoff.manager import (
     check_active_handoff_by_phone,
     close_handoff,
     handle_lead_message_during_handoff,
+    handoff_timeout,
     initiate_handoff,
 )
 from app.modules.leads.qualification import (
@@ -39,7 +46,7 @@ from app.modules.leads.qualification import (
     merge_qualification,
 )
 from app.modules.rag.ingestion import find_document_for_sharing
-from app.modules.rag.retrieval import get_developer_document_blocks
+from app.modules.rag.retrieval import get_developer_documents
 from app.modules.whatsapp.providers.base import IncomingMessage, TenantChannel
 from app.modules.whatsapp.providers.factory import get_provider as _get_provider
 
@@ -105,8 +112,66 @@ LEAD_TOOLS = [
             "required": ["razon"],
         },
     },
+    BUSCAR_UNIDADES_TOOL,
 ]
 
+# buscar_unidades round-trips allowed per turn before the answer must be final
+MAX_TOOL_ROUNDS = 3
+
+
+# Conversation messages (including the current one) given to the LLM each turn
+HISTORY_LIMIT = 15
+
+
+async def _handle_message_during_handoff(
+    active_handoff: dict,
+    developer_id: str,
+    sender_phone: str,
+    message_id: str,
+    text: str,
+) -> bool:
+    """Record a lead message for the human handling the conversation.
+
+    Returns False, after closing the handoff, when it has timed out (4h without
+    admin activity, or the lead coming back after 2h of silence) and the agent
+    should answer instead. No query is needed for that check: the handoff row
+    carries the timestamps.
+    """
+    timeout = handoff_timeout(active_handoff)
+    if timeout:
+        logger.info("Handoff %s for lead %s, returning to agent", timeout, active_handoff["lead_id"])
+        await close_handoff(str(active_handoff["id"]), lead_note=timeout, send_goodbye=False)
+        return False
+
+    pool = await get_pool()
+    lead_id = str(active_handoff["lead_id"])
+    conv = await save_conversation_message(
+        lead_id=lead_id,
+        wa_message_id=message_id,
+        role="user",
+        sender_type="lead",
+        content=text,
+    )
+    await pool.execute("UPDATE leads SET last_contact = NOW() WHERE id = $1", lead_id)
+    await handle_lead_message_during_handoff(active_handoff, text)
+
+    # Broadcast to the admin inbox so the new message appears instantly
+    asyncio.create_task(
+        connection_manager.broadcast(
+            developer_id,
+            "message",
+            {
+                "lead_id": lead_id,
+                "phone": sender_phone,
+                "content": text,
+                "sender_type": "lead",
+                "timestamp": conv["created_at"].isoformat() if conv else None,
+                "handoff_active": True,
+            },
+        )
+    )
+    return True
+
 
 async def handle_lead_message(
     developer: dict,
@@ -120,75 +185,24 @@ async def handle_lead_message(
     developer_id = developer["developer_id"]
     default_project_id = developer["default_project_id"]
 
-    active_handoff = await check_active_handoff_by_phone(sender_phone)
-    if active_handoff:
-        if message.text:
-            pool = await get_pool()
-
-            # --- Timeout checks ---
-            # 1. If there has been no ADMIN activity for 4 hours, close and resume agent.
-            #    This covers abandoned handoffs where the admin stopped responding.
-            last_activity = active_handoff.get("last_activity_at") or active_handoff.get("started_at")
-            if last_activity:
-                if last_activity.tzinfo is None:
-                    last_activity = last_activity.replace(tzinfo=timezone.utc)
-                if (datetime.now(timezone.utc) - last_activity).total_seconds() > 4 * 3600:
-                    logger.info(
-                        "Handoff 4h inactivity timeout for lead %s, returning to agent",
-                        active_handoff["lead_id"],
-                    )
-                    await close_handoff(str(active_handoff["id"]), lead_note="timeout_4h", send_goodbye=False)
-                    active_handoff = None
-
-            # 2. If lead didn't reply in 30 min (original logic), return control to agent.
-            if active_handoff:
-                last_user = await pool.fetchrow(
-                    """
-                    SELECT created_at FROM conversations
-                    WHERE lead_id = $1 AND role = 'user'
-                    ORDER BY created_at DESC LIMIT 1
-                    """,
-                    active_handoff["lead_id"],
-                )
-                if last_user:
-                    last_at = last_user["created_at"]
-                    if last_at.tzinfo is None:
-                        last_at = last_at.replace(tzinfo=timezone.utc)
-                    if (datetime.now(timezone.utc) - last_at).total_seconds() > 2 * 3600:
-                        logger.info("Handoff timeout (2h) for lead %s, returning to agent", active_handoff["lead_id"])
-                        await close_handoff(str(active_handoff["id"]), lead_note="timeout_2h", send_goodbye=False)
-                        active_handoff = None
-            if active_handoff:
-                lead_id = str(active_handoff["lead_id"])
-                conv = await save_conversation_message(
-                    lead_id=lead_id,
-                    wa_message_id=message_id,
-                    role="user",
-                    sender_type="lead",
-                    content=message.text,
-                )
-                await pool.execute("UPDATE leads SET last_contact = NOW() WHERE id = $1", lead_id)
-                await handle_lead_message_during_handoff(active_handoff, message.text)
-
-                # Broadcast to the admin inbox so the new message appears instantly
-                asyncio.create_task(
-                    connection_manager.broadcast(
-                        developer_id,
-                        "message",
-                        {
-                            "lead_id": lead_id,
-                            "phone": sender_phone,
-                            "content": message.text,
-                            "sender_type": "lead",
-                            "timestamp": conv["created_at"].isoformat() if conv else None,
-                            "handoff_active": True,
-                        },
-                    )
-                )
-                return
+    if message.text:
+        # Answered from the in-memory registry (no query) for almost every phone
+        active_handoff = await check_active_handoff_by_phone(sender_phone)
+        if active_handoff and await _handle_message_during_handoff(
+            active_handoff, developer_id, sender_phone, message_id, message.text,
+        ):
+            return
 
-    session = await get_or_create_session(sender_phone, default_project_id)
-    lead_id = str(session["lead_id"])
+    # Session/lead, qualification, recent history and handoff state in one round-trip.
+    # The current message is saved below, so fetch one less and append it.
+    state = await load_lead_turn_state(sender_phone, default_project_id, history_limit=HISTORY_LIMIT - 1)
+    lead_id = state["lead_id"]
+
+    # The lead's own handoff row is authoritative if the registry was behind
+    if message.text and state["handoff"] and await _handle_message_during_handoff(
+        state["handoff"], developer_id, sender_phone, message_id, message.text,
+    ):
+        return
 
     text = message.text if message_type == "text" else None
     if not text:
@@ -207,46 +221,113 @@ async def handle_lead_message(
             await send_text_message(to=sender_phone, text=reply)
         return
 
-    await save_conversation_message(
-        lead_id=lead_id,
-        wa_message_id=message_id,
-        role="user",
-        sender_type="lead",
-        content=text,
+    async def _save_and_broadcast() -> dict:
+        conv = await save_conversation_message(
+            lead_id=lead_id,
+            wa_message_id=message_id,
+            role="user",
+            sender_type="lead",
+            content=text,
+        )
+        # Broadcast the incoming lead message immediately so the admin inbox updates
+        # before the AI finishes generating a response (which can take a few seconds)
+        asyncio.create_task(
+            connection_manager.broadcast(
+                developer_id,
+                "message",
+                {
+                    "lead_id": lead_id,
+                    "phone": sender_phone,
+                    "content": text,
+                    "sender_type": "lead",
+                    "timestamp": None,
+                    "handoff_active": False,
+                },
+            )
+        )
+        return conv
+
+    # Independent of each other: run concurrently
+    conv, developer_context, developer_projects, agent_config = await asyncio.gather(
+        _save_and_broadcast(),
+        get_developer_context(developer_id),
+        get_developer_projects(developer_id),
+        get_agent_config(developer_id),
     )
+    qualification = state["qualification"]
 
-    # Broadcast the incoming lead message immediately so the admin inbox updates
-    # before the AI finishes generating a response (which can take a few seconds)
-    asyncio.create_task(
-        connection_manager.broadcast(
-            developer_id,
-            "message",
-            {
-                "lead_id": lead_id,
-                "phone": sender_phone,
-                "content": text,
-                "sender_type": "lead",
-                "timestamp": None,
-                "handoff_active": False,
-            },
+    # Admission control: under overload, acknowledge now and answer later
+    if overload_monitor.should_degrade(agent_config.degradation):
+        overload_monitor.degraded_turns += 1
+        await _degraded_turn(developer, lead_id, sender_phone, channel, qualification.get("name"), agent_config)
+        return
+
+    history = [
+        *state["history"],
+        {"role": "user", "content": text, "sender_type": "lead", "created_at": conv["created_at"]},
+    ]
+
+    try:
+        response = await _generate_response(
+            developer_id=developer_id,
+            developer_name=developer["developer_name"],
+            developer_context=developer_context,
+            qualification=qualification,
+            conversation_history=history,
+            user_message=text,
+            lead_name=qualification.get("name"),
+            lead_id=lead_id,
+            agent_config=agent_config,
         )
-    )
+    except CircuitOpenError:
+        # Anthropic's breaker opened during this turn: answer later instead
+        if agent_config.degradation == "off":
+            raise
+        overload_monitor.degraded_turns += 1
+        await _degraded_turn(developer, lead_id, sender_phone, channel, qualification.get("name"), agent_config)
+        return
 
-    qualification = await get_lead_qualification(lead_id)
-    developer_context = await get_developer_context(developer_id)
-    developer_projects = await get_developer_projects(developer_id)
-    history = await get_conversation_history(lead_id, limit=15)
-
-    response = await _generate_response(
-        developer_id=developer_id,
-        developer_name=developer["developer_name"],
-        developer_context=developer_context,
-        qualification=qualification,
-        conversation_history=history,
-        user_message=text,
-        lead_name=qualification.get("name"),
+    reply_text = await _deliver_response(
+        developer_id, default_project_id, lead_id, sender_phone, channel,
+        qualification, history, text, response,
     )
 
+    # Only run extraction when the message has substance and there are still fields to collect
+    missing = build_missing_fields(qualification)
+    if len(text) > 20 and missing != "Todos los datos recopilados.":
+        asyncio.create_task(
+            _safe_task(
+                _update_qualification(
+                    lead_id, history, text, reply_text, qualification.get("project_id"), developer_projects,
+                    organization_id=developer_id,
+                ),
+                label=f"update_qualification lead={lead_id}",
+            )
+        )
+
+
+async def _send_text(channel: TenantChannel | None, to_phone: str, text: str) -> None:
+    if channel:
+        provider = _get_provider(channel)
+        await provider.send_text(to_phone, text)
+    else:
+        from app.modules.whatsapp.sender import send_text_message
+        await send_text_message(to=to_phone, text=text)
+
+
+async def _deliver_response(
+    developer_id: str,
+    default_project_id: str | None,
+    lead_id: str,
+    sender_phone: str,
+    channel: TenantChannel | None,
+    qualification: dict,
+    history: list[dict],
+    text: str,
+    response: dict,
+) -> str:
+    """Save and send the agent's reply, then run its document/handoff actions.
+    Returns the reply text."""
     reply_text = response["text"]
     doc_request = response["doc_request"]
     handoff_trigger = response["handoff_trigger"]
@@ -262,12 +343,7 @@ async def handle_lead_message(
     # initiate_handoff() sends the structured message instead.
     if not handoff_trigger:
         logger.info("Replying to %s: %s", sender_phone, reply_text[:80])
-        if channel:
-            provider = _get_provider(channel)
-            await provider.send_text(sender_phone, reply_text)
-        else:
-            from app.modules.whatsapp.sender import send_text_message
-            await send_text_message(to=sender_phone, text=reply_text)
+        await _send_text(channel, sender_phone, reply_text)
 
     # Broadcast AI response to the admin inbox — non-blocking
     asyncio.create_task(
@@ -309,17 +385,231 @@ async def handle_lead_message(
             )
         )
 
-    # Only run extraction when the message has substance and there are still fields to collect
-    missing = build_missing_fields(qualification)
-    if len(text) > 20 and missing != "Todos los datos recopilados.":
+    return reply_text
+
+
+# ---------------------------------------------------------------------------
+# Degraded mode (app/core/overload.py): acknowledge now, answer in the background
+# ---------------------------------------------------------------------------
+DEGRADED_ACK = "¡Hola{nombre}! Recibimos tu consulta, en unos minutos te respondemos con el detalle."
+DEFERRED_CIRCUIT_RETRIES = 10
+# Lease on leads.deferred_claimed_until, renewed before every attempt; longer
+# than the longest circuit breaker wait
+DEFERRED_CLAIM_SECONDS = 600
+# Answer rounds per claim (each one answers the lead's latest message)
+DEFERRED_MAX_ROUNDS = 5
+# The sweep leaves fresh entries to the worker that acknowledged them, and gives
+# up on answers pending longer than this
+DEFERRED_SWEEP_GRACE_SECONDS = 60
+DEFERRED_MAX_AGE_HOURS = 6
+
+# Tasks answering in this worker (cross-worker exclusion is the DB lease)
+_deferred: dict[str, asyncio.Task] = {}
+
+
+def _degraded_ack_text(agent_config: AgentConfig, lead_name: str | None) -> str:
+    template = agent_config.degraded_ack or DEGRADED_ACK
+    return template.replace("{nombre}", f" {lead_name}" if lead_name else "")
+
+
+async def _degraded_turn(
+    developer: dict,
+    lead_id: str,
+    sender_phone: str,
+    channel: TenantChannel | None,
+    lead_name: str | None,
+    agent_config: AgentConfig,
+) -> None:
+    """Mark the lead as waiting for an answer (leads.deferred_reply_since),
+    acknowledge it once per pending answer, and start the background answer
+    unless one is already running; messages arriving meanwhile are answered by it
+    or, failing that, by the answer-deferred-replies sweep."""
+    developer_id = developer["developer_id"]
+    pool = await get_pool()
+    already_pending = await pool.fetchval(
+        """WITH prev AS (SELECT deferred_reply_since FROM leads WHERE id = $1 FOR UPDATE)
+           UPDATE leads l SET deferred_reply_since = NOW(), deferred_channel_id = $2
+           FROM prev
+           WHERE l.id = $1
+           RETURNING prev.deferred_reply_since IS NOT NULL""",
+        lead_id, channel.id if channel else None,
+    )
+    if not already_pending:
+        ack = _degraded_ack_text(agent_config, lead_name)
+        await save_conversation_message(lead_id=lead_id, role="assistant", sender_type="agent", content=ack)
+        await _send_text(channel, sender_phone, ack)
         asyncio.create_task(
-            _safe_task(
-                _update_qualification(lead_id, history, text, reply_text, qualification.get("project_id"), developer_projects),
-                label=f"update_qualification lead={lead_id}",
+            connection_manager.broadcast(
+                developer_id,
+                "message",
+                {
+                    "lead_id": lead_id,
+                    "phone": sender_phone,
+                    "content": ack,
+                    "sender_type": "agent",
+                    "timestamp": None,
+                    "handoff_active": False,
+                },
             )
         )
+    _start_deferred_reply(developer, lead_id, sender_phone, channel, agent_config)
 
 
+def _start_deferred_reply(
+    developer: dict,
+    lead_id: str,
+    sender_phone: str,
+    channel: TenantChannel | None,
+    agent_config: AgentConfig,
+) -> bool:
+    task = _deferred.get(lead_id)
+    if task and not task.done():
+        return False
+    _deferred[lead_id] = asyncio.create_task(
+        _safe_task(
+            _deferred_reply(developer, lead_id, sender_phone, channel, agent_config),
+            label=f"deferred_reply lead={lead_id}",
+        )
+    )
+    return True
+
+
+async def _claim_deferred(lead_id: str):
+    """Take or renew this worker's lease on the lead's pending answer. Returns the
+    claim time (DB clock), or None if nothing is pending or another worker holds it."""
+    from app.core.scheduler import scheduler
+    pool = await get_pool()
+    return await pool.fetchval(
+        """UPDATE leads
+           SET deferred_claimed_until = NOW() + make_interval(secs => $2), deferred_claimed_by = $3
+           WHERE id = $1 AND deferred_reply_since IS NOT NULL
+             AND (deferred_claimed_until IS NULL OR deferred_claimed_until < NOW() OR deferred_claimed_by = $3)
+           RETURNING NOW()""",
+        lead_id, DEFERRED_CLAIM_SECONDS, scheduler.worker_id,
+    )
+
+
+async def _deferred_reply(
+    developer: dict,
+    lead_id: str,
+    sender_phone: str,
+    channel: TenantChannel | None,
+    agent_config: AgentConfig,
+) -> None:
+    """Answer the lead's pending messages at background priority, without PDFs
+    and without qualification extraction. While the Anthropic circuit is open it
+    waits and retries (up to DEFERRED_CIRCUIT_RETRIES times).
+
+    Runs under the lead's lease (leads.deferred_claimed_until), so only one
+    worker answers a lead at a time. The pending mark is cleared only if no
+    message was marked after the last look at the history; otherwise, and when
+    answering fails, the sweep picks the lead up again.
+    """
+    developer_id = developer["developer_id"]
+    pool = await get_pool()
+    checked_at = None
+    answered = False
+    try:
+        checked_at = await _claim_deferred(lead_id)
+        if checked_at is None:
+            return  # answered already, or another worker is on it
+        for _ in range(DEFERRED_MAX_ROUNDS):
+            state = await load_lead_turn_state(
+                sender_phone, developer["default_project_id"], history_limit=HISTORY_LIMIT,
+            )
+            if state["handoff"]:
+                answered = True
+                return  # a human took over meanwhile
+            ack = _degraded_ack_text(agent_config, state["qualification"].get("name"))
+            history = [m for m in state["history"] if not (m["sender_type"] == "agent" and m["content"] == ack)]
+            if not history or history[-1]["sender_type"] != "lead":
+                answered = True
+                return  # everything answered
+            text = history[-1]["content"]
+            for attempt in range(DEFERRED_CIRCUIT_RETRIES + 1):
+                try:
+                    response = await _generate_response(
+                        developer_id=developer_id,
+                        developer_name=developer["developer_name"],
+                        developer_context=await get_developer_context(developer_id),
+                        qualification=state["qualification"],
+                        conversation_history=history,
+                        user_message=text,
+                        lead_name=state["qualification"].get("name"),
+                        lead_id=lead_id,
+                        agent_config=agent_config,
+                        degraded=True,
+                    )
+                    break
+                except CircuitOpenError as e:
+                    if attempt == DEFERRED_CIRCUIT_RETRIES:
+                        raise
+                    # Anthropic is down: wait for the breaker's probe window
+                    await asyncio.sleep(max(e.retry_in, 5.0))
+                    await _claim_deferred(lead_id)
+            await _deliver_response(
+                developer_id, developer["default_project_id"], lead_id, sender_phone, channel,
+                state["qualification"], history, text, response,
+            )
+            checked_at = await _claim_deferred(lead_id)
+            if checked_at is None:
+                return
+    finally:
+        _deferred.pop(lead_id, None)
+        if checked_at is not None:
+            await pool.execute(
+                """UPDATE leads
+                   SET deferred_claimed_until = NULL, deferred_claimed_by = NULL,
+                       deferred_reply_since = CASE WHEN $2 AND deferred_reply_since <= $3
+                                                   THEN NULL ELSE deferred_reply_since END
+                   WHERE id = $1""",
+                lead_id, answered, checked_at,
+            )
+
+
+async def answer_deferred_replies() -> dict:
+    """Scheduled sweep: answer leads left waiting after a degraded turn whose
+    answer is not running anywhere (restart, deploy, failed attempt, or a message
+    that arrived as the previous answer finished)."""
+    from app.modules.agent.router import build_developer, tenant_channel_from_row
+
+    pool = await get_pool()
+    expired = await pool.fetch(
+        """UPDATE leads SET deferred_reply_since = NULL, deferred_claimed_until = NULL, deferred_claimed_by = NULL
+           WHERE deferred_reply_since < NOW() - make_interval(hours => $1)
+           RETURNING id""",
+        DEFERRED_MAX_AGE_HOURS,
+    )
+    for r in expired:
+        logger.error("Deferred reply for lead %s pending over %dh, giving up", r["id"], DEFERRED_MAX_AGE_HOURS)
+
+    rows = await pool.fetch(
+        """SELECT l.id, l.phone, COALESCE(tc.organization_id, p.organization_id) AS organization_id,
+                  tc.id AS channel_id, tc.provider, tc.phone_number, tc.display_name, tc.account_sid,
+                  tc.auth_token, tc.access_token, tc.phone_number_id, tc.verify_token, tc.waba_id
+           FROM leads l
+           LEFT JOIN tenant_channels tc ON tc.id::text = l.deferred_channel_id
+           LEFT JOIN projects p ON p.id = l.project_id
+           WHERE l.deferred_reply_since IS NOT NULL
+             AND l.deferred_reply_since < NOW() - make_interval(secs => $1)
+             AND (l.deferred_claimed_until IS NULL OR l.deferred_claimed_until < NOW())
+           ORDER BY l.deferred_reply_since
+           LIMIT 100""",
+        DEFERRED_SWEEP_GRACE_SECONDS,
+    )
+    started = 0
+    for r in rows:
+        if not r["organization_id"]:
+            continue
+        developer = await build_developer(str(r["organization_id"]))
+        if not developer:
+            continue
+        channel = tenant_channel_from_row({**dict(r), "id": r["channel_id"]}) if r["channel_id"] else None
+        agent_config = await get_agent_config(developer["developer_id"])
+        if _start_deferred_reply(developer, str(r["id"]), r["phone"], channel, agent_config):
+            started += 1
+    return {"started": started, "expired": len(expired)}
+
 
 def _build_handoff_context(
     qualification: dict, history: list[dict], last_message: str, last_response: str,
@@ -429,16 +719,32 @@ async def _generate_response(
     conversation_history: list[dict],
     user_message: str,
     lead_name: str | None = None,
+    lead_id: str | None = None,
+    agent_config: AgentConfig | None = None,
+    degraded: bool = False,
 ) -> dict:
-    """Call Claude with tool_use. Returns {text, doc_request, handoff_trigger}."""
-    from app.modules.agent.config_loader import get_agent_config
+    """Call Claude with tool_use. Returns {text, doc_request, handoff_trigger}.
+
+    degraded: deferred answer after an overload acknowledgement — no PDFs, and
+    the calls run at background priority.
+    """
     settings = get_settings()
     client = AsyncAnthropic(api_key=settings.anthropic_api_key)
 
-    agent_config = await get_agent_config(developer_id)
+    if agent_config is None:
+        agent_config = await get_agent_config(developer_id)
 
     is_first_contact = len(conversation_history) == 0
 
+    # The history already holds the current message: one entry means a new lead
+    cached = await response_cache.probe(
+        developer_id, qualification.get("project_id"), agent_config.response_cache, user_message,
+        len(conversation_history) <= 1,
+    )
+    if cached and cached.answer:
+        logger.info("Response cache hit developer=%s: %r", developer_id, cached.norm)
+        return {"text": cached.answer, "doc_request": None, "handoff_trigger": None}
+
     system = build_lead_system_prompt(
         agent_config=agent_config,
         developer_name=developer_name,
@@ -455,70 +761,124 @@ async def _generate_response(
             "Sé cálido pero conciso."
         )
 
+    # Only attach PDFs when the message is relevant (saves tokens)
+    documents = []
+    if not degraded and _should_attach_pdfs(user_message, conversation_history):
+        documents = await get_developer_documents(developer_id)
+
+    history = [
+        {"role": "user" if msg["sender_type"] == "lead" else "assistant", "content": msg["content"]}
+        for msg in conversation_history[:-1]
+    ]
+
+    prompt = fit_prompt(
+        budget=settings.lead_prompt_token_budget,
+        system=system,
+        tools=LEAD_TOOLS,
+        user_message=user_message,
+        unit_state=developer_context,
+        history=history,
+        documents=documents,
+    )
+    logger.info("Prompt budget developer=%s: %s", developer_id, prompt.log_line())
+
     messages = []
 
-    # Only attach PDFs when the message is relevant (saves tokens)
-    if _should_attach_pdfs(user_message, conversation_history):
-        doc_blocks = await get_developer_document_blocks(developer_id)
-        if doc_blocks:
-            messages.append({
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Documentos del proyecto adjuntos para consulta:"},
-                    *doc_blocks,
-                ],
-            })
-            messages.append({
-                "role": "assistant",
-                "content": "Entendido, tengo los documentos del proyecto disponibles para consultar.",
-            })
-
-    for msg in conversation_history[:-1]:
-        role = "user" if msg["sender_type"] == "lead" else "assistant"
-        messages.append({"role": role, "content": msg["content"]})
+    if prompt.documents:
+        doc_blocks = [dict(block) for block in prompt.documents]
+        doc_blocks[-1]["cache_control"] = {"type": "ephemeral"}
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "Documentos del proyecto adjuntos para consulta:"},
+                *doc_blocks,
+            ],
+        })
+        messages.append({
+            "role": "assistant",
+            "content": "Entendido, tengo los documentos del proyecto disponibles para consultar.",
+        })
+
+    messages.extend(prompt.history)
 
     # Unit context injected AFTER history so it overrides any stale data in old messages
     messages.append({
         "role": "user",
         "content": (
-            f"⚠️ ESTADO ACTUAL DE UNIDADES (fuente de verdad — invalida cualquier dato anterior):\n"
-            f"{developer_context}\n"
-            f"IMPORTANTE: Usá SOLO esta información para responder preguntas sobre disponibilidad. "
-            f"Si una unidad NO aparece en la lista de disponibles, ya fue reservada o vendida."
+            f"⚠️ ESTADO ACTUAL DE LOS PROYECTOS (fuente de verdad — invalida cualquier dato anterior):\n"
+            f"{prompt.unit_state}\n"
+            f"IMPORTANTE: Este es solo un resumen. Para ofrecer unidades concretas, confirmar precios o "
+            f"superficies, o verificar si una unidad sigue disponible, usá SIEMPRE `buscar_unidades`. "
+            f"Si una unidad no aparece como disponible en la búsqueda, ya fue reservada o vendida."
         ),
     })
     messages.append({
         "role": "assistant",
-        "content": "Entendido, tengo el estado actualizado de todas las unidades.",
+        "content": "Entendido, tengo el resumen actualizado y consulto las unidades con buscar_unidades.",
     })
 
-    messages.append({"role": "user", "content": user_message})
+    messages.append({"role": "user", "content": prompt.user_message})
 
-    response = await client.messages.create(
-        model=agent_config.model,
-        max_tokens=agent_config.max_tokens,
-        temperature=agent_config.temperature,
-        system=system,
-        messages=messages,
-        tools=LEAD_TOOLS,
-    )
-
-    # Parse response: extract text and tool calls
     result = {"text": "", "doc_request": None, "handoff_trigger": None}
+    started = time.monotonic()
+
+    for tool_round in range(MAX_TOOL_ROUNDS + 1):
+        response = await create_message(
+            client,
+            purpose="deferred_reply" if degraded else "reply",
+            organization_id=developer_id,
+            lead_id=lead_id,
+            estimated_tokens=prompt.sizes["total"],
+            model=agent_config.model,
+            max_tokens=agent_config.max_tokens,
+            temperature=agent_config.temperature,
+            system=system,
+            messages=messages,
+            # Last round: no more searches, the model has to answer
+            tools=LEAD_TOOLS if tool_round < MAX_TOOL_ROUNDS else [t for t in LEAD_TOOLS if t is not BUSCAR_UNIDADES_TOOL],
+        )
 
-    for block in response.content:
-        if block.type == "text":
-            result["text"] = block.text
-        elif block.type == "tool_use":
-            if block.name == "enviar_documento":
-                inp = block.input
-                result["doc_request"] = {
-                    "doc_type": inp["tipo"],
-                    "unit_identifier": inp.get("unidad"),
-                    "project_slug": inp["proyecto_slug"],
-                }
-            elif block.name == "derivar_vendedor":
-                result["handoff_trigger"] = block.input["razon"]
+        # Parse response: extract text and tool calls
+        searches = []
+        for block in response.content:
+            if block.type == "text":
+                result["text"] = block.text
+            elif block.type == "tool_use":
+                if block.name == "enviar_documento":
+                    inp = block.input
+                    result["doc_request"] = {
+                        "doc_type": inp["tipo"],
+                        "unit_identifier": inp.get("unidad"),
+                        "project_slug": inp["proyecto_slug"],
+                    }
+                elif block.name == "derivar_vendedor":
+                    result["handoff_trigger"] = block.input["razon"]
+                elif block.name == "buscar_unidades":
+                    searches.append(block)
+
+        if not searches:
+            break
+
+        # buscar_unidades needs its results back: answer every tool call of
+        # this turn (the action tools are acknowledged) and ask again.
+        tool_results = []
+        for block in response.content:
+            if block.type != "tool_use":
+                continue
+            if block.name == "buscar_unidades":
+                content = await run_buscar_unidades(developer_id, block.input)
+            else:
+                content = "Listo."
+            tool_results.append({"type": "tool_result", "tool_use_id": block.id, "content": content})
+        messages.append({"role": "assistant", "content": response.content})
+        messages.append({"role": "user", "content": tool_results})
+
+    if (
+        cached and result["text"]
+        and not result["doc_request"] and not result["handoff_trigger"]
+        and not (lead_name and lead_name.lower() in result["text"].lower())
+    ):
+        await response_cache.store(cached, result["text"], int((time.monotonic() - started) * 1000))
 
     return result
 
@@ -530,6 +890,7 @@ async def _update_qualification(
     assistant_response: str,
     current_project_id: str | None = None,
     developer_projects: list[dict] | None = None,
+    organization_id: str | None = None,
 ) -> None:
     """Extract qualification data from conversation and update the lead record.
     Also detects which project the lead is actually asking about and reassigns if needed.
@@ -539,7 +900,9 @@ async def _update_qualification(
         full_history.append({"sender_type": "lead", "content": user_message})
         full_history.append({"sender_type": "agent", "content": assistant_response})
 
-        extracted = await extract_qualification_data(full_history)
+        extracted = await extract_qualification_data(
+            full_history, organization_id=organization_id, lead_id=lead_id,
+        )
         if not extracted:
             return
 
@@ -0,0 +1,249 @@
+"""
+Per-organization cache of lead agent answers (opt-in, agent_configs.response_cache).
+
+Modes:
+- "off"      (default) every turn calls Claude
+- "exact"    reuse an answer to the same normalized question (lowercase, no
+             accents/punctuation, leading greeting and trailing thanks dropped)
+- "semantic" as exact, then the closest earlier question by embedding
+             (OpenAI, cosine >= response_cache_similarity)
+
+Entries belong to the organization's context version (migration 052): any
+change to its units, projects, documents or agent config bumps the version and
+clears the cache, and an answer generated while the version moved is not stored.
+
+Entries are per project: a lead only gets answers given on the project it is
+assigned to, and a lead without a project is never served from the cache.
+
+Only generic questions are cached. A turn is bypassed when it is the first
+contact (personalized greeting), the message carries data about the lead
+(numbers, budget, bedrooms, "busco", "tengo", ...), i.e. when the answer
+depends on the lead's qualification, or it is a follow-up that only makes sense
+after earlier turns ("¿y la cochera?", "¿cuánto sale esa?"). Answers that
+triggered an action (document, handoff) or mention the lead's name are not
+stored.
+
+Every probe is counted per organization and day (lookups, hits, bypassed and
+the generation time the hits saved) in response_cache_stats.
+"""
+
+import asyncio
+import logging
+import math
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from app.config import get_settings
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+MAX_QUESTION_CHARS = 160
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 256
+SEMANTIC_CANDIDATES = 200
+
+# Stats writes in flight: the loop only keeps weak references to tasks
+_stats_writes: set[asyncio.Task] = set()
+
+_GREETING = re.compile(r"^(hola|buenas|buen dia|buenos dias|buenas tardes|buenas noches)\b\s*")
+_THANKS = re.compile(r"\s*\b(gracias|muchas gracias|saludos)$")
+_QUALIFICATION_DEPENDENT = re.compile(
+    r"\d|\b(busco|buscamos|quiero|queremos|necesito|necesitamos|tengo|tenemos|me llamo|soy|mi|mis|"
+    r"presupuesto|usd|dolares|ambientes?|dormitorios?|recomend\w*|conviene|"
+    r"para (vivir|invertir|alquilar|mudarme|mudarnos))\b"
+)
+# Refers back to the conversation: opens with "y ..." / "entonces ..." or points
+# at something named before ("esa", "la misma", "la otra", "ahí")
+_FOLLOW_UP = re.compile(
+    r"^(y|e|entonces|pero|tambien)\b|"
+    r"\b(ese|esa|esos|esas|eso|este|estos|aquel\w*|mismo|misma|otro|otra|otros|otras|anterior|ahi|alli)\b"
+)
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, strip accents and punctuation, drop greeting/thanks."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = _GREETING.sub("", text)
+    return _THANKS.sub("", text).strip()
+
+
+def is_cacheable(norm: str, is_first_contact: bool) -> bool:
+    """Generic question whose answer does not depend on who asks or on what
+    was said before."""
+    return (
+        not is_first_contact
+        and 0 < len(norm) <= MAX_QUESTION_CHARS
+        and not _QUALIFICATION_DEPENDENT.search(norm)
+        and not _FOLLOW_UP.search(norm)
+    )
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+async def _embed(text: str) -> Optional[list[float]]:
+    settings = get_settings()
+    if not settings.openai_api_key:
+        return None
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.post(
+                "https://api.openai.com/v1/embeddings",
+                headers={"Authorization": f"Bearer {settings.openai_api_key}"},
+                json={"model": EMBEDDING_MODEL, "input": text, "dimensions": EMBEDDING_DIMENSIONS},
+            )
+            response.raise_for_status()
+            return response.json()["data"][0]["embedding"]
+    except Exception as e:
+        logger.warning("Response cache embedding failed: %s", e)
+        return None
+
+
+@dataclass
+class CacheProbe:
+    organization_id: str
+    project_id: str
+    mode: str
+    question: str
+    norm: str
+    version: int
+    embedding: Optional[list[float]] = None
+    answer: Optional[str] = None
+
+
+async def probe(
+    organization_id: str,
+    project_id: Optional[str],
+    mode: str,
+    question: str,
+    is_first_contact: bool,
+) -> Optional[CacheProbe]:
+    """Look the question up for the lead's project. None when the cache is off or
+    the turn is bypassed; otherwise a CacheProbe with `answer` set on a hit (pass
+    misses to store())."""
+    if mode not in ("exact", "semantic"):
+        return None
+    norm = normalize_question(question)
+    if not project_id or not is_cacheable(norm, is_first_contact):
+        _record(organization_id, bypassed=True)
+        return None
+
+    settings = get_settings()
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT v.version, c.id, c.answer, c.generation_ms
+        FROM (SELECT COALESCE(
+                (SELECT version FROM org_context_versions WHERE organization_id = $1), 0) AS version) v
+        LEFT JOIN response_cache c
+               ON c.organization_id = $1 AND c.context_version = v.version
+              AND c.project_id = $4 AND c.question_norm = $2
+              AND c.created_at > NOW() - make_interval(hours => $3)
+        """,
+        organization_id, norm, settings.response_cache_ttl_hours, project_id,
+    )
+    result = CacheProbe(organization_id, str(project_id), mode, question, norm, row["version"])
+    hit_id, answer, saved_ms = row["id"], row["answer"], row["generation_ms"]
+
+    if hit_id is None and mode == "semantic":
+        result.embedding = await _embed(norm)
+        if result.embedding:
+            candidates = await pool.fetch(
+                """
+                SELECT id, answer, generation_ms, embedding FROM response_cache
+                WHERE organization_id = $1 AND context_version = $2 AND project_id = $5
+                  AND embedding IS NOT NULL
+                  AND created_at > NOW() - make_interval(hours => $3)
+                ORDER BY hits DESC, created_at DESC
+                LIMIT $4
+                """,
+                organization_id, result.version, settings.response_cache_ttl_hours, SEMANTIC_CANDIDATES,
+                project_id,
+            )
+            best, best_score = None, settings.response_cache_similarity
+            for c in candidates:
+                score = _cosine(result.embedding, c["embedding"])
+                if score >= best_score:
+                    best, best_score = c, score
+            if best:
+                hit_id, answer, saved_ms = best["id"], best["answer"], best["generation_ms"]
+                logger.debug("Response cache semantic hit org=%s score=%.3f", organization_id, best_score)
+
+    result.answer = answer
+    _record(organization_id, hit_id=hit_id, saved_ms=saved_ms or 0)
+    return result
+
+
+async def store(entry: CacheProbe, answer: str, generation_ms: int) -> None:
+    """Save a freshly generated answer, unless the context changed meanwhile."""
+    try:
+        pool = await get_pool()
+        await pool.execute(
+            """
+            INSERT INTO response_cache
+                (organization_id, context_version, project_id, question_norm, question, answer,
+                 embedding, generation_ms)
+            SELECT $1, $2, $8, $3, $4, $5, $6, $7
+            WHERE COALESCE((SELECT version FROM org_context_versions WHERE organization_id = $1), 0) = $2
+            ON CONFLICT (organization_id, context_version, project_id, question_norm) DO NOTHING
+            """,
+            entry.organization_id, entry.version, entry.norm, entry.question, answer,
+            entry.embedding, generation_ms, entry.project_id,
+        )
+    except Exception as e:
+        logger.error("Response cache store failed for org %s: %s", entry.organization_id, e)
+
+
+def _record(organization_id: str, hit_id=None, saved_ms: int = 0, bypassed: bool = False) -> None:
+    """Count the probe (and the entry's hit) without delaying the reply."""
+    try:
+        task = asyncio.get_running_loop().create_task(_write_stats(organization_id, hit_id, saved_ms, bypassed))
+    except RuntimeError:
+        return
+    _stats_writes.add(task)
+    task.add_done_callback(_stats_writes.discard)
+
+
+async def _write_stats(organization_id: str, hit_id, saved_ms: int, bypassed: bool) -> None:
+    try:
+        pool = await get_pool()
+        await pool.execute(
+            """
+            WITH hit AS (
+                UPDATE response_cache SET hits = hits + 1, last_hit_at = NOW() WHERE id = $2
+            )
+            INSERT INTO response_cache_stats (organization_id, day, lookups, hits, bypassed, saved_ms)
+            VALUES ($1, CURRENT_DATE, $3, $4, $5, $6)
+            ON CONFLICT (organization_id, day) DO UPDATE SET
+                lookups  = response_cache_stats.lookups + EXCLUDED.lookups,
+                hits     = response_cache_stats.hits + EXCLUDED.hits,
+                bypassed = response_cache_stats.bypassed + EXCLUDED.bypassed,
+                saved_ms = response_cache_stats.saved_ms + EXCLUDED.saved_ms
+            """,
+            organization_id, hit_id,
+            0 if bypassed else 1, 1 if hit_id else 0, 1 if bypassed else 0, saved_ms,
+        )
+    except Exception as e:
+        logger.error("Response cache stats failed for org %s: %s", organization_id, e)
+
+
+async def purge_expired() -> dict:
+    """Delete entries past the TTL (scheduled job)."""
+    pool = await get_pool()
+    result = await pool.execute(
+        "DELETE FROM response_cache WHERE created_at < NOW() - make_interval(hours => $1)",
+        get_settings().response_cache_ttl_hours,
+    )
+    return {"deleted": int(result.split()[-1])}
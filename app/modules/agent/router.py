@@ -100,6 +100,11 @@ async def resolve_tenant_channel(phone_hint: str, provider: str) -> TenantChanne
     if not row:
         return None
 
+    return tenant_channel_from_row(row)
+
+
+def tenant_channel_from_row(row) -> TenantChannel:
+    """Build a TenantChannel from a tenant_channels row."""
     return TenantChannel(
         id=str(row["id"]),
         organization_id=str(row["organization_id"]),
@@ -115,6 +120,30 @@ async def resolve_tenant_channel(phone_hint: str, provider: str) -> TenantChanne
     )
 
 
+async def build_developer(developer_id: str) -> dict | None:
+    """The developer dict the handlers take: organization name and default
+    (first active) project. None if the organization does not exist."""
+    pool = await get_pool()
+    dev = await pool.fetchrow(
+        "SELECT id, name FROM organizations WHERE id = $1",
+        developer_id,
+    )
+    if not dev:
+        return None
+
+    proj = await pool.fetchrow(
+        "SELECT id, name FROM projects WHERE organization_id = $1 AND status = 'active' AND deleted_at IS NULL ORDER BY name LIMIT 1",
+        developer_id,
+    )
+
+    return {
+        "developer_id": developer_id,
+        "developer_name": dev["name"],
+        "default_project_id": str(proj["id"]) if proj else None,
+        "default_project_name": proj["name"] if proj else None,
+    }
+
+
 async def route_message(
     channel: TenantChannel,
     sender_phone: str,
@@ -130,30 +159,12 @@ async def route_message(
     """
     from app.config import get_settings
     settings = get_settings()
-    pool = await get_pool()
 
     developer_id = channel.organization_id
-
-    # Fetch org name and default project to build the developer dict
-    dev = await pool.fetchrow(
-        "SELECT id, name FROM organizations WHERE id = $1",
-        developer_id,
-    )
-    if not dev:
+    developer = await build_developer(developer_id)
+    if not developer:
         return
 
-    proj = await pool.fetchrow(
-        "SELECT id, name FROM projects WHERE organization_id = $1 AND status = 'active' AND deleted_at IS NULL ORDER BY name LIMIT 1",
-        developer_id,
-    )
-
-    developer = {
-        "developer_id": developer_id,
-        "developer_name": dev["name"],
-        "default_project_id": str(proj["id"]) if proj else None,
-        "default_project_name": proj["name"] if proj else None,
-    }
-
     is_dev = False
     auth = None
 
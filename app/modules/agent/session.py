@@ -3,8 +3,11 @@ Session Manager: handles persistent state per phone+project combination.
 Creates leads and sessions on first contact.
 """
 
+import asyncio
 import json
+from datetime import datetime
 
+from app.core import live_metrics
 from app.database import get_pool
 
 
@@ -22,11 +25,14 @@ async def get_or_create_session(phone: str, project_id: str) -> dict:
         return dict(row)
 
     lead = await pool.fetchrow(
-        "INSERT INTO leads (project_id, phone) VALUES ($1, $2) RETURNING id",
+        """INSERT INTO leads (project_id, phone, organization_id)
+           VALUES ($1, $2, (SELECT organization_id FROM projects WHERE id = $1))
+           RETURNING id, organization_id""",
         project_id,
         phone,
     )
     lead_id = str(lead["id"])
+    live_metrics.touch(lead["organization_id"])
 
     session = await pool.fetchrow(
         "INSERT INTO sessions (phone, project_id, lead_id, state) VALUES ($1, $2, $3, $4::jsonb) RETURNING *",
@@ -39,6 +45,110 @@ async def get_or_create_session(phone: str, project_id: str) -> dict:
     return dict(session)
 
 
+_QUALIFICATION_FIELDS = (
+    "name", "intent", "financing", "timeline", "score",
+    "budget_usd", "bedrooms", "location_pref", "project_id",
+)
+
+# $1 phone, $2 project_id, $3 history limit. Data-modifying CTEs share the
+# statement's snapshot, so the join on leads finds nothing for a lead created
+# here: its only set qualification column, project_id, comes from new_lead's
+# RETURNING; the rest is NULL, and it has no history and no handoff yet.
+# When another request created the session first, new_session inserts nothing
+# and the single row returned has a NULL lead_id and the now orphaned lead in
+# new_lead_id (deleted before retrying).
+_TURN_STATE_SQL = f"""
+WITH existing AS (
+    SELECT lead_id, state FROM sessions WHERE phone = $1 AND project_id = $2
+),
+new_lead AS (
+    INSERT INTO leads (project_id, phone, organization_id)
+    SELECT $2, $1, (SELECT organization_id FROM projects WHERE id = $2)
+    WHERE NOT EXISTS (SELECT 1 FROM existing)
+    RETURNING id, organization_id, project_id
+),
+new_session AS (
+    INSERT INTO sessions (phone, project_id, lead_id, state)
+    SELECT $1, $2, id, '{{}}'::jsonb FROM new_lead
+    ON CONFLICT (phone, project_id) DO NOTHING
+    RETURNING lead_id, state
+),
+s AS (
+    SELECT lead_id, state, FALSE AS created FROM existing
+    UNION ALL
+    SELECT lead_id, state, TRUE FROM new_session
+    UNION ALL
+    SELECT NULL, NULL, FALSE FROM new_lead WHERE NOT EXISTS (SELECT 1 FROM new_session)
+)
+SELECT s.lead_id, s.state, s.created, nl.id AS new_lead_id, nl.organization_id AS new_lead_organization_id,
+       {", ".join(f"l.{c}" for c in _QUALIFICATION_FIELDS if c != "project_id")},
+       COALESCE(l.project_id, nl.project_id) AS project_id,
+       l.last_user_message_at,
+       (SELECT COALESCE(json_agg(m ORDER BY m.created_at), '[]'::json)
+        FROM (SELECT role, content, sender_type, created_at
+              FROM conversations
+              WHERE lead_id = s.lead_id
+              ORDER BY created_at DESC
+              LIMIT $3) m) AS history,
+       h.id AS handoff_id, h.project_id AS handoff_project_id,
+       h.started_at AS handoff_started_at, h.last_activity_at AS handoff_last_activity_at
+FROM s
+LEFT JOIN leads l ON l.id = s.lead_id
+LEFT JOIN new_lead nl ON TRUE
+LEFT JOIN LATERAL (
+    SELECT id, project_id, started_at, last_activity_at FROM handoffs
+    WHERE lead_id = s.lead_id AND status = 'active'
+    ORDER BY started_at DESC
+    LIMIT 1
+) h ON TRUE
+"""
+
+
+async def load_lead_turn_state(phone: str, project_id: str, history_limit: int = 15) -> dict:
+    """Everything a lead turn needs before calling the LLM, in one round-trip.
+
+    Gets or creates the session (and lead) and returns
+    {"lead_id", "session_state", "created", "qualification", "history", "handoff"}:
+    qualification as get_lead_qualification(), the last `history_limit`
+    messages oldest first as get_conversation_history(), and the lead's active
+    handoff (with last_user_message_at, for handoff_timeout()) or None.
+    """
+    pool = await get_pool()
+    row = await pool.fetchrow(_TURN_STATE_SQL, phone, project_id, history_limit)
+    if row["lead_id"] is None:
+        # Lost a first-contact race: drop the lead we created, the other
+        # request's session (and lead) is there now.
+        await pool.execute("DELETE FROM leads WHERE id = $1", row["new_lead_id"])
+        row = await pool.fetchrow(_TURN_STATE_SQL, phone, project_id, history_limit)
+    if row["created"]:
+        live_metrics.touch(row["new_lead_organization_id"])
+
+    history = json.loads(row["history"])
+    for msg in history:
+        msg["created_at"] = datetime.fromisoformat(msg["created_at"])
+
+    handoff = None
+    if row["handoff_id"]:
+        handoff = {
+            "id": row["handoff_id"],
+            "lead_id": row["lead_id"],
+            "project_id": row["handoff_project_id"],
+            "started_at": row["handoff_started_at"],
+            "last_activity_at": row["handoff_last_activity_at"],
+            "last_user_message_at": row["last_user_message_at"],
+        }
+
+    state = row["state"]
+    return {
+        "lead_id": str(row["lead_id"]),
+        "session_state": json.loads(state) if isinstance(state, str) else (state or {}),
+        "created": row["created"],
+        "qualification": {c: row[c] for c in _QUALIFICATION_FIELDS if row[c] is not None},
+        "history": history,
+        "handoff": handoff,
+    }
+
+
 async def update_session_state(phone: str, project_id: str, state: dict) -> None:
     """Update the session state (qualification progress, etc.)."""
     pool = await get_pool()
@@ -76,13 +186,30 @@ async def save_conversation_message(
     media_type: str | None = None,
     media_url: str | None = None,
 ) -> dict:
-    """Save a message to the conversations table."""
+    """Save a message to the conversations table.
+
+    Also refreshes the denormalized inbox fields on leads (last_message_*,
+    last_user_message_at) in the same statement.
+    """
     pool = await get_pool()
     row = await pool.fetchrow(
         """
-        INSERT INTO conversations (lead_id, wa_message_id, role, sender_type, content, media_type, media_url)
-        VALUES ($1, $2, $3, $4, $5, $6, $7)
-        RETURNING id
+        WITH c AS (
+            INSERT INTO conversations (lead_id, wa_message_id, role, sender_type, content, media_type, media_url)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            RETURNING id, created_at
+        ),
+        l AS (
+            UPDATE leads
+            SET last_message_at = c.created_at,
+                last_message_preview = LEFT($5, 280),
+                last_message_role = $3,
+                last_user_message_at = CASE WHEN $3 = 'user' THEN c.created_at
+                                            ELSE leads.last_user_message_at END
+            FROM c
+            WHERE leads.id = $1
+        )
+        SELECT id, created_at FROM c
         """,
         lead_id,
         wa_message_id,
@@ -110,8 +237,9 @@ async def get_lead_qualification(lead_id: str) -> dict:
 async def update_lead_qualification(lead_id: str, qualification: dict, score: str) -> None:
     """Persist qualification data and score on the leads table."""
     pool = await get_pool()
-    await pool.execute(
+    row = await pool.fetchrow(
         """
+        WITH prev AS (SELECT score FROM leads WHERE id = $1)
         UPDATE leads
         SET name = COALESCE($2, name),
             intent = COALESCE($3, intent),
@@ -122,7 +250,9 @@ async def update_lead_qualification(lead_id: str, qualification: dict, score: st
             location_pref = COALESCE($8, location_pref),
             score = $9,
             last_contact = NOW()
+        FROM prev
         WHERE id = $1
+        RETURNING leads.organization_id, prev.score AS old_score
         """,
         lead_id,
         qualification.get("name"),
@@ -134,6 +264,8 @@ async def update_lead_qualification(lead_id: str, qualification: dict, score: st
         qualification.get("location_pref"),
         score,
     )
+    if row and row["old_score"] != score:
+        live_metrics.touch(row["organization_id"])
 
 
 async def get_developer_projects(developer_id: str) -> list[dict]:
@@ -150,7 +282,9 @@ async def update_lead_project(lead_id: str, project_id: str) -> None:
     """Reassign a lead to a different project."""
     pool = await get_pool()
     await pool.execute(
-        "UPDATE leads SET project_id = $1 WHERE id = $2",
+        """UPDATE leads
+           SET project_id = $1, organization_id = (SELECT organization_id FROM projects WHERE id = $1)
+           WHERE id = $2""",
         project_id,
         lead_id,
     )
@@ -176,8 +310,15 @@ async def set_test_mode(phone: str, active: bool) -> None:
     )
 
 
+def _range(lo, hi, fmt: str, missing: str) -> str:
+    if lo is None:
+        return missing
+    lo_s, hi_s = fmt.format(float(lo)), fmt.format(float(hi))
+    return lo_s if lo_s == hi_s else f"{lo_s} a {hi_s}"
+
+
 async def get_developer_context(developer_id: str) -> str:
-    """Load ALL projects for a developer with full details, units, and documents."""
+    """Load ALL projects for a developer with full details, unit summaries and documents."""
     pool = await get_pool()
 
     projects = await pool.fetch(
@@ -192,12 +333,38 @@ async def get_developer_context(developer_id: str) -> str:
     if not projects:
         return "No se encontraron proyectos para este desarrollador."
 
+    # Unit summaries and documents of every project: two queries, run concurrently.
+    # Individual units are not listed: the agent looks them up with buscar_unidades.
+    project_ids = [p["id"] for p in projects]
+    unit_rows, doc_rows = await asyncio.gather(
+        pool.fetch(
+            """SELECT project_id, status, bedrooms, COUNT(*) AS n,
+                      MIN(price_usd) AS min_price, MAX(price_usd) AS max_price,
+                      MIN(area_m2) AS min_area, MAX(area_m2) AS max_area
+               FROM units WHERE project_id = ANY($1::uuid[])
+               GROUP BY project_id, status, bedrooms
+               ORDER BY bedrooms NULLS LAST""",
+            project_ids,
+        ),
+        pool.fetch(
+            """SELECT project_id, doc_type, filename, unit_identifier FROM documents
+               WHERE project_id = ANY($1::uuid[]) AND is_active = TRUE
+               ORDER BY doc_type, unit_identifier""",
+            project_ids,
+        ),
+    )
+    units_by_project: dict = {}
+    for u in unit_rows:
+        units_by_project.setdefault(u["project_id"], []).append(u)
+    docs_by_project: dict = {}
+    for d in doc_rows:
+        docs_by_project.setdefault(d["project_id"], []).append(d)
+
     delivery_labels = {
         "en_pozo": "En pozo (preventa)",
         "en_construccion": "En construcción",
         "terminado": "Terminado / entrega inmediata",
     }
-    unit_status_labels = {"available": "disponible", "reserved": "reservada", "sold": "vendida"}
     doc_type_labels = {
         "plano": "Plano", "precios": "Lista de precios", "brochure": "Brochure",
         "memoria": "Memoria descriptiva", "reglamento": "Reglamento de copropiedad",
@@ -207,7 +374,6 @@ async def get_developer_context(developer_id: str) -> str:
     lines = [f"Proyectos del desarrollador ({len(projects)} en total):\n"]
 
     for proj in projects:
-        proj_id = str(proj["id"])
         lines.append(f"### {proj['name']} (slug: {proj['slug']})")
 
         if proj["address"]:
@@ -236,38 +402,25 @@ async def get_developer_context(developer_id: str) -> str:
         if proj["payment_info"]:
             lines.append(f"Formas de pago: {proj['payment_info']}")
 
-        units = await pool.fetch(
-            """SELECT u.identifier, u.floor, u.bedrooms, u.area_m2, u.price_usd,
-                      CASE
-                        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
-                        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'active')    THEN 'reserved'
-                        ELSE 'available'
-                      END AS status
-               FROM units u WHERE u.project_id = $1 ORDER BY u.floor, u.identifier""",
-            proj_id,
-        )
-        if units:
-            available = [u for u in units if u["status"] == "available"]
-            reserved = [u for u in units if u["status"] == "reserved"]
-            sold = [u for u in units if u["status"] == "sold"]
-            lines.append(f"\nUnidades ({len(units)} total — {len(available)} disponibles, {len(reserved)} reservadas, {len(sold)} vendidas):")
+        groups = units_by_project.get(proj["id"], [])
+        if groups:
+            count = {st: sum(g["n"] for g in groups if g["status"] == st) for st in ("available", "reserved", "sold")}
+            lines.append(
+                f"\nUnidades ({sum(g['n'] for g in groups)} total — {count['available']} disponibles, "
+                f"{count['reserved']} reservadas, {count['sold']} vendidas)."
+            )
+            available = [g for g in groups if g["status"] == "available"]
             if available:
-                lines.append("Unidades disponibles:")
-                for u in available:
-                    price_str = f"USD {u['price_usd']:,.0f}" if u["price_usd"] else "precio a confirmar"
-                    area_str = f"{u['area_m2']}m²" if u["area_m2"] else "superficie a confirmar"
-                    lines.append(
-                        f"  - {u['identifier']}: Piso {u['floor']}, "
-                        f"{u['bedrooms']} amb, {area_str}, "
-                        f"{price_str}"
-                    )
+                lines.append("Disponibles por ambientes (consultá buscar_unidades para el detalle):")
+                for g in available:
+                    amb = f"{g['bedrooms']} amb" if g["bedrooms"] is not None else "Sin dato de ambientes"
+                    area = _range(g["min_area"], g["max_area"], "{:g} m²", "superficie a confirmar")
+                    price = _range(g["min_price"], g["max_price"], "USD {:,.0f}", "precio a confirmar")
+                    lines.append(f"  - {amb}: {g['n']} ({area}; {price})")
             else:
                 lines.append("  (No hay unidades disponibles en este momento)")
 
-        docs = await pool.fetch(
-            "SELECT doc_type, filename, unit_identifier FROM documents WHERE project_id = $1 AND is_active = TRUE ORDER BY doc_type, unit_identifier",
-            proj_id,
-        )
+        docs = docs_by_project.get(proj["id"], [])
         if docs:
             lines.append(f"\nDocumentos disponibles ({len(docs)}):")
             for d in docs:
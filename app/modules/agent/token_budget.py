@@ -0,0 +1,160 @@
+"""
+Prompt token budget for the lead agent.
+
+_generate_response assembles the request from the system prompt, the project
+documents (PDFs), the conversation history, the unit summary and the current
+message. This module estimates each part locally (no count_tokens round-trip)
+and fits them into a per-request budget, filling sections in priority order:
+
+    current message > unit state > history > documents
+
+The system prompt and tool definitions are a fixed cost taken off the top.
+History is trimmed from the oldest message, documents are dropped whole (a
+half PDF is worse than none), the unit state and an oversized current message
+are cut at a line/character boundary with a note.
+"""
+
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+# Spanish WhatsApp text runs ~3.5 characters per token on Claude's tokenizer;
+# erring on the high side keeps the estimate conservative.
+CHARS_PER_TOKEN = 3.5
+MESSAGE_OVERHEAD_TOKENS = 4
+# Claude bills each PDF page as text plus a page image: 1,500-3,000 tokens.
+TOKENS_PER_PDF_PAGE = 2500
+# Page objects inside compressed object streams (PDF 1.5+) are invisible to a
+# byte scan; the file size stands in for them. Brochures and plans average
+# ~100 KB per page, and few pages exceed 1 MB even when image-heavy.
+PDF_BYTES_PER_PAGE = 100_000
+PDF_MAX_BYTES_PER_PAGE = 1_000_000
+
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+UNITS_TRIMMED_NOTE = "\n(Resumen recortado por longitud — usá buscar_unidades para el resto.)"
+MESSAGE_TRIMMED_NOTE = "\n[mensaje recortado por longitud]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for `text`."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def count_pdf_pages(pdf_bytes: bytes) -> int:
+    """Page count from the PDF's page objects (at least 1).
+
+    Without visible page objects (all in object streams) the count is
+    estimated from the file size; a count implying more than
+    PDF_MAX_BYTES_PER_PAGE per page is raised to the size-based minimum.
+    """
+    found = len(_PDF_PAGE_RE.findall(pdf_bytes))
+    if not found:
+        return max(1, math.ceil(len(pdf_bytes) / PDF_BYTES_PER_PAGE))
+    return max(found, math.ceil(len(pdf_bytes) / PDF_MAX_BYTES_PER_PAGE))
+
+
+def _message_tokens(msg: dict) -> int:
+    content = msg["content"]
+    if isinstance(content, str):
+        return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    return sum(estimate_tokens(b.get("text", "")) for b in content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _truncate(text: str, max_tokens: int, note: str) -> str:
+    """Cut `text` to about `max_tokens`, on a line boundary when there is one."""
+    limit = int((max_tokens - estimate_tokens(note)) * CHARS_PER_TOKEN)
+    if limit <= 0:
+        return ""
+    cut = text[:limit]
+    if "\n" in cut:
+        cut = cut[: cut.rindex("\n")]
+    return cut + note
+
+
+@dataclass
+class PromptSections:
+    """Budgeted prompt parts, plus the estimated size of each (for logging)."""
+    user_message: str
+    unit_state: str
+    history: list[dict]
+    documents: list[dict]
+    sizes: dict[str, int] = field(default_factory=dict)
+    dropped: dict[str, int] = field(default_factory=dict)
+
+    def log_line(self) -> str:
+        parts = [f"{k}={v}" for k, v in self.sizes.items()]
+        parts += [f"dropped_{k}={v}" for k, v in self.dropped.items() if v]
+        return " ".join(parts)
+
+
+def fit_prompt(
+    budget: int,
+    system: str,
+    tools: list[dict[str, Any]],
+    user_message: str,
+    unit_state: str,
+    history: list[dict],
+    documents: list[tuple[dict, int]],
+) -> PromptSections:
+    """Fit the prompt sections into `budget` estimated input tokens.
+
+    `history` is the chat messages oldest first; `documents` are
+    (content block, page count) pairs in the order they should be kept.
+    """
+    fixed = estimate_tokens(system) + estimate_tokens(json.dumps(tools, ensure_ascii=False))
+    remaining = budget - fixed
+
+    message_tokens = estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+    if message_tokens > remaining:
+        user_message = _truncate(user_message, max(remaining, 0), MESSAGE_TRIMMED_NOTE)
+        message_tokens = estimate_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+    remaining -= message_tokens
+
+    units_tokens = estimate_tokens(unit_state) + MESSAGE_OVERHEAD_TOKENS
+    if units_tokens > remaining:
+        unit_state = _truncate(unit_state, max(remaining, 0), UNITS_TRIMMED_NOTE)
+        units_tokens = estimate_tokens(unit_state) + MESSAGE_OVERHEAD_TOKENS
+    remaining -= units_tokens
+
+    # Newest messages first until the budget runs out
+    kept: list[dict] = []
+    history_tokens = 0
+    for msg in reversed(history):
+        cost = _message_tokens(msg)
+        if cost > remaining - history_tokens:
+            break
+        kept.append(msg)
+        history_tokens += cost
+    kept.reverse()
+    # The conversation must not open with an assistant turn
+    while kept and kept[0]["role"] == "assistant":
+        history_tokens -= _message_tokens(kept.pop(0))
+    remaining -= history_tokens
+
+    docs: list[dict] = []
+    docs_tokens = 0
+    for block, pages in documents:
+        cost = pages * TOKENS_PER_PDF_PAGE
+        if cost <= remaining - docs_tokens:
+            docs.append(block)
+            docs_tokens += cost
+
+    return PromptSections(
+        user_message=user_message,
+        unit_state=unit_state,
+        history=kept,
+        documents=docs,
+        sizes={
+            "budget": budget,
+            "system": fixed,
+            "message": message_tokens,
+            "units": units_tokens,
+            "history": history_tokens,
+            "documents": docs_tokens,
+            "total": fixed + message_tokens + units_tokens + history_tokens + docs_tokens,
+        },
+        dropped={"history": len(history) - len(kept), "documents": len(documents) - len(docs)},
+    )
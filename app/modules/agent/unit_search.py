@@ -0,0 +1,120 @@
+"""
+Unit search for the lead agent (`buscar_unidades` tool).
+
+The system context only carries a per-project summary of the inventory; the
+agent calls this tool to get the concrete units matching what the lead asked
+for, straight from the units table (see migration 051 for the index).
+"""
+
+import logging
+
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 15
+
+BUSCAR_UNIDADES_TOOL = {
+    "name": "buscar_unidades",
+    "description": (
+        "Busca unidades de los proyectos del desarrollador con datos exactos y actualizados "
+        "(identificador, piso, ambientes, superficie, precio, estado). Usala cada vez que necesites "
+        "ofrecer unidades concretas, confirmar precios o superficies, o verificar si una unidad sigue "
+        "disponible. Sin `unidad`, devuelve solo unidades disponibles."
+    ),
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "proyecto_slug": {
+                "type": "string",
+                "description": "Slug del proyecto (ej: manzanares-2088). Omitir para buscar en todos.",
+            },
+            "unidad": {
+                "type": "string",
+                "description": "Identificador de una unidad puntual (ej: 2B), para consultar su estado y datos.",
+            },
+            "ambientes": {"type": "integer", "description": "Cantidad de ambientes."},
+            "precio_min_usd": {"type": "number"},
+            "precio_max_usd": {"type": "number"},
+            "piso_min": {"type": "integer"},
+            "piso_max": {"type": "integer"},
+            "superficie_min_m2": {"type": "number"},
+            "superficie_max_m2": {"type": "number"},
+        },
+    },
+}
+
+_STATUS_LABELS = {"available": "disponible", "reserved": "reservada", "sold": "vendida"}
+
+
+async def search_units(developer_id: str, filters: dict, limit: int = MAX_RESULTS) -> tuple[list[dict], int]:
+    """Units of the developer's projects matching `filters` (tool input keys).
+
+    Returns (rows, total_matches): at most `limit` rows, cheapest first. Only
+    available units unless a specific `unidad` is asked for.
+    """
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        SELECT p.name AS project_name, p.slug, u.identifier, u.floor, u.bedrooms,
+               u.area_m2, u.price_usd, u.status, COUNT(*) OVER () AS total
+        FROM units u
+        JOIN projects p ON p.id = u.project_id
+        WHERE p.organization_id = $1
+          AND p.deleted_at IS NULL
+          AND ($2::text IS NULL OR p.slug = $2)
+          AND (CASE WHEN $3::text IS NULL THEN u.status = 'available'
+                    ELSE upper(u.identifier) = upper($3) END)
+          AND ($4::int IS NULL OR u.bedrooms = $4)
+          AND ($5::numeric IS NULL OR u.price_usd >= $5)
+          AND ($6::numeric IS NULL OR u.price_usd <= $6)
+          AND ($7::int IS NULL OR u.floor >= $7)
+          AND ($8::int IS NULL OR u.floor <= $8)
+          AND ($9::numeric IS NULL OR u.area_m2 >= $9)
+          AND ($10::numeric IS NULL OR u.area_m2 <= $10)
+        ORDER BY u.price_usd NULLS LAST, p.name, u.floor, u.identifier
+        LIMIT $11
+        """,
+        developer_id,
+        filters.get("proyecto_slug") or None,
+        filters.get("unidad") or None,
+        filters.get("ambientes"),
+        filters.get("precio_min_usd"),
+        filters.get("precio_max_usd"),
+        filters.get("piso_min"),
+        filters.get("piso_max"),
+        filters.get("superficie_min_m2"),
+        filters.get("superficie_max_m2"),
+        limit,
+    )
+    total = rows[0]["total"] if rows else 0
+    return [dict(r) for r in rows], total
+
+
+def format_units(rows: list[dict], total: int) -> str:
+    """Tool result text, one unit per line (same wording as the old context listing)."""
+    if not rows:
+        return "No hay unidades que coincidan con esa búsqueda."
+    lines = []
+    for u in rows:
+        price_str = f"USD {u['price_usd']:,.0f}" if u["price_usd"] else "precio a confirmar"
+        area_str = f"{u['area_m2']}m²" if u["area_m2"] else "superficie a confirmar"
+        status = _STATUS_LABELS.get(u["status"], u["status"])
+        lines.append(
+            f"- {u['project_name']} (slug: {u['slug']}) — {u['identifier']}: Piso {u['floor']}, "
+            f"{u['bedrooms']} amb, {area_str}, {price_str} [{status}]"
+        )
+    if total > len(rows):
+        lines.append(f"(Mostrando {len(rows)} de {total}; afiná la búsqueda para ver otras.)")
+    return "\n".join(lines)
+
+
+async def run_buscar_unidades(developer_id: str, tool_input: dict) -> str:
+    """Execute a buscar_unidades tool call and return the tool_result text."""
+    try:
+        rows, total = await search_units(developer_id, tool_input)
+    except Exception as e:
+        logger.error("buscar_unidades failed for developer %s: %s", developer_id, e)
+        return "No se pudo consultar las unidades en este momento."
+    logger.info("buscar_unidades developer=%s filters=%s → %d/%d", developer_id, tool_input, len(rows), total)
+    return format_units(rows, total)
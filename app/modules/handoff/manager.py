@@ -12,10 +12,16 @@ except Exception:
     _BA_TZ = timezone(timedelta(hours=-3))
 
 from app.database import get_pool
+from app.modules.handoff.registry import handoff_registry
 from app.modules.whatsapp.sender import send_text_message
 
 logger = logging.getLogger(__name__)
 
+# A handoff goes back to the agent when the lead has been silent this long...
+LEAD_SILENCE_TIMEOUT = timedelta(hours=2)
+# ...or when no admin has acted on it for this long (abandoned handoff).
+ADMIN_INACTIVITY_TIMEOUT = timedelta(hours=4)
+
 
 async def _send_to_lead(lead_phone: str, text: str, org_id: str) -> None:
     """Send a message to a lead using the org's tenant channel (correct provider)."""
@@ -64,7 +70,7 @@ async def _send_hitl_notification(org_id: str, lead_name: str, lead_id: str) ->
         provider = channel_row["provider"]
         if provider == "kapso":
             from app.modules.whatsapp.providers.base import TenantChannel
-            from app.modules.whatsapp.providers.kapso import KapsoProvider
+            from app.modules.whatsapp.providers.factory import get_provider
             tc = TenantChannel(
                 id=str(channel_row["id"]),
                 organization_id=str(channel_row["organization_id"]),
@@ -72,7 +78,7 @@ async def _send_hitl_notification(org_id: str, lead_name: str, lead_id: str) ->
                 phone_number=channel_row["phone_number"],
                 phone_number_id=channel_row.get("phone_number_id"),
             )
-            await KapsoProvider(tc).send_template(notify_phone, lead_name, lead_id, ba_time)
+            await get_provider(tc).send_template(notify_phone, lead_name, lead_id, ba_time)
         elif provider == "twilio":
             from app.config import get_settings
             from app.modules.whatsapp.providers.twilio import send_template
@@ -85,17 +91,38 @@ async def _send_hitl_notification(org_id: str, lead_name: str, lead_id: str) ->
         logger.error("_send_hitl_notification failed: %s", exc)
 
 
+async def _set_lead_handoff_flag(conn, lead_id, active: bool) -> None:
+    """Keep the denormalized leads.handoff_active flag (used by the inbox and the
+    live active_handoffs counter) in sync."""
+    from app.core import live_metrics
+
+    org_id = await conn.fetchval(
+        """UPDATE leads SET handoff_active = $2
+           WHERE id = $1 AND handoff_active IS DISTINCT FROM $2
+           RETURNING organization_id""",
+        lead_id, active,
+    )
+    live_metrics.touch(org_id)
+
+
 async def check_active_handoff(phone: str, project_id: str) -> dict | None:
     """Check if a lead has an active handoff (legacy, prefer check_active_handoff_by_phone)."""
     return await check_active_handoff_by_phone(phone)
 
 
 async def check_active_handoff_by_phone(phone: str) -> dict | None:
-    """Check if a lead has an active handoff, searching by phone across all projects."""
+    """Check if a lead has an active handoff, searching by phone across all projects.
+
+    The row includes the lead's last_user_message_at, for handoff_timeout().
+    Phones the in-memory registry knows have no active handoff (nearly all of
+    them) are answered without a query.
+    """
+    if not handoff_registry.may_have(phone):
+        return None
     pool = await get_pool()
     row = await pool.fetchrow(
         """
-        SELECT h.* FROM handoffs h
+        SELECT h.*, l.last_user_message_at FROM handoffs h
         JOIN leads l ON h.lead_id = l.id
         WHERE l.phone = $1 AND h.status = 'active'
         ORDER BY h.started_at DESC
@@ -106,6 +133,26 @@ async def check_active_handoff_by_phone(phone: str) -> dict | None:
     return dict(row) if row else None
 
 
+def _aware(ts: datetime | None) -> datetime | None:
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def handoff_timeout(handoff: dict, now: datetime | None = None) -> str | None:
+    """Return the lead_note to close an active handoff with if it has timed out
+    ("timeout_4h" / "timeout_2h"), else None. Pure timestamp comparison over the
+    handoff row (last_activity_at, started_at, last_user_message_at)."""
+    now = now or datetime.now(timezone.utc)
+    last_activity = _aware(handoff.get("last_activity_at") or handoff.get("started_at"))
+    if last_activity and now - last_activity > ADMIN_INACTIVITY_TIMEOUT:
+        return "timeout_4h"
+    last_user = _aware(handoff.get("last_user_message_at"))
+    if last_user and now - last_user > LEAD_SILENCE_TIMEOUT:
+        return "timeout_2h"
+    return None
+
+
 async def get_active_handoff_by_lead_id(lead_id: str) -> dict | None:
     """Get active handoff for a lead by lead_id (for frontend)."""
     pool = await get_pool()
@@ -149,6 +196,8 @@ async def ensure_handoff_for_human_reply(lead_id: str) -> dict:
         """,
         lead_id, project_id,
     )
+    await _set_lead_handoff_flag(pool, lead_id, True)
+    await handoff_registry.mark_active(lead["phone"])
     logger.info("Handoff started from frontend for lead %s", lead_id)
     if lead.get("phone") and lead.get("organization_id"):
         await _send_to_lead(
@@ -202,8 +251,11 @@ async def initiate_handoff(
         """,
         lead_id, project_id, trigger, context_summary,
     )
+    await _set_lead_handoff_flag(pool, lead_id, True)
 
     lead = await pool.fetchrow("SELECT phone, name FROM leads WHERE id = $1", lead_id)
+    if lead:
+        await handoff_registry.mark_active(lead["phone"])
     project = await pool.fetchrow("SELECT name FROM projects WHERE id = $1", project_id)
 
     # Broadcast handoff activation to all connected admins of this org
@@ -261,6 +313,12 @@ async def close_handoff(handoff_id: str, lead_note: str | None = None, send_good
         handoff_id,
         lead_note,
     )
+    lead = None
+    if handoff:
+        await _set_lead_handoff_flag(pool, handoff["lead_id"], False)
+        lead = await pool.fetchrow("SELECT phone FROM leads WHERE id = $1", handoff["lead_id"])
+        if lead:
+            await handoff_registry.mark_closed([lead["phone"]])
 
     # Broadcast handoff closure to all connected admins of this tenant
     if handoff:
@@ -269,7 +327,6 @@ async def close_handoff(handoff_id: str, lead_note: str | None = None, send_good
         )
         if lead_project:
             if send_goodbye:
-                lead = await pool.fetchrow("SELECT phone FROM leads WHERE id = $1", handoff["lead_id"])
                 if lead:
                     await _send_to_lead(
                         lead["phone"],
@@ -290,3 +347,61 @@ async def close_handoff(handoff_id: str, lead_note: str | None = None, send_good
             )
 
     logger.info("Handoff %s closed", handoff_id)
+
+
+async def close_stale_handoffs(lead_note: str = "timeout_2h_cron") -> int:
+    """Close every active handoff whose lead has been silent for LEAD_SILENCE_TIMEOUT,
+    in one statement. Returns how many were closed.
+
+    Like close_handoff(send_goodbye=False), but set-based: the handoffs, the
+    leads.handoff_active flags and the organizations to notify all come out of a
+    single UPDATE ... RETURNING, and admins get one handoff_update per
+    organization carrying every closed lead_id.
+    """
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """
+        WITH closed AS (
+            UPDATE handoffs h
+            SET status = 'completed', completed_at = NOW(), lead_note = $1
+            FROM leads l
+            WHERE l.id = h.lead_id
+              AND h.status = 'active'
+              AND h.started_at < NOW() - $2::interval
+              AND l.last_user_message_at < NOW() - $2::interval
+            RETURNING h.id, h.lead_id, h.project_id
+        ),
+        flags AS (
+            UPDATE leads l SET handoff_active = FALSE
+            FROM closed
+            WHERE l.id = closed.lead_id AND l.handoff_active
+        )
+        SELECT closed.id, closed.lead_id, p.organization_id, l.phone
+        FROM closed
+        JOIN leads l ON l.id = closed.lead_id
+        LEFT JOIN projects p ON p.id = closed.project_id
+        """,
+        lead_note, LEAD_SILENCE_TIMEOUT,
+    )
+    if not rows:
+        return 0
+    await handoff_registry.mark_closed(r["phone"] for r in rows)
+
+    from app.core import live_metrics
+    from app.core.sse import connection_manager
+
+    by_org: dict[str, list[str]] = {}
+    for r in rows:
+        if r["organization_id"]:
+            by_org.setdefault(str(r["organization_id"]), []).append(str(r["lead_id"]))
+    for org_id, lead_ids in by_org.items():
+        live_metrics.touch(org_id)
+        asyncio.create_task(
+            connection_manager.broadcast(
+                org_id,
+                "handoff_update",
+                {"lead_ids": lead_ids, "handoff_active": False, "taken_by": None},
+            )
+        )
+    logger.info("Closed %d stale handoffs (%s)", len(rows), lead_note)
+    return len(rows)
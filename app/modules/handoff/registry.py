@@ -0,0 +1,171 @@
+"""
+Active-handoff registry: the set of lead phones that currently have an active
+handoff, kept in process memory.
+
+Every inbound WhatsApp message asks "is this phone in a handoff?" while well
+under 1% of leads ever are. check_active_handoff_by_phone() consults the
+registry first and only queries the database for phones in the set.
+
+The set is loaded at startup and kept current by the handoff manager
+(initiate_handoff, ensure_handoff_for_human_reply, close_handoff,
+close_stale_handoffs) and the admin takeover endpoint. With several workers
+("postgres" mode) each change is also sent with NOTIFY and applied by the other
+workers; a worker reloads the whole set whenever its listener (re)connects, so
+changes missed while disconnected are picked up. Until the set is loaded, or in
+"off" mode, every phone is reported as possibly active, i.e. the database is
+always asked.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Optional
+
+import asyncpg
+
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+PG_CHANNEL = "realia_handoffs"
+
+
+class ActiveHandoffRegistry:
+    def __init__(self) -> None:
+        self.worker_id = uuid.uuid4().hex
+        self._phones: set[str] = set()
+        self._loaded = False
+        self._mode = "off"
+        self._dsn: Optional[str] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def may_have(self, phone: str) -> bool:
+        """False only when the phone is known to have no active handoff."""
+        return not self._loaded or phone in self._phones
+
+    async def start(self) -> None:
+        """Load the set and, in postgres mode, start listening (app lifespan)."""
+        from app.config import get_settings
+
+        settings = get_settings()
+        self._mode = settings.handoff_registry or settings.sse_broker
+        if self._mode == "off":
+            logger.info("Active-handoff registry disabled")
+            return
+        if self._mode == "postgres":
+            self._dsn = settings.database_url
+            self._task = asyncio.create_task(self._listen_forever())
+        else:
+            await self._load()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listener and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+        self._loaded = False
+
+    async def _load(self) -> None:
+        try:
+            pool = await get_pool()
+            rows = await pool.fetch(
+                """
+                SELECT DISTINCT l.phone FROM handoffs h
+                JOIN leads l ON l.id = h.lead_id
+                WHERE h.status = 'active' AND l.phone IS NOT NULL
+                """
+            )
+        except Exception as e:
+            self._loaded = False
+            logger.error("Active-handoff registry load failed, falling back to queries: %s", e)
+            return
+        self._phones = {r["phone"] for r in rows}
+        self._loaded = True
+        logger.info("Active-handoff registry loaded: %d phones", len(self._phones))
+
+    async def mark_active(self, phone: Optional[str]) -> None:
+        """Record that `phone` has an active handoff (after the handoff row is written)."""
+        if phone:
+            self._phones.add(phone)
+            await self._notify(phone, True)
+
+    async def mark_closed(self, phones) -> None:
+        """Drop phones whose handoff was closed, unless another lead with the same
+        phone still has one open (after the close is written)."""
+        phones = [p for p in set(phones) if p]
+        if not phones or self._mode == "off":
+            return
+        pool = await get_pool()
+        still_active = {
+            r["phone"]
+            for r in await pool.fetch(
+                """
+                SELECT DISTINCT l.phone FROM handoffs h
+                JOIN leads l ON l.id = h.lead_id
+                WHERE h.status = 'active' AND l.phone = ANY($1::text[])
+                """,
+                phones,
+            )
+        }
+        for phone in phones:
+            if phone not in still_active:
+                self._phones.discard(phone)
+                await self._notify(phone, False)
+
+    async def _notify(self, phone: str, active: bool) -> None:
+        if self._mode != "postgres":
+            return
+        try:
+            pool = await get_pool()
+            await pool.execute(
+                "SELECT pg_notify($1, $2)",
+                PG_CHANNEL, json.dumps({"w": self.worker_id, "p": phone, "a": active}),
+            )
+        except Exception as e:
+            logger.error("Active-handoff registry notify failed for %s: %s", phone, e)
+
+    def _on_notify(self, _conn, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            msg = json.loads(payload)
+        except ValueError:
+            return
+        if msg.get("w") == self.worker_id:
+            return
+        if msg.get("a"):
+            self._phones.add(msg["p"])
+        else:
+            self._phones.discard(msg["p"])
+
+    async def _listen_forever(self) -> None:
+        """Hold the LISTEN connection open; reload the set on every (re)connect."""
+        backoff = 1.0
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._listener = await asyncpg.connect(self._dsn)
+                self._listener.add_termination_listener(lambda _conn: lost.set())
+                await self._listener.add_listener(PG_CHANNEL, self._on_notify)
+                await self._load()
+                backoff = 1.0
+                await lost.wait()
+                logger.warning("Active-handoff registry listener lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Active-handoff registry listener error: %s (retry in %.0fs)", e, backoff)
+            # Changes can be missed while disconnected: ask the database meanwhile.
+            self._loaded = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+
+# Singleton — used by the handoff manager and started from the app lifespan
+handoff_registry = ActiveHandoffRegistry()
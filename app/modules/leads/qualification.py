@@ -8,6 +8,7 @@ import logging
 from anthropic import AsyncAnthropic
 
 from app.config import get_settings
+from app.core.llm_ledger import create_message
 from app.modules.agent.prompts import EXTRACTION_PROMPT
 
 logger = logging.getLogger(__name__)
@@ -84,7 +85,11 @@ def build_missing_fields(qualification: dict) -> str:
     return "\n".join(missing) if missing else "Todos los datos recopilados."
 
 
-async def extract_qualification_data(conversation_history: list[dict]) -> dict:
+async def extract_qualification_data(
+    conversation_history: list[dict],
+    organization_id: str | None = None,
+    lead_id: str | None = None,
+) -> dict:
     """Use Claude to extract qualification data from the conversation."""
     settings = get_settings()
     client = AsyncAnthropic(api_key=settings.anthropic_api_key)
@@ -95,7 +100,11 @@ async def extract_qualification_data(conversation_history: list[dict]) -> dict:
     )
 
     try:
-        response = await client.messages.create(
+        response = await create_message(
+            client,
+            purpose="extraction",
+            organization_id=organization_id,
+            lead_id=lead_id,
             model=settings.anthropic_model,
             max_tokens=200,
             system=EXTRACTION_PROMPT,
@@ -6,6 +6,7 @@ Uses Claude to parse free-form text into structured updates.
 from anthropic import AsyncAnthropic
 
 from app.config import get_settings
+from app.core.llm_ledger import create_message
 
 
 async def extract_obra_update(transcription: str) -> dict:
@@ -13,7 +14,9 @@ async def extract_obra_update(transcription: str) -> dict:
     settings = get_settings()
     client = AsyncAnthropic(api_key=settings.anthropic_api_key)
 
-    response = await client.messages.create(
+    response = await create_message(
+        client,
+        purpose="obra_extraction",
         model="claude-sonnet-4-20250514",
         max_tokens=500,
         system=(
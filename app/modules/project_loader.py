@@ -1,12 +1,20 @@
 """
 Project Loader: parses CSV files to create projects with units.
 Supports both WhatsApp upload and API endpoint flows.
+
+Large files (masterplans with thousands of lots) go through the streaming path:
+iter_project_csv() yields validated rows one at a time and load_project_csv()
+COPYs them into a temp staging table, then merges project + units in a single
+transaction.
 """
 
 import csv
 import io
+import itertools
 import logging
 from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator
 
 from app.database import get_pool
 
@@ -23,6 +31,9 @@ STATUS_MAP = {
     "sold": "sold",
 }
 
+# WhatsApp messages cap out around 4k chars; large masterplans only list the first units
+SUMMARY_MAX_UNITS = 40
+
 DELIVERY_STATUS_MAP = {
     "en_pozo": "en_pozo",
     "en pozo": "en_pozo",
@@ -35,35 +46,17 @@ DELIVERY_STATUS_MAP = {
 }
 
 
-def parse_project_csv(csv_bytes: bytes) -> dict:
-    """Parse a project CSV file and return structured data.
-
-    Returns: {
-        "project": { ... project fields ... },
-        "units": [ { ... unit fields ... }, ... ],
-        "errors": [ ... validation errors ... ],
-    }
-    """
-    text = csv_bytes.decode("utf-8-sig").strip()
-
-    lines = []
-    for line in text.splitlines():
-        stripped = line.strip()
+def _data_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yield non-empty, non-comment lines ('##' prefix) from a CSV source."""
+    for line in lines:
+        stripped = line.strip().lstrip("\ufeff")
         if stripped and not stripped.startswith("##"):
-            lines.append(stripped)
+            yield stripped
 
-    if len(lines) < 2:
-        return {"project": None, "units": [], "errors": ["CSV vacío o sin datos"]}
-
-    reader = csv.DictReader(io.StringIO("\n".join(lines)))
-    rows = list(reader)
-
-    if not rows:
-        return {"project": None, "units": [], "errors": ["No se encontraron filas de datos"]}
 
+def _parse_project_row(first: dict) -> tuple[dict, list[str]]:
+    """Extract project fields from the first data row."""
     errors = []
-
-    first = rows[0]
     project = {}
 
     name = (first.get("proyecto_nombre") or "").strip()
@@ -93,25 +86,78 @@ def parse_project_csv(csv_bytes: bytes) -> dict:
     else:
         project["amenities"] = None
 
+    return project, errors
+
+
+def _parse_unit_row(row: dict) -> tuple[dict | None, str | None]:
+    """Validate a single unit row. Returns (unit, None), (None, error) or (None, None) for blank rows."""
+    identifier = (row.get("unidad") or "").strip()
+    if not identifier:
+        return None, None
+
+    unit = {"identifier": identifier.upper()}
+    unit["floor"] = _parse_int(row.get("piso"))
+    unit["bedrooms"] = _parse_int(row.get("ambientes"))
+    unit["area_m2"] = _parse_decimal(row.get("m2"))
+    unit["price_usd"] = _parse_decimal(row.get("precio_usd"))
+
+    raw_status = (row.get("estado") or "disponible").strip().lower()
+    unit["status"] = STATUS_MAP.get(raw_status, "available")
+
+    if not unit["floor"] and not unit["price_usd"]:
+        return None, f"unidad '{identifier}' sin piso ni precio"
+    return unit, None
+
+
+def iter_project_csv(lines: Iterable[str]) -> tuple[dict | None, list[str], Iterator[dict]]:
+    """Streaming CSV parser.
+
+    Reads only the first data row eagerly (project fields) and returns a lazy
+    iterator over unit rows, so the caller can consume files of any size
+    without materializing them.
+
+    Returns: (project, project_errors, rows) where each item of rows is
+    {"row": n, "unit": {...}} or {"row": n, "error": "..."} (n is the 1-based
+    line number counting the header, comments excluded).
+    """
+    reader = csv.DictReader(_data_lines(lines))
+    first = next(reader, None)
+    if first is None:
+        return None, ["CSV vacío o sin datos"], iter(())
+
+    project, errors = _parse_project_row(first)
+
+    def _rows() -> Iterator[dict]:
+        for i, row in enumerate(itertools.chain([first], reader)):
+            unit, error = _parse_unit_row(row)
+            if error:
+                yield {"row": i + 2, "error": error}
+            elif unit:
+                yield {"row": i + 2, "unit": unit}
+
+    return project, errors, _rows()
+
+
+def parse_project_csv(csv_bytes: bytes) -> dict:
+    """Parse a project CSV file and return structured data.
+
+    Returns: {
+        "project": { ... project fields ... },
+        "units": [ { ... unit fields ... }, ... ],
+        "errors": [ ... validation errors ... ],
+    }
+    """
+    text = csv_bytes.decode("utf-8-sig")
+    project, errors, rows = iter_project_csv(text.splitlines())
+    if project is None:
+        return {"project": None, "units": [], "errors": errors}
+
     units = []
-    for i, row in enumerate(rows):
-        identifier = (row.get("unidad") or "").strip()
-        if not identifier:
-            continue
-
-        unit = {"identifier": identifier.upper()}
-        unit["floor"] = _parse_int(row.get("piso"))
-        unit["bedrooms"] = _parse_int(row.get("ambientes"))
-        unit["area_m2"] = _parse_decimal(row.get("m2"))
-        unit["price_usd"] = _parse_decimal(row.get("precio_usd"))
-
-        raw_status = (row.get("estado") or "disponible").strip().lower()
-        unit["status"] = STATUS_MAP.get(raw_status, "available")
-
-        if not unit["floor"] and not unit["price_usd"]:
-            errors.append(f"Fila {i+2}: unidad '{identifier}' sin piso ni precio")
+    for item in rows:
+        if "error" in item:
+            errors.append(f"Fila {item['row']}: {item['error']}")
         else:
-            units.append(unit)
+            units.append(item["unit"])
 
     if not units:
         errors.append("No se encontraron unidades válidas en el CSV")
@@ -122,23 +168,25 @@ def parse_project_csv(csv_bytes: bytes) -> dict:
     return {"project": project, "units": units, "errors": errors}
 
 
-async def create_project_from_parsed(developer_id: str, parsed: dict) -> dict:
-    """Insert a parsed project + units into the database.
+_UNIT_COPY_COLUMNS = ["ord", "identifier", "floor", "bedrooms", "area_m2", "price_usd", "status"]
 
-    Returns: {"project_id": str, "units_created": int} or {"error": str}
-    """
-    pool = await get_pool()
-    project = parsed["project"]
-    units = parsed["units"]
 
-    existing = await pool.fetchrow(
-        "SELECT id FROM projects WHERE slug = $1",
-        project["slug"],
+async def _create_staging_table(conn) -> None:
+    await conn.execute(
+        """CREATE TEMP TABLE units_staging (
+               ord        INT NOT NULL,
+               identifier TEXT NOT NULL,
+               floor      INT,
+               bedrooms   INT,
+               area_m2    NUMERIC,
+               price_usd  NUMERIC,
+               status     VARCHAR(20) NOT NULL
+           ) ON COMMIT DROP"""
     )
-    if existing:
-        return {"error": f"Ya existe un proyecto con el slug '{project['slug']}'. Cambiá el nombre."}
 
-    proj = await pool.fetchrow(
+
+async def _insert_project(conn, developer_id: str, project: dict):
+    return await conn.fetchrow(
         """INSERT INTO projects (organization_id, name, slug, address, neighborhood, city,
                 description, amenities, total_floors, total_units,
                 construction_start, estimated_delivery, delivery_status, payment_info, status)
@@ -160,33 +208,175 @@ async def create_project_from_parsed(developer_id: str, parsed: dict) -> dict:
         project["payment_info"],
     )
 
-    project_id = str(proj["id"])
-    units_created = 0
-
-    for unit in units:
-        await pool.execute(
-            """INSERT INTO units (project_id, identifier, floor, bedrooms, area_m2, price_usd, status)
-               VALUES ($1, $2, $3, $4, $5, $6, $7)""",
-            project_id,
-            unit["identifier"],
-            unit["floor"],
-            unit["bedrooms"],
-            unit["area_m2"],
-            unit["price_usd"],
-            unit["status"],
-        )
-        units_created += 1
+
+async def _merge_staged_units(conn, project_id) -> int:
+    """Move staged units into the units table for project_id. Returns rows inserted."""
+    result = await conn.execute(
+        """INSERT INTO units (project_id, identifier, floor, bedrooms, area_m2, price_usd, status)
+           SELECT $1, identifier, floor, bedrooms, area_m2, price_usd, status
+           FROM units_staging ORDER BY ord""",
+        project_id,
+    )
+    return int(result.split()[-1])
+
+
+async def _duplicate_identifiers(conn) -> list[str]:
+    rows = await conn.fetch(
+        "SELECT identifier FROM units_staging GROUP BY identifier HAVING COUNT(*) > 1 ORDER BY identifier"
+    )
+    return [r["identifier"] for r in rows]
+
+
+def _unit_record(ord_: int, unit: dict) -> tuple:
+    return (
+        ord_, unit["identifier"], unit["floor"], unit["bedrooms"],
+        unit["area_m2"], unit["price_usd"], unit["status"],
+    )
+
+
+class _LoadAborted(Exception):
+    """Raised inside the load transaction to roll it back with a user-facing error."""
+
+
+async def create_project_from_parsed(developer_id: str, parsed: dict) -> dict:
+    """Insert a parsed project + units into the database.
+
+    Units are COPYed into a staging table and merged in the same transaction as
+    the project insert, so a failure never leaves a half-loaded project.
+
+    Returns: {"project_id": str, "units_created": int} or {"error": str}
+    """
+    pool = await get_pool()
+    project = parsed["project"]
+    units = parsed["units"]
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                existing = await conn.fetchrow("SELECT id FROM projects WHERE slug = $1", project["slug"])
+                if existing:
+                    raise _LoadAborted(f"Ya existe un proyecto con el slug '{project['slug']}'. Cambiá el nombre.")
+
+                await _create_staging_table(conn)
+                await conn.copy_records_to_table(
+                    "units_staging",
+                    records=(_unit_record(i, u) for i, u in enumerate(units)),
+                    columns=_UNIT_COPY_COLUMNS,
+                )
+                proj = await _insert_project(conn, developer_id, project)
+                units_created = await _merge_staged_units(conn, proj["id"])
+    except _LoadAborted as e:
+        return {"error": str(e)}
 
     logger.info("Created project '%s' with %d units", proj["name"], units_created)
 
     return {
-        "project_id": project_id,
+        "project_id": str(proj["id"]),
         "project_name": proj["name"],
         "slug": project["slug"],
         "units_created": units_created,
     }
 
 
+def _new_stats() -> dict:
+    return {
+        "units": 0,
+        "available": 0,
+        "reserved": 0,
+        "sold": 0,
+        "price_min": None,
+        "price_max": None,
+    }
+
+
+def _add_to_stats(stats: dict, unit: dict) -> None:
+    stats["units"] += 1
+    stats[unit["status"]] += 1
+    price = unit["price_usd"]
+    if price:
+        stats["price_min"] = price if stats["price_min"] is None else min(stats["price_min"], price)
+        stats["price_max"] = price if stats["price_max"] is None else max(stats["price_max"], price)
+
+
+async def load_project_csv(developer_id: str, lines: Iterable[str], dry_run: bool = False) -> dict:
+    """Stream a project CSV into the database.
+
+    Rows are validated one at a time and COPYed into a temp staging table as
+    they are read; nothing is kept in memory besides running stats and the
+    error list. Project + units are merged in one transaction, and any row
+    error (or duplicate unit identifier) rolls the whole load back.
+
+    With dry_run=True the file is validated and summarized but nothing is written.
+
+    Returns: {"project": {...}, "stats": {...}, "errors": [...]} plus
+    "project_id" / "units_created" when the load was committed.
+    """
+    project, errors, rows = iter_project_csv(lines)
+    stats = _new_stats()
+    result = {"project": project, "stats": stats, "errors": errors}
+    if project is None or not project.get("name"):
+        return result
+
+    def _valid_records() -> Iterator[tuple]:
+        for item in rows:
+            if "error" in item:
+                errors.append(f"Fila {item['row']}: {item['error']}")
+                continue
+            _add_to_stats(stats, item["unit"])
+            yield _unit_record(item["row"], item["unit"])
+
+    def _finalize() -> None:
+        if not stats["units"]:
+            errors.append("No se encontraron unidades válidas en el CSV")
+        if not project.get("total_units"):
+            project["total_units"] = stats["units"]
+
+    pool = await get_pool()
+
+    if dry_run:
+        seen: set[str] = set()
+        duplicates: set[str] = set()
+        for record in _valid_records():
+            identifier = record[1]
+            if identifier in seen:
+                duplicates.add(identifier)
+            seen.add(identifier)
+        _finalize()
+        if duplicates:
+            errors.append(f"Unidades duplicadas: {', '.join(sorted(duplicates))}")
+        if await pool.fetchval("SELECT 1 FROM projects WHERE slug = $1", project["slug"]):
+            errors.append(f"Ya existe un proyecto con el slug '{project['slug']}'. Cambiá el nombre.")
+        return result
+
+    try:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if await conn.fetchval("SELECT 1 FROM projects WHERE slug = $1", project["slug"]):
+                    raise _LoadAborted(f"Ya existe un proyecto con el slug '{project['slug']}'. Cambiá el nombre.")
+
+                await _create_staging_table(conn)
+                await conn.copy_records_to_table(
+                    "units_staging", records=_valid_records(), columns=_UNIT_COPY_COLUMNS,
+                )
+                _finalize()
+                duplicates = await _duplicate_identifiers(conn)
+                if duplicates:
+                    errors.append(f"Unidades duplicadas: {', '.join(duplicates)}")
+                if errors:
+                    raise _LoadAborted()
+
+                proj = await _insert_project(conn, developer_id, project)
+                result["units_created"] = await _merge_staged_units(conn, proj["id"])
+                result["project_id"] = str(proj["id"])
+    except _LoadAborted as e:
+        if str(e):
+            errors.append(str(e))
+        return result
+
+    logger.info("Created project '%s' with %d units (streaming load)", proj["name"], result["units_created"])
+    return result
+
+
 def build_summary(parsed: dict) -> str:
     """Build a human-readable summary for confirmation."""
     project = parsed["project"]
@@ -224,7 +414,7 @@ def build_summary(parsed: dict) -> str:
         lines.append(f"*Estado:* {avail} disponibles, {res} reservadas, {sold} vendidas")
 
         lines.append("\n*Detalle:*")
-        for u in units:
+        for u in units[:SUMMARY_MAX_UNITS]:
             s = {"available": "✅", "reserved": "🟡", "sold": "🔴"}.get(u["status"], "?")
             parts = [s, u["identifier"] + ":"]
             if u["floor"] is not None:
@@ -238,6 +428,8 @@ def build_summary(parsed: dict) -> str:
             else:
                 parts.append("precio s/d")
             lines.append("  " + " ".join(parts))
+        if len(units) > SUMMARY_MAX_UNITS:
+            lines.append(f"  ... y {len(units) - SUMMARY_MAX_UNITS} unidades más")
 
     if parsed["errors"]:
         lines.append(f"\n⚠️ *Advertencias:*")
@@ -260,13 +452,14 @@ def _parse_int(val) -> int | None:
         return None
 
 
-def _parse_decimal(val) -> float | None:
+def _parse_decimal(val) -> Decimal | None:
     if not val:
         return None
     try:
-        return float(str(val).strip().replace(",", "."))
-    except (ValueError, TypeError):
+        number = Decimal(str(val).strip().replace(",", "."))
+    except (InvalidOperation, ValueError, TypeError):
         return None
+    return number if number.is_finite() else None
 
 
 def _parse_date(val) -> date | None:
@@ -10,11 +10,12 @@ import logging
 from typing import Any
 
 from app.database import get_pool
+from app.modules.agent.token_budget import count_pdf_pages
 from app.modules.storage import download_file
 
 logger = logging.getLogger(__name__)
 
-_pdf_cache: dict[str, dict[str, str]] = {}
+_pdf_cache: dict[str, dict[str, Any]] = {}
 
 
 async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any]]:
@@ -22,6 +23,17 @@ async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any
     Fetch all active PDF documents across a developer's projects,
     download them from S3, and return Claude API content blocks.
     """
+    blocks = [block for block, _pages in await get_developer_documents(developer_id)]
+    if blocks:
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return blocks
+
+
+async def get_developer_documents(developer_id: str) -> list[tuple[dict[str, Any], int]]:
+    """
+    Same documents as get_developer_document_blocks, paired with their page
+    count (for the prompt token budget). No cache_control is set.
+    """
     pool = await get_pool()
 
     docs = await pool.fetch(
@@ -37,7 +49,7 @@ async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any
     if not docs:
         return []
 
-    blocks: list[dict[str, Any]] = []
+    blocks: list[tuple[dict[str, Any], int]] = []
 
     for doc in docs:
         doc_id = str(doc["id"])
@@ -47,6 +59,7 @@ async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any
 
             if cache_key in _pdf_cache:
                 data_b64 = _pdf_cache[cache_key]["data_b64"]
+                pages = _pdf_cache[cache_key]["pages"]
             else:
                 pdf_bytes = await download_file(doc["file_url"])
 
@@ -58,12 +71,13 @@ async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any
                     continue
 
                 data_b64 = base64.standard_b64encode(pdf_bytes).decode("utf-8")
-                _pdf_cache[cache_key] = {"data_b64": data_b64}
+                pages = count_pdf_pages(pdf_bytes)
+                _pdf_cache[cache_key] = {"data_b64": data_b64, "pages": pages}
 
             unit_info = f" - Unidad {doc['unit_identifier']}" if doc["unit_identifier"] else ""
             title = f"{doc['project_name']} | {doc['doc_type']}{unit_info}: {doc['filename']}"
 
-            blocks.append({
+            blocks.append(({
                 "type": "document",
                 "source": {
                     "type": "base64",
@@ -71,15 +85,12 @@ async def get_developer_document_blocks(developer_id: str) -> list[dict[str, Any
                     "data": data_b64,
                 },
                 "title": title,
-            })
+            }, pages))
 
         except Exception as e:
             logger.error("Failed to download document %s (%s): %s", doc_id, doc["filename"], e)
             continue
 
-    if blocks:
-        blocks[-1]["cache_control"] = {"type": "ephemeral"}
-
     return blocks
 
 
@@ -1,15 +1,23 @@
 """
 S3-compatible file storage: shared between Realia, NocoDB, and the RAG pipeline.
 Supports Supabase Storage, Cloudflare R2, AWS S3, MinIO, etc.
+
+Every call goes through the "s3" circuit breaker (app/core/circuit_breaker.py):
+while the bucket is down, uploads fail at once with CircuitOpenError instead of
+tying up a worker thread each. The blocking boto3 calls of the async helpers
+run in a thread, so they no longer stall the event loop.
 """
 
+import asyncio
 import logging
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 import httpx
 
 from app.config import get_settings
+from app.core.circuit_breaker import breakers
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +34,21 @@ def _get_s3_client():
             aws_access_key_id=settings.s3_access_key_id,
             aws_secret_access_key=settings.s3_secret_access_key,
             region_name=settings.s3_region or "us-east-1",
-            config=Config(signature_version="s3v4"),
+            config=Config(
+                signature_version="s3v4",
+                connect_timeout=5,
+                read_timeout=30,
+                retries={"max_attempts": 2},
+            ),
         )
     return _s3_client
 
 
+async def _s3_call(method, **kwargs):
+    """Run a blocking boto3 client method in a thread, through the s3 breaker."""
+    return await breakers.get("s3").call(lambda: asyncio.to_thread(method, **kwargs))
+
+
 async def upload_file(
     file_bytes: bytes,
     project_slug: str,
@@ -52,7 +70,8 @@ async def upload_file(
     content_type = "application/pdf" if filename.lower().endswith(".pdf") else "application/octet-stream"
 
     client = _get_s3_client()
-    client.put_object(
+    await _s3_call(
+        client.put_object,
         Bucket=settings.s3_bucket_name,
         Key=key,
         Body=file_bytes,
@@ -87,10 +106,13 @@ def get_url_for_file(file_url: str) -> str:
 
 async def download_file(file_url: str) -> bytes:
     """Download a file by URL."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(file_url)
-        response.raise_for_status()
-        return response.content
+    async def _get() -> bytes:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(file_url)
+            response.raise_for_status()
+            return response.content
+
+    return await breakers.get("s3").call(_get)
 
 
 def _build_key(project_slug: str, doc_type: str, filename: str, org_slug: str | None = None) -> str:
@@ -142,7 +164,8 @@ async def upload_obra_foto(
     }.get(ext, "application/octet-stream")
 
     client = _get_s3_client()
-    client.put_object(
+    await _s3_call(
+        client.put_object,
         Bucket=settings.s3_bucket_name,
         Key=key,
         Body=file_bytes,
@@ -193,7 +216,8 @@ async def upload_factura_pdf(
     )
 
     client = _get_s3_client()
-    client.put_object(
+    await _s3_call(
+        client.put_object,
         Bucket=settings.s3_bucket_name,
         Key=key,
         Body=file_bytes,
@@ -203,3 +227,42 @@ async def upload_factura_pdf(
     public_url = f"{settings.s3_public_url}/{key}"
     logger.info("Uploaded factura PDF %s (%d bytes) to %s", filename, len(file_bytes), public_url)
     return public_url
+
+
+def put_fileobj(key: str, fileobj, content_type: str = "application/octet-stream") -> None:
+    """Upload a binary file object under an explicit key (archives, exports),
+    streaming it in parts so large files never sit in memory. Blocking — call
+    via to_thread."""
+    settings = get_settings()
+    client = _get_s3_client()
+    with breakers.get("s3").guard():
+        client.upload_fileobj(
+            fileobj,
+            settings.s3_bucket_name,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=TransferConfig(multipart_chunksize=8 * 1024 * 1024, max_concurrency=4),
+        )
+    logger.info("Uploaded %s", key)
+
+
+def get_object_size(key: str) -> int:
+    """Return the stored size of an object in bytes. Blocking — call via to_thread."""
+    settings = get_settings()
+    client = _get_s3_client()
+    with breakers.get("s3").guard():
+        head = client.head_object(Bucket=settings.s3_bucket_name, Key=key)
+    return int(head["ContentLength"])
+
+
+def get_object_range(key: str, offset: int, length: int) -> bytes:
+    """Read `length` bytes of an object starting at `offset`. Blocking — call via to_thread."""
+    settings = get_settings()
+    client = _get_s3_client()
+    with breakers.get("s3").guard():
+        response = client.get_object(
+            Bucket=settings.s3_bucket_name,
+            Key=key,
+            Range=f"bytes={offset}-{offset + length - 1}",
+        )
+        return response["Body"].read()
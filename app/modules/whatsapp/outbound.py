@@ -0,0 +1,132 @@
+"""
+Outbound WhatsApp sends through the channel's circuit breaker.
+
+get_provider() (providers/factory.py) returns a GuardedProvider: every send_*
+call goes through the breaker of that tenant channel, bounded by its timeout.
+When the breaker is open the send is not attempted; it is parked in the
+channel's OutboundQueue and the caller gets {"status": "queued"} right away.
+While a channel has parked sends, new ones queue behind them so each lead still
+gets its messages in order.
+
+The queue drains itself: it waits until the breaker half-opens, sends the
+oldest parked message as the probe and, once that succeeds, the rest. Sends
+parked longer than MAX_AGE_SECONDS are dropped (a reply that late is worse than
+none), as is the oldest one beyond MAX_PARKED. Queues live in process memory:
+parked sends are lost on restart.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError, breakers
+
+logger = logging.getLogger(__name__)
+
+MAX_PARKED = 200
+MAX_AGE_SECONDS = 3600
+
+
+class OutboundQueue:
+    def __init__(self, breaker: CircuitBreaker) -> None:
+        self.breaker = breaker
+        self._parked: deque = deque()  # (parked_at, label, factory)
+        self._drainer: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._parked)
+
+    async def send(self, label: str, factory: Callable[[], Any]) -> Any:
+        """Send now through the breaker, or park the send if the circuit is open."""
+        if not self._parked:
+            try:
+                return await self.breaker.call(factory)
+            except CircuitOpenError:
+                pass
+        self._park(label, factory)
+        return {"status": "queued", "reason": "circuit_open", "channel": self.breaker.name}
+
+    def _park(self, label: str, factory: Callable[[], Any]) -> None:
+        if len(self._parked) >= MAX_PARKED:
+            self._parked.popleft()
+            self.dropped += 1
+            logger.error("Outbound queue %s full, dropped the oldest send", self.breaker.name)
+        self._parked.append((time.monotonic(), label, factory))
+        logger.warning("Outbound %s parked on %s (%d pending)", label, self.breaker.name, len(self._parked))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while self._parked:
+            await asyncio.sleep(max(self.breaker.retry_in(), 1.0))
+            while self._parked:
+                parked_at, label, factory = self._parked[0]
+                if time.monotonic() - parked_at > MAX_AGE_SECONDS:
+                    self._parked.popleft()
+                    self.dropped += 1
+                    logger.error("Outbound %s on %s expired after %ds", label, self.breaker.name, MAX_AGE_SECONDS)
+                    continue
+                try:
+                    await self.breaker.call(factory)
+                except CircuitOpenError:
+                    break  # still open (or another call is probing): wait again
+                except Exception as e:
+                    if self.breaker.state == "closed":
+                        # The channel works; this particular send does not
+                        self._parked.popleft()
+                        self.dropped += 1
+                        logger.error("Outbound %s on %s failed: %s", label, self.breaker.name, e)
+                        continue
+                    break
+                self._parked.popleft()
+                self.sent += 1
+        logger.info("Outbound queue %s drained", self.breaker.name)
+
+    def snapshot(self) -> dict:
+        return {"channel": self.breaker.name, "pending": self.pending, "sent_after_parking": self.sent, "dropped": self.dropped}
+
+
+_queues: dict[str, OutboundQueue] = {}
+
+
+def queue_for(dependency: str, key: Optional[str] = None) -> OutboundQueue:
+    breaker = breakers.get(dependency, key)
+    queue = _queues.get(breaker.name)
+    if queue is None:
+        queue = _queues[breaker.name] = OutboundQueue(breaker)
+    return queue
+
+
+def snapshot() -> list[dict]:
+    return [q.snapshot() for q in sorted(_queues.values(), key=lambda q: q.breaker.name)]
+
+
+class GuardedProvider:
+    """Wraps a tenant provider: send_* through the outbound queue, media
+    downloads through the breaker, everything else unchanged."""
+
+    def __init__(self, provider, channel) -> None:
+        self._provider = provider
+        self._channel = channel
+        self._queue = queue_for(channel.provider, channel.id)
+
+    @property
+    def channel(self):
+        return self._channel
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._provider, name)
+        if name.startswith("send_"):
+            async def send(*args, **kwargs):
+                return await self._queue.send(name, lambda: attr(*args, **kwargs))
+            return send
+        if name == "download_media":
+            async def download(*args, **kwargs):
+                return await self._queue.breaker.call(lambda: attr(*args, **kwargs))
+            return download
+        return attr
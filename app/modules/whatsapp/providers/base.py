@@ -7,6 +7,16 @@ The rest of the app works with IncomingMessage — never touches provider-specif
 from dataclasses import dataclass, field
 from typing import Optional, Protocol
 
+import httpx
+
+
+def raise_for_upstream_error(response: httpx.Response) -> None:
+    """Raise on a 5xx / 408 answer, so the channel's circuit breaker counts the
+    outage (app/core/circuit_breaker.py). Other error answers keep coming back
+    to the caller as the provider's JSON body."""
+    if response.status_code >= 500 or response.status_code == 408:
+        response.raise_for_status()
+
 
 @dataclass
 class IncomingMessage:
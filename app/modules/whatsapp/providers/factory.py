@@ -5,7 +5,7 @@ The old module-level functions (twilio.py, meta.py) remain for backward compat.
 
 import httpx
 from fastapi import Request
-from .base import IncomingMessage, TenantChannel
+from .base import IncomingMessage, TenantChannel, raise_for_upstream_error
 
 TWILIO_API_BASE = "https://api.twilio.com/2010-04-01"
 WA_API_BASE = "https://graph.facebook.com/v21.0"
@@ -29,6 +29,7 @@ class TwilioProvider:
         }
         async with httpx.AsyncClient() as client:
             response = await client.post(url, data=payload, auth=auth)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def send_document(self, to: str, document_url: str, filename: str, caption: str | None = None) -> dict:
@@ -42,6 +43,7 @@ class TwilioProvider:
         }
         async with httpx.AsyncClient() as client:
             response = await client.post(url, data=payload, auth=auth)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def send_image(self, to: str, image_url: str, caption: str | None = None) -> dict:
@@ -55,6 +57,7 @@ class TwilioProvider:
         }
         async with httpx.AsyncClient() as client:
             response = await client.post(url, data=payload, auth=auth)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def download_media(self, media_id: str | None = None, media_url: str | None = None) -> bytes:
@@ -88,6 +91,7 @@ class MetaProvider:
         }
         async with httpx.AsyncClient() as client:
             response = await client.post(url, json=payload, headers=headers)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def send_document(self, to: str, document_url: str, filename: str, caption: str | None = None) -> dict:
@@ -103,6 +107,7 @@ class MetaProvider:
             payload["document"]["caption"] = caption
         async with httpx.AsyncClient() as client:
             response = await client.post(url, json=payload, headers=headers)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def send_image(self, to: str, image_url: str, caption: str | None = None) -> dict:
@@ -118,6 +123,7 @@ class MetaProvider:
             payload["image"]["caption"] = caption
         async with httpx.AsyncClient() as client:
             response = await client.post(url, json=payload, headers=headers)
+            raise_for_upstream_error(response)
             return response.json()
 
     async def download_media(self, media_id: str | None = None, media_url: str | None = None) -> bytes:
@@ -159,8 +165,7 @@ class YCloudProvider:
         return await _dl(media_url)
 
 
-def get_provider(channel: TenantChannel) -> "TwilioProvider | MetaProvider | YCloudProvider | KapsoProvider":
-    """Return a tenant-aware provider instance for the given channel."""
+def _build_provider(channel: TenantChannel) -> "TwilioProvider | MetaProvider | YCloudProvider | KapsoProvider":
     if channel.provider == "twilio":
         return TwilioProvider(channel)
     elif channel.provider == "meta":
@@ -171,3 +176,10 @@ def get_provider(channel: TenantChannel) -> "TwilioProvider | MetaProvider | YCl
         from app.modules.whatsapp.providers.kapso import KapsoProvider
         return KapsoProvider(channel)
     raise ValueError(f"Unknown provider: {channel.provider!r}")
+
+
+def get_provider(channel: TenantChannel):
+    """Return a tenant-aware provider instance for the given channel, with its
+    sends behind the channel's circuit breaker (see whatsapp/outbound.py)."""
+    from app.modules.whatsapp.outbound import GuardedProvider
+    return GuardedProvider(_build_provider(channel), channel)
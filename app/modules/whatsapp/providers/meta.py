@@ -4,7 +4,7 @@ import httpx
 from fastapi import Request, Query
 
 from app.config import get_settings
-from app.modules.whatsapp.providers.base import IncomingMessage
+from app.modules.whatsapp.providers.base import IncomingMessage, raise_for_upstream_error
 
 WA_API_BASE = "https://graph.facebook.com/v21.0"
 
@@ -71,6 +71,7 @@ async def send_text(to: str, text: str) -> dict:
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers=headers)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -88,6 +89,7 @@ async def send_document(to: str, document_url: str, filename: str, caption: str
         payload["document"]["caption"] = caption
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers=headers)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -105,6 +107,7 @@ async def send_image(to: str, image_url: str, caption: str | None = None) -> dic
         payload["image"]["caption"] = caption
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers=headers)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -125,6 +128,7 @@ async def send_template(to: str, template_name: str, language: str = "es_AR", co
         payload["template"]["components"] = components
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers=headers)
+        raise_for_upstream_error(response)
         return response.json()
 
 
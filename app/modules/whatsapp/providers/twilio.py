@@ -4,7 +4,7 @@ import httpx
 from fastapi import Request
 
 from app.config import get_settings
-from app.modules.whatsapp.providers.base import IncomingMessage
+from app.modules.whatsapp.providers.base import IncomingMessage, raise_for_upstream_error
 
 TWILIO_API_BASE = "https://api.twilio.com/2010-04-01"
 
@@ -77,6 +77,7 @@ async def send_text(to: str, text: str) -> dict:
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, data=payload, auth=auth)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -94,6 +95,7 @@ async def send_document(to: str, document_url: str, filename: str, caption: str
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, data=payload, auth=auth)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -110,6 +112,7 @@ async def send_image(to: str, image_url: str, caption: str | None = None) -> dic
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, data=payload, auth=auth)
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -137,6 +140,7 @@ async def send_template(
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, data=payload, auth=(account_sid, auth_token))
+        raise_for_upstream_error(response)
         return response.json()
 
 
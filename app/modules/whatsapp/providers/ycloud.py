@@ -5,7 +5,7 @@ import hmac
 import httpx
 from fastapi import Request
 
-from app.modules.whatsapp.providers.base import IncomingMessage
+from app.modules.whatsapp.providers.base import IncomingMessage, raise_for_upstream_error
 
 YCLOUD_API_BASE = "https://api.ycloud.com/v2"
 
@@ -83,6 +83,7 @@ async def send_text(phone_number: str, phone_number_id: str, to: str, text: str,
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers={"X-API-Key": api_key})
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -100,6 +101,7 @@ async def send_document(phone_number: str, phone_number_id: str, to: str, docume
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers={"X-API-Key": api_key})
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -117,6 +119,7 @@ async def send_image(phone_number: str, phone_number_id: str, to: str, image_url
     }
     async with httpx.AsyncClient() as client:
         response = await client.post(url, json=payload, headers={"X-API-Key": api_key})
+        raise_for_upstream_error(response)
         return response.json()
 
 
@@ -1,9 +1,11 @@
 """
 Public API for sending WhatsApp messages.
-Delegates to the configured provider (Meta or Twilio).
+Delegates to the configured provider (Meta or Twilio), through the outbound
+queue of that provider's default credentials (see outbound.py).
 """
 
 from app.config import get_settings
+from app.modules.whatsapp.outbound import queue_for
 
 
 def _get_provider():
@@ -15,22 +17,27 @@ def _get_provider():
     return meta
 
 
+def _queue():
+    provider = "twilio" if get_settings().whatsapp_provider == "twilio" else "meta"
+    return queue_for(provider, "default")
+
+
 async def send_text_message(to: str, text: str) -> dict:
-    return await _get_provider().send_text(to, text)
+    return await _queue().send("send_text", lambda: _get_provider().send_text(to, text))
 
 
 async def send_document_message(to: str, document_url: str, filename: str, caption: str | None = None) -> dict:
-    return await _get_provider().send_document(to, document_url, filename, caption)
+    return await _queue().send("send_document", lambda: _get_provider().send_document(to, document_url, filename, caption))
 
 
 async def send_image_message(to: str, image_url: str, caption: str | None = None) -> dict:
-    return await _get_provider().send_image(to, image_url, caption)
+    return await _queue().send("send_image", lambda: _get_provider().send_image(to, image_url, caption))
 
 
 async def send_template_message(to: str, template_name: str, language: str = "es_AR", components: list | None = None) -> dict:
     """Send a template message. Only supported on Meta — on Twilio falls back to text."""
     settings = get_settings()
     if settings.whatsapp_provider == "twilio":
-        return await _get_provider().send_text(to, f"[Template: {template_name}]")
+        return await send_text_message(to, f"[Template: {template_name}]")
     from app.modules.whatsapp.providers import meta
-    return await meta.send_template(to, template_name, language, components)
+    return await _queue().send("send_template", lambda: meta.send_template(to, template_name, language, components))
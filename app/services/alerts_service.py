@@ -1,248 +1,290 @@
-"""Alerts service: evaluates conditions and creates project_alerts rows."""
-import json
+"""Alerts service: evaluates conditions and creates project_alerts rows.
+
+Every rule is one INSERT ... SELECT ... ON CONFLICT DO NOTHING. Deduplication is
+done by the unique indexes on (project_id | organization_id, tipo, resource_id,
+alert_day) from migration 048, so a rule costs one round-trip however many rows
+match, and a condition alerts at most once per resource per day. $1 narrows a
+rule to one project and $2 to one resource (lead, reservation, budget line,
+etapa, cuota, ...); NULL means all of them.
+
+Write paths call check() for the rules their change can trigger (a factura
+re-checks its budget line, an installment change its cuota, an etapa patch that
+etapa), so those alerts show up seconds after the write. The periodic full
+evaluate_alerts() remains as the reconciliation pass, and is the only source of
+the purely time-based rules (inactive leads, stale reservations, cuotas that
+become due or overdue as days pass, investor reports, subscriptions).
+"""
+import asyncio
 import logging
-from typing import Optional
+import time
+from typing import Iterable, Optional
 
+from app.core import live_metrics
 from app.database import get_pool
 
 logger = logging.getLogger(__name__)
 
+# Rules run concurrently, each on its own pool connection; leave the rest of the
+# pool to live traffic.
+MAX_CONCURRENT_RULES = 4
+
+# Incremental checks run this long after check() is called: past the caller's
+# commit, and coalescing repeated writes to the same resource.
+CHECK_DELAY_SECONDS = 0.5
+
+# (tipo, project_id, resource_id) -> scheduled check
+_pending: dict[tuple[str, Optional[str], Optional[str]], asyncio.Task] = {}
+
+_PROJECT_ALERT_INSERT = """
+INSERT INTO project_alerts (project_id, tipo, titulo, descripcion, severidad, metadata)
+"""
+_ON_CONFLICT = """
+ON CONFLICT DO NOTHING
+RETURNING project_id, organization_id
+"""
+
+RULES: dict[str, str] = {
+    # hot/warm leads with no contact in 48h
+    "LEAD_SIN_ACTIVIDAD": _PROJECT_ALERT_INSERT + """
+        SELECT l.project_id, 'LEAD_SIN_ACTIVIDAD',
+               'Lead ' || COALESCE(NULLIF(l.name, ''), l.id::text) || ' sin actividad 48h',
+               'Lead ' || l.score || ' sin contacto en más de 48 horas',
+               'warning',
+               jsonb_build_object('resource_id', l.id::text, 'lead_name', COALESCE(l.name, ''))
+        FROM leads l
+        WHERE l.score IN ('hot', 'warm')
+          AND l.last_contact < NOW() - INTERVAL '48 hours'
+          AND l.project_id IS NOT NULL
+          AND ($1::uuid IS NULL OR l.project_id = $1)
+          AND ($2::uuid IS NULL OR l.id = $2)
+    """ + _ON_CONFLICT,
+
+    # active reservations older than 30 days
+    "UNIDAD_RESERVADA_SIN_CONVERTIR": _PROJECT_ALERT_INSERT + """
+        SELECT r.project_id, 'UNIDAD_RESERVADA_SIN_CONVERTIR',
+               'Reserva activa sin convertir hace 30+ días',
+               'Reserva de ' || COALESCE(NULLIF(r.buyer_name, ''), 'comprador desconocido')
+                   || ' lleva más de 30 días sin convertirse',
+               'warning',
+               jsonb_build_object('resource_id', r.id::text)
+        FROM reservations r
+        WHERE r.status = 'active'
+          AND r.created_at < NOW() - INTERVAL '30 days'
+          AND ($1::uuid IS NULL OR r.project_id = $1)
+          AND ($2::uuid IS NULL OR r.id = $2)
+    """ + _ON_CONFLICT,
+
+    # budget line spend (egreso facturas) > 110% of budget
+    "DESVIO_PRESUPUESTO": _PROJECT_ALERT_INSERT + """
+        SELECT d.project_id, 'DESVIO_PRESUPUESTO',
+               'Desvío presupuesto: ' || d.categoria,
+               'Categoría ' || d.categoria || ' superó el presupuesto en ' || d.desvio_pct || '%',
+               'critical',
+               jsonb_build_object('resource_id', d.id::text, 'categoria', d.categoria, 'desvio_pct', d.desvio_pct)
+        FROM (
+            SELECT b.id, b.project_id, b.categoria,
+                   round(SUM(COALESCE(f.monto_usd, CASE WHEN f.moneda = 'USD' THEN f.monto_total ELSE 0 END))
+                         / b.monto_usd * 100 - 100, 1) AS desvio_pct
+            FROM project_budget b
+            JOIN facturas f ON f.budget_id = b.id AND f.categoria = 'egreso' AND f.deleted_at IS NULL
+            WHERE b.monto_usd > 0
+              AND ($1::uuid IS NULL OR b.project_id = $1)
+              AND ($2::uuid IS NULL OR b.id = $2)
+            GROUP BY b.id, b.project_id, b.categoria, b.monto_usd
+            HAVING SUM(COALESCE(f.monto_usd, CASE WHEN f.moneda = 'USD' THEN f.monto_total ELSE 0 END))
+                   > b.monto_usd * 1.1
+        ) d
+    """ + _ON_CONFLICT,
+
+    # active stages < 30% complete while the project used > 30% of its planned time
+    "OBRA_ETAPA_ATRASADA": _PROJECT_ALERT_INSERT + """
+        SELECT e.project_id, 'OBRA_ETAPA_ATRASADA',
+               'Etapa atrasada: ' || e.nombre,
+               'Etapa ''' || e.nombre || ''' tiene solo ' || e.porcentaje_completado
+                   || '% pero el proyecto ya superó el 30% del tiempo planificado',
+               'warning',
+               jsonb_build_object('resource_id', e.id::text, 'etapa_nombre', e.nombre)
+        FROM obra_etapas e
+        JOIN projects p ON p.id = e.project_id
+        WHERE e.activa = TRUE
+          AND e.porcentaje_completado < 30
+          AND p.construction_start IS NOT NULL
+          AND p.estimated_delivery IS NOT NULL
+          AND (NOW()::date - p.construction_start) >
+              (p.estimated_delivery - p.construction_start) * 0.3
+          AND ($1::uuid IS NULL OR e.project_id = $1)
+          AND ($2::uuid IS NULL OR e.id = $2)
+    """ + _ON_CONFLICT,
+
+    # overdue installments
+    "CUOTA_VENCIDA": _PROJECT_ALERT_INSERT + """
+        SELECT r.project_id, 'CUOTA_VENCIDA',
+               'Cuota vencida — ' || COALESCE(NULLIF(r.buyer_name, ''), 'Comprador'),
+               'Cuota #' || pi.numero_cuota || ' de ' || COALESCE(NULLIF(r.buyer_name, ''), 'comprador')
+                   || ' venció el ' || to_char(pi.fecha_vencimiento, 'DD/MM/YYYY')
+                   || ' (' || pi.moneda || ' ' || to_char(pi.monto, 'FM999,999,999,990') || ')',
+               'critical',
+               jsonb_build_object('resource_id', pi.id::text, 'reservation_id', r.id::text,
+                                  'buyer_name', COALESCE(r.buyer_name, ''))
+        FROM payment_installments pi
+        JOIN payment_plans pp ON pp.id = pi.plan_id
+        JOIN reservations r ON r.id = pp.reservation_id
+        WHERE pi.estado = 'vencido'
+          AND pi.fecha_vencimiento < CURRENT_DATE
+          AND ($1::uuid IS NULL OR r.project_id = $1)
+          AND ($2::uuid IS NULL OR pi.id = $2)
+    """ + _ON_CONFLICT,
+
+    # installments due within 3 days
+    "CUOTA_PROXIMA": _PROJECT_ALERT_INSERT + """
+        SELECT r.project_id, 'CUOTA_PROXIMA',
+               'Cuota por vencer — ' || COALESCE(NULLIF(r.buyer_name, ''), 'Comprador'),
+               'Cuota #' || pi.numero_cuota || ' de ' || COALESCE(NULLIF(r.buyer_name, ''), 'comprador')
+                   || ' vence ' || CASE pi.fecha_vencimiento - CURRENT_DATE
+                                      WHEN 0 THEN 'hoy'
+                                      WHEN 1 THEN 'en 1 día'
+                                      ELSE 'en ' || (pi.fecha_vencimiento - CURRENT_DATE) || ' días' END
+                   || ' (' || pi.moneda || ' ' || to_char(pi.monto, 'FM999,999,999,990') || ')',
+               'warning',
+               jsonb_build_object('resource_id', pi.id::text, 'reservation_id', r.id::text,
+                                  'buyer_name', COALESCE(r.buyer_name, ''))
+        FROM payment_installments pi
+        JOIN payment_plans pp ON pp.id = pi.plan_id
+        JOIN reservations r ON r.id = pp.reservation_id
+        WHERE pi.estado IN ('pendiente', 'parcial')
+          AND pi.fecha_vencimiento BETWEEN CURRENT_DATE AND CURRENT_DATE + 3
+          AND ($1::uuid IS NULL OR r.project_id = $1)
+          AND ($2::uuid IS NULL OR pi.id = $2)
+    """ + _ON_CONFLICT,
+
+    # projects with investors but no report sent in 30 days
+    "INVERSOR_SIN_REPORTE": _PROJECT_ALERT_INSERT + """
+        SELECT DISTINCT i.project_id, 'INVERSOR_SIN_REPORTE',
+               'Inversores sin reporte en 30 días',
+               'Este proyecto tiene inversores pero no se envió ningún reporte en los últimos 30 días',
+               'info',
+               jsonb_build_object('resource_id', i.project_id::text)
+        FROM investors i
+        WHERE i.deleted_at IS NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM investor_reports r
+              WHERE r.project_id = i.project_id
+                AND r.enviado_at > NOW() - INTERVAL '30 days'
+          )
+          AND ($1::uuid IS NULL OR i.project_id = $1)
+          AND ($2::uuid IS NULL OR i.project_id = $2)
+    """ + _ON_CONFLICT,
+
+    # organization subscriptions expiring within 5 days (org-level alert)
+    "SUSCRIPCION_POR_VENCER": """
+        INSERT INTO project_alerts (organization_id, tipo, titulo, descripcion, severidad, metadata)
+        SELECT s.organization_id, 'SUSCRIPCION_POR_VENCER',
+               'Suscripción por vencer — ' || o.name,
+               'La suscripción de ' || o.name || ' vence '
+                   || CASE s.current_period_end - CURRENT_DATE
+                          WHEN 0 THEN 'hoy'
+                          WHEN 1 THEN 'en 1 día'
+                          ELSE 'en ' || (s.current_period_end - CURRENT_DATE) || ' días' END
+                   || ' (' || to_char(s.current_period_end, 'DD/MM/YYYY')
+                   || '). Renovar para mantener el acceso.',
+               'critical',
+               jsonb_build_object('resource_id', s.organization_id::text, 'org_name', o.name,
+                                  'dias_restantes', s.current_period_end - CURRENT_DATE)
+        FROM subscriptions s
+        JOIN organizations o ON o.id = s.organization_id
+        WHERE s.status = 'active'
+          AND s.current_period_end BETWEEN CURRENT_DATE AND CURRENT_DATE + 5
+          AND ($1::uuid IS NULL
+               OR s.organization_id = (SELECT organization_id FROM projects WHERE id = $1))
+          AND ($2::uuid IS NULL OR s.organization_id = $2)
+    """ + _ON_CONFLICT,
+}
+
+
+async def evaluate_alerts(
+    project_id: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    rules: Optional[Iterable[str]] = None,
+) -> dict:
+    """Evaluate alert rules (all, or the given tipos; for one project/resource, or
+    everything) and insert new alerts.
 
-async def evaluate_alerts(project_id: Optional[str] = None) -> int:
-    """Evaluate all alert conditions and insert new alerts. Returns count of alerts created."""
+    Returns {"alerts_created": n, "elapsed_ms": ms, "rules": {tipo: {"created", "ms"[, "error"]}}}.
+    A failing rule is reported and logged without stopping the others.
+    """
     pool = await get_pool()
-    created = 0
-
-    async def _insert_if_new(pid: str, tipo: str, titulo: str, descripcion: str, severidad: str, metadata: dict):
-        nonlocal created
-        resource_id = metadata.get("resource_id", "")
-        existing = await pool.fetchval(
-            """SELECT id FROM project_alerts
-               WHERE project_id = $1
-                 AND tipo = $2
-                 AND metadata->>'resource_id' = $3
-                 AND created_at > NOW() - INTERVAL '24 hours'""",
-            pid, tipo, resource_id,
-        )
-        if existing:
-            return
-        await pool.execute(
-            """INSERT INTO project_alerts (project_id, tipo, titulo, descripcion, severidad, metadata)
-               VALUES ($1, $2, $3, $4, $5, $6)""",
-            pid, tipo, titulo, descripcion, severidad, json.dumps(metadata),
-        )
-        created += 1
-
-    # 1. LEAD_SIN_ACTIVIDAD: hot/warm leads with no contact in 48h
-    lead_conditions = "score IN ('hot', 'warm') AND last_contact < NOW() - INTERVAL '48 hours'"
-    if project_id:
-        leads = await pool.fetch(
-            f"SELECT id, name, project_id, score FROM leads WHERE project_id = $1 AND {lead_conditions}",
-            project_id,
-        )
-    else:
-        leads = await pool.fetch(
-            f"SELECT id, name, project_id, score FROM leads WHERE {lead_conditions}"
-        )
-    for lead in leads:
-        await _insert_if_new(
-            pid=str(lead["project_id"]),
-            tipo="LEAD_SIN_ACTIVIDAD",
-            titulo=f"Lead {lead['name'] or lead['id']} sin actividad 48h",
-            descripcion=f"Lead {lead['score']} sin contacto en más de 48 horas",
-            severidad="warning",
-            metadata={"resource_id": str(lead["id"]), "lead_name": lead["name"] or ""},
-        )
-
-    # 2. UNIDAD_RESERVADA_SIN_CONVERTIR: active reservations older than 30 days
-    res_conditions = "status = 'active' AND created_at < NOW() - INTERVAL '30 days'"
-    if project_id:
-        reservations = await pool.fetch(
-            f"SELECT id, project_id, buyer_name FROM reservations WHERE project_id = $1 AND {res_conditions}",
-            project_id,
-        )
-    else:
-        reservations = await pool.fetch(
-            f"SELECT id, project_id, buyer_name FROM reservations WHERE {res_conditions}"
-        )
-    for res in reservations:
-        await _insert_if_new(
-            pid=str(res["project_id"]),
-            tipo="UNIDAD_RESERVADA_SIN_CONVERTIR",
-            titulo="Reserva activa sin convertir hace 30+ días",
-            descripcion=f"Reserva de {res['buyer_name'] or 'comprador desconocido'} lleva más de 30 días sin convertirse",
-            severidad="warning",
-            metadata={"resource_id": str(res["id"])},
-        )
-
-    # 3. DESVIO_PRESUPUESTO: category spend > 110% of budget
-    try:
-        budget_conditions = "" if not project_id else f"AND b.project_id = '{project_id}'"
-        desvios = await pool.fetch(
-            f"""SELECT b.id, b.project_id, b.categoria, b.monto_usd,
-                       COALESCE(SUM(e.monto_usd), 0) as ejecutado
-                FROM project_budget b
-                LEFT JOIN project_expenses e ON e.budget_id = b.id AND e.deleted_at IS NULL
-                WHERE b.monto_usd > 0 {budget_conditions}
-                GROUP BY b.id, b.project_id, b.categoria, b.monto_usd
-                HAVING COALESCE(SUM(e.monto_usd), 0) > b.monto_usd * 1.1"""
-        )
-        for d in desvios:
-            pct = round(float(d["ejecutado"]) / float(d["monto_usd"]) * 100 - 100, 1)
-            await _insert_if_new(
-                pid=str(d["project_id"]),
-                tipo="DESVIO_PRESUPUESTO",
-                titulo=f"Desvío presupuesto: {d['categoria']}",
-                descripcion=f"Categoría {d['categoria']} superó el presupuesto en {pct}%",
-                severidad="critical",
-                metadata={"resource_id": str(d["id"]), "categoria": d["categoria"], "desvio_pct": pct},
-            )
-    except Exception as e:
-        logger.debug("Desvio presupuesto check skipped (tables may not exist): %s", e)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_RULES)
+    started = time.monotonic()
+    selected = {tipo: RULES[tipo] for tipo in rules} if rules is not None else RULES
 
-    # 4. OBRA_ETAPA_ATRASADA: active stages < 30% complete but project > 30% of planned time
-    try:
-        etapa_conditions = "" if not project_id else f"AND e.project_id = '{project_id}'"
-        atrasadas = await pool.fetch(
-            f"""SELECT e.id, e.project_id, e.nombre, e.porcentaje_completado,
-                       p.construction_start, p.estimated_delivery
-                FROM obra_etapas e
-                JOIN projects p ON p.id = e.project_id
-                WHERE e.activa = TRUE
-                  AND e.porcentaje_completado < 30
-                  AND p.construction_start IS NOT NULL
-                  AND p.estimated_delivery IS NOT NULL
-                  AND (NOW()::date - p.construction_start) >
-                      (p.estimated_delivery - p.construction_start) * 0.3
-                {etapa_conditions}"""
-        )
-        for et in atrasadas:
-            await _insert_if_new(
-                pid=str(et["project_id"]),
-                tipo="OBRA_ETAPA_ATRASADA",
-                titulo=f"Etapa atrasada: {et['nombre']}",
-                descripcion=f"Etapa '{et['nombre']}' tiene solo {et['porcentaje_completado']}% pero el proyecto ya superó el 30% del tiempo planificado",
-                severidad="warning",
-                metadata={"resource_id": str(et["id"]), "etapa_nombre": et["nombre"]},
-            )
-    except Exception as e:
-        logger.debug("Etapa atrasada check skipped: %s", e)
+    async def _run(tipo: str, sql: str) -> tuple[str, list, dict]:
+        async with semaphore:
+            t0 = time.monotonic()
+            try:
+                rows = await pool.fetch(sql, project_id, resource_id)
+                return tipo, rows, {"created": len(rows), "ms": round((time.monotonic() - t0) * 1000, 1)}
+            except Exception as e:
+                logger.warning("Alert rule %s failed: %s", tipo, e)
+                return tipo, [], {"created": 0, "ms": round((time.monotonic() - t0) * 1000, 1), "error": str(e)}
 
-    # 5. CUOTA_VENCIDA: installments overdue (fecha_vencimiento < today, estado = vencido)
-    try:
-        cuota_conditions = "" if not project_id else f"AND r.project_id = '{project_id}'"
-        vencidas = await pool.fetch(
-            f"""SELECT pi.id, pi.numero_cuota, pi.monto, pi.moneda, pi.fecha_vencimiento,
-                       r.project_id, r.id AS reservation_id, r.buyer_name
-                FROM payment_installments pi
-                JOIN payment_plans pp ON pp.id = pi.plan_id
-                JOIN reservations r ON r.id = pp.reservation_id
-                WHERE pi.estado = 'vencido'
-                  AND pi.fecha_vencimiento < CURRENT_DATE
-                {cuota_conditions}"""
-        )
-        for cv in vencidas:
-            await _insert_if_new(
-                pid=str(cv["project_id"]),
-                tipo="CUOTA_VENCIDA",
-                titulo=f"Cuota vencida — {cv['buyer_name'] or 'Comprador'}",
-                descripcion=f"Cuota #{cv['numero_cuota']} de {cv['buyer_name'] or 'comprador'} venció el {cv['fecha_vencimiento'].strftime('%d/%m/%Y')} ({cv['moneda']} {float(cv['monto']):,.0f})",
-                severidad="critical",
-                metadata={"resource_id": str(cv["id"]), "reservation_id": str(cv["reservation_id"]), "buyer_name": cv["buyer_name"] or ""},
-            )
-    except Exception as e:
-        logger.debug("Cuota vencida check skipped: %s", e)
+    results = await asyncio.gather(*(_run(tipo, sql) for tipo, sql in selected.items()))
 
-    # 6. CUOTA_PROXIMA: installments due within 3 days
-    try:
-        proxima_conditions = "" if not project_id else f"AND r.project_id = '{project_id}'"
-        proximas = await pool.fetch(
-            f"""SELECT pi.id, pi.numero_cuota, pi.monto, pi.moneda, pi.fecha_vencimiento,
-                       r.project_id, r.id AS reservation_id, r.buyer_name
-                FROM payment_installments pi
-                JOIN payment_plans pp ON pp.id = pi.plan_id
-                JOIN reservations r ON r.id = pp.reservation_id
-                WHERE pi.estado IN ('pendiente', 'parcial')
-                  AND pi.fecha_vencimiento BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '3 days'
-                {proxima_conditions}"""
-        )
-        for cp in proximas:
-            dias = (cp["fecha_vencimiento"] - __import__("datetime").date.today()).days
-            label = "hoy" if dias == 0 else f"en {dias} día{'s' if dias > 1 else ''}"
-            await _insert_if_new(
-                pid=str(cp["project_id"]),
-                tipo="CUOTA_PROXIMA",
-                titulo=f"Cuota por vencer — {cp['buyer_name'] or 'Comprador'}",
-                descripcion=f"Cuota #{cp['numero_cuota']} de {cp['buyer_name'] or 'comprador'} vence {label} ({cp['moneda']} {float(cp['monto']):,.0f})",
-                severidad="warning",
-                metadata={"resource_id": str(cp["id"]), "reservation_id": str(cp["reservation_id"]), "buyer_name": cp["buyer_name"] or ""},
-            )
-    except Exception as e:
-        logger.debug("Cuota proxima check skipped: %s", e)
+    touched_projects: set[str] = set()
+    touched_orgs: set[str] = set()
+    report: dict[str, dict] = {}
+    for tipo, rows, stats in results:
+        report[tipo] = stats
+        for r in rows:
+            if r["project_id"]:
+                touched_projects.add(str(r["project_id"]))
+            elif r["organization_id"]:
+                touched_orgs.add(str(r["organization_id"]))
 
-    # 7. INVERSOR_SIN_REPORTE: projects with investors but no report sent in 30 days
+    for pid in touched_projects:
+        await live_metrics.touch_project(pid)
+    for org_id in touched_orgs:
+        live_metrics.touch(org_id)
+
+    created = sum(s["created"] for s in report.values())
+    elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+    # Incremental checks are frequent; only full scans are worth an info line.
+    logger.log(
+        logging.INFO if resource_id is None and rules is None else logging.DEBUG,
+        "Alerts evaluated: %d new alerts created in %.0fms (%s)",
+        created, elapsed_ms, ", ".join(f"{t}={s['created']}/{s['ms']:.0f}ms" for t, s in report.items()),
+    )
+    return {"alerts_created": created, "elapsed_ms": elapsed_ms, "rules": report}
+
+
+def check(rules: Iterable[str], resource_id=None, project_id=None) -> None:
+    """Schedule an incremental evaluation of `rules` for one resource (or project).
+
+    Fire-and-forget, like live_metrics.touch(): safe to call from inside a
+    transaction, since the check runs CHECK_DELAY_SECONDS later, and repeated
+    calls for the same rule and resource before then collapse into one.
+    """
+    if resource_id is None and project_id is None:
+        return
+    resource_id = str(resource_id) if resource_id is not None else None
+    project_id = str(project_id) if project_id is not None else None
     try:
-        investor_conditions = "" if not project_id else f"AND i.project_id = '{project_id}'"
-        sin_reporte = await pool.fetch(
-            f"""SELECT DISTINCT i.project_id
-                FROM investors i
-                WHERE NOT EXISTS (
-                    SELECT 1 FROM investor_reports r
-                    WHERE r.project_id = i.project_id
-                      AND r.enviado_at > NOW() - INTERVAL '30 days'
-                )
-                AND i.deleted_at IS NULL
-                {investor_conditions}"""
-        )
-        for sr in sin_reporte:
-            pid_val = str(sr["project_id"])
-            await _insert_if_new(
-                pid=pid_val,
-                tipo="INVERSOR_SIN_REPORTE",
-                titulo="Inversores sin reporte en 30 días",
-                descripcion="Este proyecto tiene inversores pero no se envió ningún reporte en los últimos 30 días",
-                severidad="info",
-                metadata={"resource_id": pid_val},
-            )
-    except Exception as e:
-        logger.debug("Inversor sin reporte check skipped (tables may not exist): %s", e)
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # no event loop (scripts)
+    for tipo in rules:
+        key = (tipo, project_id, resource_id)
+        if key not in _pending:
+            _pending[key] = loop.create_task(_check(key))
+
 
-    # 8. SUSCRIPCION_POR_VENCER: subscriptions expiring within 5 days
+async def _check(key: tuple[str, Optional[str], Optional[str]]) -> None:
+    tipo, project_id, resource_id = key
     try:
-        subs = await pool.fetch(
-            """SELECT s.organization_id, s.current_period_end, o.name AS org_name
-               FROM subscriptions s
-               JOIN organizations o ON o.id = s.organization_id
-               WHERE s.status = 'active'
-                 AND s.current_period_end BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '5 days'"""
-        )
-        for sub in subs:
-            dias = (sub["current_period_end"] - __import__("datetime").date.today()).days
-            label = "hoy" if dias == 0 else f"en {dias} día{'s' if dias > 1 else ''}"
-            org_id = str(sub["organization_id"])
-            existing = await pool.fetchval(
-                """SELECT id FROM project_alerts
-                   WHERE organization_id = $1
-                     AND tipo = 'SUSCRIPCION_POR_VENCER'
-                     AND created_at > NOW() - INTERVAL '24 hours'""",
-                org_id,
-            )
-            if existing:
-                continue
-            await pool.execute(
-                """INSERT INTO project_alerts
-                       (organization_id, tipo, titulo, descripcion, severidad, metadata)
-                   VALUES ($1, $2, $3, $4, $5, $6)""",
-                org_id,
-                "SUSCRIPCION_POR_VENCER",
-                f"Suscripción por vencer — {sub['org_name']}",
-                f"La suscripción de {sub['org_name']} vence {label} ({sub['current_period_end'].strftime('%d/%m/%Y')}). Renovar para mantener el acceso.",
-                "critical",
-                __import__("json").dumps({"resource_id": org_id, "org_name": sub["org_name"], "dias_restantes": dias}),
-            )
-            created += 1
+        await asyncio.sleep(CHECK_DELAY_SECONDS)
+        _pending.pop(key, None)
+        await evaluate_alerts(project_id=project_id, resource_id=resource_id, rules=[tipo])
     except Exception as e:
-        logger.debug("Suscripcion por vencer check skipped: %s", e)
-
-    logger.info("Alerts evaluated: %d new alerts created", created)
-    return created
+        logger.error("Incremental alert check %s for %s failed: %s", tipo, resource_id or project_id, e)
+    finally:
+        if _pending.get(key) is asyncio.current_task():
+            _pending.pop(key, None)
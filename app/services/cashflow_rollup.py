@@ -0,0 +1,243 @@
+"""Monthly cash-flow rollup (cashflow_monthly), one row per (project, month).
+
+Write paths that create, change or delete payment_records, facturas or
+payment_installments call refresh_months() / refresh_for_installment() with the
+dates they touched (old and new), inside their own transaction. A refresh
+recomputes only those buckets from the source tables with plain date-range
+predicates, so it is idempotent and cannot drift the way +/- deltas would.
+rebuild() recomputes everything (or one project) from scratch.
+
+Amounts are kept per currency and converted with the project's current exchange
+rate at read time, so changing the rate needs no refresh.
+"""
+import logging
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+from app.database import get_pool
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "ingresos_usd", "ingresos_ars", "n_ingresos",
+    "egresos_usd", "egresos_ars", "n_egresos",
+    "proyeccion_usd", "proyeccion_ars", "n_proyeccion",
+)
+
+# Source rows of a bucket, one per payment_record / factura / open installment.
+# {ingresos}, {egresos} and {proyeccion} are the extra join/filter conditions.
+_SOURCE_SQL = """
+    SELECT r.project_id, date_trunc('month', pr.fecha_pago)::date AS month,
+           CASE WHEN pr.moneda = 'USD' THEN pr.monto_pagado ELSE 0 END AS ingresos_usd,
+           CASE WHEN pr.moneda = 'USD' THEN 0 ELSE pr.monto_pagado END AS ingresos_ars,
+           1 AS n_ingresos, 0 AS egresos_usd, 0 AS egresos_ars, 0 AS n_egresos,
+           0 AS proyeccion_usd, 0 AS proyeccion_ars, 0 AS n_proyeccion
+    FROM payment_records pr
+    JOIN payment_installments pi ON pi.id = pr.installment_id
+    JOIN payment_plans pp ON pp.id = pi.plan_id
+    JOIN reservations r ON r.id = pp.reservation_id
+    {ingresos}
+    UNION ALL
+    SELECT f.project_id, date_trunc('month', f.fecha_emision)::date,
+           0, 0, 0,
+           CASE WHEN f.moneda = 'USD' THEN f.monto_total ELSE COALESCE(f.monto_usd, 0) END,
+           CASE WHEN f.moneda = 'USD' OR f.monto_usd IS NOT NULL THEN 0 ELSE f.monto_total END,
+           1, 0, 0, 0
+    FROM facturas f
+    {egresos}
+    UNION ALL
+    SELECT r.project_id, date_trunc('month', pi.fecha_vencimiento)::date,
+           0, 0, 0, 0, 0, 0,
+           CASE WHEN pi.moneda = 'USD' THEN pi.monto ELSE 0 END,
+           CASE WHEN pi.moneda = 'USD' THEN 0 ELSE pi.monto END,
+           1
+    FROM payment_installments pi
+    JOIN payment_plans pp ON pp.id = pi.plan_id
+    JOIN reservations r ON r.id = pp.reservation_id
+    {proyeccion}
+"""
+
+_UPSERT_SET = ", ".join(f"{c} = EXCLUDED.{c}" for c in _COLUMNS) + ", updated_at = NOW()"
+_SUMS = ", ".join(f"COALESCE(SUM(s.{c}), 0) AS {c}" for c in _COLUMNS)
+
+_REFRESH_SOURCE = _SOURCE_SQL.format(
+    ingresos="""JOIN m ON pr.fecha_pago >= m.month AND pr.fecha_pago < m.month_end
+    WHERE r.project_id = $1::uuid AND pr.deleted_at IS NULL""",
+    egresos="""JOIN m ON f.fecha_emision >= m.month AND f.fecha_emision < m.month_end
+    WHERE f.project_id = $1::uuid AND f.categoria = 'egreso' AND f.deleted_at IS NULL""",
+    proyeccion="""JOIN m ON pi.fecha_vencimiento >= m.month AND pi.fecha_vencimiento < m.month_end
+    WHERE r.project_id = $1::uuid AND pi.estado IN ('pendiente', 'vencido')""",
+)
+
+_REBUILD_SOURCE = _SOURCE_SQL.format(
+    ingresos="WHERE ($1::uuid IS NULL OR r.project_id = $1) AND pr.deleted_at IS NULL",
+    egresos="WHERE ($1::uuid IS NULL OR f.project_id = $1) AND f.categoria = 'egreso' AND f.deleted_at IS NULL",
+    proyeccion="WHERE ($1::uuid IS NULL OR r.project_id = $1) AND pi.estado IN ('pendiente', 'vencido')",
+)
+
+# $1 project_id, $2 dates: recompute the months containing those dates. Months
+# left without source rows are deleted.
+_REFRESH_SQL = f"""
+WITH m AS (
+    SELECT DISTINCT date_trunc('month', d)::date AS month,
+           (date_trunc('month', d) + INTERVAL '1 month')::date AS month_end
+    FROM unnest($2::date[]) AS d
+),
+src AS ({_REFRESH_SOURCE}),
+agg AS (
+    SELECT m.month, {_SUMS}
+    FROM m LEFT JOIN src s ON s.month = m.month
+    GROUP BY m.month
+),
+gone AS (
+    DELETE FROM cashflow_monthly c USING agg
+    WHERE c.project_id = $1::uuid AND c.month = agg.month
+      AND agg.n_ingresos + agg.n_egresos + agg.n_proyeccion = 0
+)
+INSERT INTO cashflow_monthly (project_id, month, {", ".join(_COLUMNS)})
+SELECT $1::uuid, month, {", ".join(_COLUMNS)}
+FROM agg
+WHERE n_ingresos + n_egresos + n_proyeccion > 0
+ON CONFLICT (project_id, month) DO UPDATE SET {_UPSERT_SET}
+"""
+
+# $1 project_id or NULL for every project
+_REBUILD_SQL = f"""
+INSERT INTO cashflow_monthly (project_id, month, {", ".join(_COLUMNS)})
+SELECT s.project_id, s.month, {", ".join(f"SUM(s.{c})" for c in _COLUMNS)}
+FROM ({_REBUILD_SOURCE}) s
+GROUP BY s.project_id, s.month
+"""
+
+# $1 project_ids, $2/$3 first/last month (inclusive, nullable). proyeccion only
+# counts installments due from today on: past months get none and the current
+# month is computed live; later months come straight from the rollup.
+_READ_SQL = """
+WITH cur AS (SELECT date_trunc('month', CURRENT_DATE)::date AS month),
+live AS (
+    SELECT SUM(CASE WHEN pi.moneda = 'USD' THEN pi.monto
+                    ELSE pi.monto / COALESCE(fc.tipo_cambio_usd_ars, 1) END) AS total,
+           COUNT(*) AS n
+    FROM payment_installments pi
+    JOIN payment_plans pp ON pp.id = pi.plan_id
+    JOIN reservations r ON r.id = pp.reservation_id
+    LEFT JOIN project_financials_config fc ON fc.project_id = r.project_id
+    WHERE r.project_id = ANY($1::uuid[])
+      AND pi.estado IN ('pendiente', 'vencido')
+      AND pi.fecha_vencimiento >= CURRENT_DATE
+      AND pi.fecha_vencimiento < ((SELECT month FROM cur) + INTERVAL '1 month')::date
+),
+buckets AS (
+    SELECT c.month,
+           SUM(c.ingresos_usd + c.ingresos_ars / COALESCE(fc.tipo_cambio_usd_ars, 1)) AS ingresos,
+           SUM(c.egresos_usd + c.egresos_ars / COALESCE(fc.tipo_cambio_usd_ars, 1)) AS egresos,
+           SUM(c.proyeccion_usd + c.proyeccion_ars / COALESCE(fc.tipo_cambio_usd_ars, 1)) AS proyeccion,
+           SUM(c.n_ingresos) AS n_ingresos,
+           SUM(c.n_egresos) AS n_egresos,
+           SUM(c.n_proyeccion) AS n_proyeccion
+    FROM cashflow_monthly c
+    LEFT JOIN project_financials_config fc ON fc.project_id = c.project_id
+    WHERE c.project_id = ANY($1::uuid[])
+      AND ($2::date IS NULL OR c.month >= $2)
+      AND ($3::date IS NULL OR c.month <= $3)
+    GROUP BY c.month
+)
+SELECT b.month, b.ingresos, b.egresos, b.n_ingresos, b.n_egresos,
+       CASE WHEN b.month < cur.month THEN 0
+            WHEN b.month = cur.month THEN COALESCE(live.total, 0)
+            ELSE b.proyeccion END AS proyeccion,
+       CASE WHEN b.month < cur.month THEN 0
+            WHEN b.month = cur.month THEN live.n
+            ELSE b.n_proyeccion END AS n_proyeccion
+FROM buckets b CROSS JOIN cur CROSS JOIN live
+ORDER BY b.month
+"""
+
+
+def parse_month(value: Optional[str]) -> Optional[date]:
+    """'YYYY-MM' (or a full YYYY-MM-DD date) → first day of that month."""
+    if not value:
+        return None
+    return datetime.strptime(value[:7], "%Y-%m").date()
+
+
+async def _lock_project(conn, project_id) -> None:
+    # Serializes refreshes of one project until commit, so a refresh always
+    # sees the rows committed by the previous one.
+    await conn.execute("SELECT pg_advisory_xact_lock(hashtext('cashflow:' || $1::text))", str(project_id))
+
+
+async def refresh_months(conn, project_id, dates: Iterable[Optional[date]]) -> None:
+    """Recompute the buckets of `project_id` for the months containing `dates`.
+
+    Call it with the connection of the writing transaction, after the write, with
+    every date the write may have moved rows out of or into. None is ignored.
+    """
+    months = sorted({date(d.year, d.month, 1) for d in dates if d is not None})
+    if not project_id or not months:
+        return
+    async with conn.transaction():
+        await _lock_project(conn, project_id)
+        await conn.execute(_REFRESH_SQL, str(project_id), months)
+
+
+async def refresh_for_installment(conn, installment_id, dates: Iterable[Optional[date]] = ()) -> None:
+    """refresh_months() for the project of an installment.
+
+    The installment's own due month is always included, since payments change
+    its estado and with it the proyeccion of that month.
+    """
+    row = await conn.fetchrow(
+        """SELECT r.project_id, pi.fecha_vencimiento
+           FROM payment_installments pi
+           JOIN payment_plans pp ON pp.id = pi.plan_id
+           JOIN reservations r ON r.id = pp.reservation_id
+           WHERE pi.id = $1""",
+        installment_id,
+    )
+    if row:
+        await refresh_months(conn, row["project_id"], [*dates, row["fecha_vencimiento"]])
+
+
+async def rebuild(project_id: Optional[str] = None, conn=None) -> int:
+    """Recompute cashflow_monthly from the source tables. Returns the bucket count."""
+    if conn is None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            return await rebuild(project_id, conn)
+    async with conn.transaction():
+        if project_id:
+            await _lock_project(conn, project_id)
+            await conn.execute("DELETE FROM cashflow_monthly WHERE project_id = $1", project_id)
+        else:
+            await conn.execute("LOCK TABLE cashflow_monthly IN SHARE ROW EXCLUSIVE MODE")
+            await conn.execute("DELETE FROM cashflow_monthly")
+        status = await conn.execute(_REBUILD_SQL, project_id)
+    buckets = int(status.split()[-1])
+    logger.info("cashflow_monthly rebuilt (project=%s): %d buckets", project_id or "all", buckets)
+    return buckets
+
+
+async def read_cash_flow(project_ids: list[str], desde: Optional[date] = None, hasta: Optional[date] = None) -> list[dict]:
+    """Monthly {mes, ingresos, egresos, proyeccion, saldo, acumulado} in USD for
+    the given projects combined, oldest month first."""
+    pool = await get_pool()
+    rows = await pool.fetch(_READ_SQL, project_ids, desde, hasta)
+    result = []
+    acumulado = 0.0
+    for r in rows:
+        if not (r["n_ingresos"] or r["n_egresos"] or r["n_proyeccion"]):
+            continue
+        ingresos = float(r["ingresos"] or 0)
+        egresos = float(r["egresos"] or 0)
+        saldo = round(ingresos - egresos, 2)
+        acumulado += saldo
+        result.append({
+            "mes": r["month"].strftime("%Y-%m"),
+            "ingresos": round(ingresos, 2),
+            "egresos": round(egresos, 2),
+            "proyeccion": round(float(r["proyeccion"] or 0), 2),
+            "saldo": saldo,
+            "acumulado": round(acumulado, 2),
+        })
+    return result
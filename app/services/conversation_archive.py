@@ -0,0 +1,296 @@
+"""Conversation retention: monthly partitions of `conversations` and their archive.
+
+Months older than `conversation_retention_months` are exported to object storage
+as one gzip JSONL object per month and then detached and dropped. Inside the
+object each lead's messages are a separate gzip member (concatenated members are
+still a valid gzip stream), and conversation_archive_leads stores the byte range
+of every member, so the transcript API range-GETs only the lead it needs.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import re
+import tempfile
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Optional
+
+from app.config import get_settings
+from app.database import get_pool
+from app.modules.storage import get_object_range, get_object_size, put_fileobj
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_RE = re.compile(r"^conversations_p(\d{4})(\d{2})$")
+_ARCHIVE_COLUMNS = (
+    "id", "lead_id", "wa_message_id", "role", "sender_type", "sender_id",
+    "handoff_id", "content", "media_type", "media_url", "created_at",
+)
+_CATALOG_COLUMNS = [
+    "lead_id", "month", "message_count", "first_at", "last_at", "byte_offset", "byte_length",
+]
+
+# (lead_id, month) -> messages, oldest first. Archived months are immutable, so
+# entries never go stale; the size cap only bounds memory.
+_ARCHIVE_CACHE_MAX = 256
+
+# The export is spooled to a temp file in chunks of this size, then uploaded
+# from disk (multipart for large months), so memory does not grow with the month.
+_SPOOL_CHUNK_BYTES = 4 * 1024 * 1024
+_archive_cache: "OrderedDict[tuple[str, date], list[dict]]" = OrderedDict()
+
+
+def _archive_key(month: date) -> str:
+    return f"archive/conversations/{month.year}/conversations_{month:%Y%m}.jsonl.gz"
+
+
+def _retention_cutoff(keep_months: int, today: Optional[date] = None) -> date:
+    """First day of the oldest month that stays in Postgres."""
+    today = today or date.today()
+    months = today.year * 12 + (today.month - 1) - keep_months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _serialize(row) -> str:
+    out = {}
+    for col in _ARCHIVE_COLUMNS:
+        value = row[col]
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif value is not None and not isinstance(value, str):
+            value = str(value)
+        out[col] = value
+    return json.dumps(out, ensure_ascii=False) + "\n"
+
+
+def _deserialize(line: str) -> dict:
+    msg = json.loads(line)
+    msg["created_at"] = datetime.fromisoformat(msg["created_at"])
+    return msg
+
+
+# ---------------------------------------------------------------------------
+# Partition maintenance + export
+# ---------------------------------------------------------------------------
+
+async def ensure_partitions(months_ahead: Optional[int] = None) -> int:
+    """Create the current month's partition and the next `months_ahead` ones."""
+    if months_ahead is None:
+        months_ahead = get_settings().conversation_partitions_ahead
+    pool = await get_pool()
+    return await pool.fetchval("SELECT ensure_conversations_partitions($1)", months_ahead)
+
+
+async def list_partitions() -> list[tuple[date, str]]:
+    """Monthly partitions currently attached to conversations, oldest first."""
+    pool = await get_pool()
+    rows = await pool.fetch(
+        """SELECT c.relname FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'conversations'::regclass"""
+    )
+    partitions = []
+    for r in rows:
+        m = _PARTITION_RE.match(r["relname"])
+        if m:
+            partitions.append((date(int(m.group(1)), int(m.group(2)), 1), r["relname"]))
+    return sorted(partitions)
+
+
+async def archive_old_partitions(keep_months: Optional[int] = None, dry_run: bool = False) -> dict:
+    """Export, detach and drop every monthly partition older than `keep_months`.
+
+    Also tops up future partitions first, so the same job keeps both ends of the
+    table in shape. Each partition is handled independently; one failure does
+    not stop the rest.
+    """
+    if keep_months is None:
+        keep_months = get_settings().conversation_retention_months
+    cutoff = _retention_cutoff(keep_months)
+
+    await ensure_partitions()
+    candidates = [(month, name) for month, name in await list_partitions() if month < cutoff]
+
+    if dry_run:
+        return {"dry_run": True, "cutoff": cutoff.isoformat(), "partitions": [n for _, n in candidates]}
+
+    archived: list[dict] = []
+    errors: list[dict] = []
+    for month, name in candidates:
+        try:
+            archived.append(await _archive_partition(month, name))
+        except Exception as e:
+            logger.error("Failed to archive partition %s: %s", name, e, exc_info=True)
+            errors.append({"partition": name, "error": str(e)})
+
+    logger.info("archive-conversations: archived %d partitions (cutoff %s)", len(archived), cutoff)
+    return {"cutoff": cutoff.isoformat(), "archived": archived, "errors": errors}
+
+
+async def _export_partition(pool, month: date, name: str, spool) -> tuple[int, int, list[tuple]]:
+    """Write a partition as gzip members (one per lead) to `spool`.
+
+    Returns (rows, bytes written, catalog records). Members are buffered up to
+    _SPOOL_CHUNK_BYTES and written from a worker thread.
+    """
+    pending = bytearray()
+    catalog: list[tuple] = []
+    total = 0
+    size = 0
+
+    def _member(lead_id, lines: list[str], first_at, last_at) -> None:
+        nonlocal size
+        member = gzip.compress("".join(lines).encode("utf-8"), compresslevel=6, mtime=0)
+        if lead_id is not None:
+            catalog.append((lead_id, month, len(lines), first_at, last_at, size, len(member)))
+        pending.extend(member)
+        size += len(member)
+
+    async def _spill() -> None:
+        await asyncio.to_thread(spool.write, bytes(pending))
+        pending.clear()
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            current = object()
+            lines: list[str] = []
+            first_at = last_at = None
+            async for row in conn.cursor(
+                f'SELECT {", ".join(_ARCHIVE_COLUMNS)} FROM "{name}" ORDER BY lead_id, created_at, id',
+                prefetch=1000,
+            ):
+                if row["lead_id"] != current:
+                    if lines:
+                        _member(current, lines, first_at, last_at)
+                        if len(pending) >= _SPOOL_CHUNK_BYTES:
+                            await _spill()
+                    current, lines, first_at = row["lead_id"], [], row["created_at"]
+                lines.append(_serialize(row))
+                last_at = row["created_at"]
+                total += 1
+            if lines:
+                _member(current, lines, first_at, last_at)
+    await _spill()
+    await asyncio.to_thread(spool.flush)
+    return total, size, catalog
+
+
+async def _archive_partition(month: date, name: str) -> dict:
+    """Export one partition, then record it in the catalog and drop it atomically.
+
+    `name` always comes from pg_class and matches _PARTITION_RE, so it is safe to
+    interpolate as an identifier.
+    """
+    pool = await get_pool()
+    if await pool.fetchval("SELECT 1 FROM conversation_archives WHERE month = $1", month):
+        raise RuntimeError(f"{month:%Y-%m} ya está archivado; revisar {name} manualmente")
+
+    with tempfile.TemporaryFile() as spool:
+        total, size, catalog = await _export_partition(pool, month, name, spool)
+        key = _archive_key(month)
+        if total:
+            spool.seek(0)
+            await asyncio.to_thread(put_fileobj, key, spool, "application/gzip")
+            stored = await asyncio.to_thread(get_object_size, key)
+            if stored != size:
+                raise RuntimeError(f"Tamaño inesperado en {key}: {stored} != {size}")
+
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            # Rows only land in past months by accident, but never drop data that
+            # did not make it into the object.
+            current_count = await conn.fetchval(f'SELECT COUNT(*) FROM "{name}"')
+            if current_count != total:
+                raise RuntimeError(f"{name} cambió durante la exportación ({total} → {current_count})")
+            if total:
+                await conn.execute(
+                    """INSERT INTO conversation_archives (month, object_key, row_count, byte_size)
+                       VALUES ($1, $2, $3, $4)""",
+                    month, key, total, size,
+                )
+                await conn.copy_records_to_table(
+                    "conversation_archive_leads", records=catalog, columns=_CATALOG_COLUMNS,
+                )
+            await conn.execute(f'ALTER TABLE conversations DETACH PARTITION "{name}"')
+            await conn.execute(f'DROP TABLE "{name}"')
+
+    logger.info("Archived %s: %d messages, %d leads, %d bytes → %s", name, total, len(catalog), size, key)
+    return {
+        "partition": name,
+        "month": month.isoformat(),
+        "rows": total,
+        "leads": len(catalog),
+        "bytes": size,
+        "object_key": key if total else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Read path
+# ---------------------------------------------------------------------------
+
+async def _load_lead_month(lead_id: str, month: date, object_key: str, offset: int, length: int) -> list[dict]:
+    cache_key = (lead_id, month)
+    cached = _archive_cache.get(cache_key)
+    if cached is not None:
+        _archive_cache.move_to_end(cache_key)
+        return cached
+
+    raw = await asyncio.to_thread(get_object_range, object_key, offset, length)
+    messages = [_deserialize(line) for line in gzip.decompress(raw).decode("utf-8").splitlines() if line]
+    _archive_cache[cache_key] = messages
+    if len(_archive_cache) > _ARCHIVE_CACHE_MAX:
+        _archive_cache.popitem(last=False)
+    return messages
+
+
+async def _lead_archive_months(lead_id: str, before_ts: Optional[datetime] = None) -> list:
+    pool = await get_pool()
+    return await pool.fetch(
+        """SELECT cal.month, cal.byte_offset, cal.byte_length, ca.object_key
+           FROM conversation_archive_leads cal
+           JOIN conversation_archives ca ON ca.month = cal.month
+           WHERE cal.lead_id = $1 AND ($2::timestamptz IS NULL OR cal.first_at <= $2)
+           ORDER BY cal.month DESC""",
+        lead_id,
+        before_ts,
+    )
+
+
+async def fetch_archived_messages(
+    lead_id: str,
+    limit: int,
+    before: Optional[tuple[datetime, Optional[str]]] = None,
+) -> list[dict]:
+    """Archived messages for a lead, newest first, at most `limit`.
+
+    `before` is a keyset bound (created_at, id); with id None only the timestamp
+    is compared. Leads with nothing archived cost one catalog index lookup.
+    """
+    before_ts = before[0] if before else None
+    out: list[dict] = []
+    for m in await _lead_archive_months(lead_id, before_ts):
+        messages = await _load_lead_month(lead_id, m["month"], m["object_key"], m["byte_offset"], m["byte_length"])
+        for msg in reversed(messages):
+            if before is not None:
+                ts, message_id = before
+                if message_id is None:
+                    if msg["created_at"] >= ts:
+                        continue
+                elif (msg["created_at"], msg["id"]) >= (ts, message_id):
+                    continue
+            out.append(msg)
+            if len(out) >= limit:
+                return out
+    return out
+
+
+async def find_archived_message(lead_id: str, message_id: str) -> Optional[dict]:
+    """Look up a single archived message of a lead by id (used to resolve anchors)."""
+    for m in await _lead_archive_months(lead_id):
+        messages = await _load_lead_month(lead_id, m["month"], m["object_key"], m["byte_offset"], m["byte_length"])
+        for msg in messages:
+            if msg["id"] == message_id:
+                return msg
+    return None
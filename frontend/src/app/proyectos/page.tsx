@@ -15,6 +15,7 @@ import { Dialog, DialogContent, DialogHeader, DialogTitle, DialogFooter } from '
 import { DropdownMenu, DropdownMenuContent, DropdownMenuItem, DropdownMenuSeparator, DropdownMenuTrigger } from '@/components/ui/dropdown-menu';
 import NewProjectModal from '@/components/NewProjectModal';
 import { useAuth } from '@/contexts/AuthContext';
+import { useNotifications } from '@/contexts/NotificationsContext';
 
 const STATUS_CONFIG = {
   active: { label: 'Activo', className: 'bg-emerald-50 text-emerald-700 border-emerald-200' },
@@ -72,6 +73,7 @@ const defaultHasta = () => {
 
 export default function ProyectosPage() {
   const { isReader, role, organizationId, organizationName } = useAuth();
+  const { liveMetrics } = useNotifications();
   const isSuperAdmin = role === 'superadmin';
   const [projects, setProjects] = useState<Project[]>([]);
   const [orgs, setOrgs] = useState<Organization[]>([]);
@@ -121,21 +123,29 @@ export default function ProyectosPage() {
 
   const showingDeleted = statusFilter === 'deleted';
 
+  const loadDashboard = useCallback(() =>
+    api.getDashboard(true)
+      .then((dashboard) => {
+        const metrics: Record<string, Metrics> = {};
+        for (const p of dashboard.projects) {
+          metrics[p.project_id] = {
+            total_leads: p.leads.total,
+            hot: p.leads.hot,
+            warm: p.leads.warm,
+            cold: p.leads.cold,
+          };
+        }
+        setMetricsByProject(metrics);
+      })
+      .catch(() => {}), []);
+
   const loadProjects = useCallback(() => {
     setLoading(true);
     const fetches: Promise<void>[] = [
       api.getProjects(true)
-        .then(async (list) => {
-          setProjects(list);
-          const metrics: Record<string, Metrics> = {};
-          await Promise.all(
-            list.map((p) =>
-              api.getMetrics(p.id).then((m) => { metrics[p.id] = m; }).catch(() => {})
-            )
-          );
-          setMetricsByProject(metrics);
-        })
+        .then(setProjects)
         .catch(() => { toast.error('No se pudo conectar con el backend'); }),
+      loadDashboard(),
     ];
     if (isSuperAdmin) {
       fetches.push(
@@ -143,10 +153,19 @@ export default function ProyectosPage() {
       );
     }
     Promise.all(fetches).finally(() => setLoading(false));
-  }, [isSuperAdmin]);
+  }, [isSuperAdmin, loadDashboard]);
 
   useEffect(() => { loadProjects(); }, [loadProjects]);
 
+  // The `metrics` SSE event signals lead/unit changes: refresh the per-project counters
+  const lastMetricsAt = useRef<string | null>(null);
+  useEffect(() => {
+    if (!liveMetrics) return;
+    const first = lastMetricsAt.current === null;
+    lastMetricsAt.current = liveMetrics.updated_at;
+    if (!first) loadDashboard();
+  }, [liveMetrics, loadDashboard]);
+
   const loadCashFlow = useCallback(async (desde?: string, hasta?: string) => {
     setLoadingCF(true);
     try { setCashFlow(await api.getConsolidatedCashFlow(desde ?? cfDesde, hasta ?? cfHasta)); }
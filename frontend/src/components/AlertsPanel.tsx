@@ -8,6 +8,7 @@ import { Bell, CheckCheck, Info, AlertTriangle, AlertOctagon, X, ChevronRight }
 import { Sheet, SheetContent, SheetHeader, SheetTitle } from '@/components/ui/sheet';
 import { Skeleton } from '@/components/ui/skeleton';
 import Link from 'next/link';
+import { useNotifications } from '@/contexts/NotificationsContext';
 
 function severityIcon(sev: Alert['severidad']) {
   if (sev === 'critical') return <AlertOctagon size={15} className="text-red-500 flex-shrink-0" />;
@@ -42,6 +43,7 @@ function alertLink(alert: Alert): string | null {
 }
 
 export function useAlertCount() {
+  const { liveMetrics } = useNotifications();
   const [count, setCount] = useState(0);
 
   const refresh = useCallback(async () => {
@@ -53,12 +55,15 @@ export function useAlertCount() {
     }
   }, []);
 
+  // Initial count; afterwards the `metrics` SSE event keeps it current
   useEffect(() => {
     refresh();
-    const interval = setInterval(refresh, 60_000);
-    return () => clearInterval(interval);
   }, [refresh]);
 
+  useEffect(() => {
+    if (liveMetrics) setCount(liveMetrics.unread_alerts);
+  }, [liveMetrics]);
+
   return { count, refresh };
 }
 
@@ -4,17 +4,21 @@ import { createContext, useContext, useEffect, useRef, useState } from 'react';
 import { toast } from 'sonner';
 import { api } from '@/lib/api';
 import { useAuth } from '@/contexts/AuthContext';
+import { useSSE, SSEMetricsEvent } from '@/hooks/useSSE';
 
 const SEEN_KEY = 'realia_seen_leads';
 
 interface NotificationsContextValue {
   inboxUnreadCount: number;
   markInboxAsRead: () => void;
+  /** Latest `metrics` SSE snapshot (unread alerts, dashboard counters); null until the stream sends one */
+  liveMetrics: SSEMetricsEvent | null;
 }
 
 const NotificationsContext = createContext<NotificationsContextValue>({
   inboxUnreadCount: 0,
   markInboxAsRead: () => {},
+  liveMetrics: null,
 });
 
 export function useNotifications() {
@@ -24,6 +28,7 @@ export function useNotifications() {
 export function NotificationsProvider({ children }: { children: React.ReactNode }) {
   const { isAuthenticated } = useAuth();
   const [inboxUnreadCount, setInboxUnreadCount] = useState(0);
+  const [liveMetrics, setLiveMetrics] = useState<SSEMetricsEvent | null>(null);
   const seenIds = useRef<Set<string>>(new Set());
   const initialized = useRef(false);
 
@@ -81,12 +86,14 @@ export function NotificationsProvider({ children }: { children: React.ReactNode
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [isAuthenticated]);
 
+  useSSE({ onMetrics: setLiveMetrics, enabled: isAuthenticated });
+
   const markInboxAsRead = () => {
     setInboxUnreadCount(0);
   };
 
   return (
-    <NotificationsContext.Provider value={{ inboxUnreadCount, markInboxAsRead }}>
+    <NotificationsContext.Provider value={{ inboxUnreadCount, markInboxAsRead, liveMetrics }}>
       {children}
     </NotificationsContext.Provider>
   );
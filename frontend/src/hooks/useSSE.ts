@@ -5,7 +5,8 @@
  * Features:
  * - Authenticates via Authorization: Bearer header (token never in URL)
  * - Reconnects automatically with exponential backoff (1s → 2s → 4s → … → 30s)
- * - On reconnect: calls onReconnect() so the caller can refresh stale state
+ * - On reconnect: sends Last-Event-ID so the server replays missed events;
+ *   calls onReconnect() only when the server cannot (`resync` event, or no id yet)
  * - Exposes connection status: "connecting" | "connected" | "disconnected"
  * - Ignores "ping" events (keepalive only)
  * - Cleans up fetch AbortController on unmount
@@ -37,30 +38,44 @@ export interface SSEHandoffUpdateEvent {
   trigger?: string;
 }
 
+export interface SSEMetricsEvent {
+  organization_id: string;
+  leads_by_score: Record<string, number>;
+  units_by_status: Record<string, number>;
+  unread_alerts: number;
+  active_handoffs: number;
+  updated_at: string;
+}
+
 interface UseSSEOptions {
   onMessage?: (data: SSEMessageEvent) => void;
   onHandoffUpdate?: (data: SSEHandoffUpdateEvent) => void;
-  /** Called after a reconnect so the caller can reload any data missed during the gap */
+  /** Live dashboard counters: a snapshot right after connecting, then on every change */
+  onMetrics?: (data: SSEMetricsEvent) => void;
+  /** Called when events were lost (reconnect without replay, or `resync`) so the caller can reload state */
   onReconnect?: () => void;
   enabled?: boolean;
 }
 
-export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true }: UseSSEOptions) {
+export function useSSE({ onMessage, onHandoffUpdate, onMetrics, onReconnect, enabled = true }: UseSSEOptions) {
   const [status, setStatus] = useState<SSEStatus>('connecting');
 
   // Keep latest callbacks in refs so the fetch reader closure never
   // captures stale values (avoids recreating the connection on every render)
   const onMessageRef = useRef(onMessage);
   const onHandoffUpdateRef = useRef(onHandoffUpdate);
+  const onMetricsRef = useRef(onMetrics);
   const onReconnectRef = useRef(onReconnect);
   useEffect(() => { onMessageRef.current = onMessage; }, [onMessage]);
   useEffect(() => { onHandoffUpdateRef.current = onHandoffUpdate; }, [onHandoffUpdate]);
+  useEffect(() => { onMetricsRef.current = onMetrics; }, [onMetrics]);
   useEffect(() => { onReconnectRef.current = onReconnect; }, [onReconnect]);
 
   const retryDelayRef = useRef(1000); // current backoff delay in ms
   const abortRef = useRef<AbortController | null>(null);
   const timeoutRef = useRef<ReturnType<typeof setTimeout> | null>(null);
   const isFirstConnection = useRef(true);
+  const lastEventIdRef = useRef<string | null>(null);
 
   const connect = useCallback(() => {
     // NOTE: sessionStorage clears on tab close. For httpOnly cookie auth (stronger
@@ -78,8 +93,11 @@ export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true
     const controller = new AbortController();
     abortRef.current = controller;
 
+    const headers: Record<string, string> = { Authorization: `Bearer ${token}` };
+    if (lastEventIdRef.current) headers['Last-Event-ID'] = lastEventIdRef.current;
+
     fetch(url, {
-      headers: { Authorization: `Bearer ${token}` },
+      headers,
       signal: controller.signal,
     })
       .then(async (response) => {
@@ -88,7 +106,7 @@ export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true
         }
 
         setStatus('connected');
-        if (!isFirstConnection.current) {
+        if (!isFirstConnection.current && !lastEventIdRef.current) {
           onReconnectRef.current?.();
         }
         isFirstConnection.current = false;
@@ -97,6 +115,9 @@ export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true
         const reader = response.body.getReader();
         const decoder = new TextDecoder();
         let buffer = '';
+        let eventType = 'message';
+        let dataLine = '';
+        let eventId: string | null = null;
 
         while (true) {
           const { done, value } = await reader.read();
@@ -106,23 +127,33 @@ export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true
           const lines = buffer.split('\n');
           buffer = lines.pop() ?? ''; // keep incomplete last line
 
-          let eventType = 'message';
-          let dataLine = '';
-
           for (const line of lines) {
-            if (line.startsWith('event: ')) {
+            if (line.startsWith('id: ')) {
+              eventId = line.slice(4).trim();
+            } else if (line.startsWith('event: ')) {
               eventType = line.slice(7).trim();
             } else if (line.startsWith('data: ')) {
               dataLine = line.slice(6).trim();
             } else if (line === '') {
               // Empty line = event boundary
-              if (dataLine && eventType !== 'ping') {
+              if (eventId) lastEventIdRef.current = eventId;
+              if (eventType === 'resync') {
+                onReconnectRef.current?.();
+              } else if (dataLine && eventType !== 'ping') {
                 try {
                   const parsed = JSON.parse(dataLine);
                   if (eventType === 'message') {
                     onMessageRef.current?.(parsed);
                   } else if (eventType === 'handoff_update') {
-                    onHandoffUpdateRef.current?.(parsed);
+                    // Bulk closes (stale-handoff job) carry lead_ids instead of lead_id
+                    if (Array.isArray(parsed.lead_ids)) {
+                      const { lead_ids, ...rest } = parsed;
+                      for (const lead_id of lead_ids) onHandoffUpdateRef.current?.({ ...rest, lead_id });
+                    } else {
+                      onHandoffUpdateRef.current?.(parsed);
+                    }
+                  } else if (eventType === 'metrics') {
+                    onMetricsRef.current?.(parsed);
                   }
                 } catch {
                   // ignore malformed
@@ -130,6 +161,7 @@ export function useSSE({ onMessage, onHandoffUpdate, onReconnect, enabled = true
               }
               eventType = 'message';
               dataLine = '';
+              eventId = null;
             }
           }
         }
@@ -192,6 +192,43 @@ export interface Metrics {
   cold: number;
 }
 
+export interface DashboardProject {
+  project_id: string;
+  organization_id: string | null;
+  name: string;
+  status: string;
+  delivery_status: string;
+  deleted_at: string | null;
+  leads: { total: number; hot: number; warm: number; cold: number; nuevos_7d: number };
+  units: {
+    total: number;
+    available: number;
+    reserved: number;
+    sold: number;
+    potential_usd: number;
+    reserved_usd: number;
+    sold_usd: number;
+  };
+  budget: {
+    presupuesto_total_usd: number;
+    ejecutado_usd: number;
+    desvio_usd: number;
+    desvio_pct: number;
+    margen_esperado_pct: number;
+  };
+  obra: { progress: number; etapas: number; etapas_completadas: number; ultima_actualizacion: string | null };
+}
+
+export interface Dashboard {
+  projects: DashboardProject[];
+  totals: {
+    projects: number;
+    leads: DashboardProject['leads'];
+    units: DashboardProject['units'];
+    budget: Omit<DashboardProject['budget'], 'margen_esperado_pct'>;
+  };
+}
+
 export interface AuthorizedNumber {
   id: string;
   phone: string;
@@ -756,6 +793,9 @@ export const api = {
 
   getMetrics: (projectId: string) => fetcher<Metrics>(`/admin/metrics/${projectId}`),
 
+  getDashboard: (includeDeleted = false) =>
+    fetcher<Dashboard>(`/admin/dashboard${includeDeleted ? '?include_deleted=true' : ''}`),
+
   getAnalytics: (projectId: string) => fetcher<Analytics>(`/admin/analytics/${projectId}`),
 
   getLeadNotes: (leadId: string) => fetcher<LeadNote[]>(`/admin/leads/${leadId}/notes`),
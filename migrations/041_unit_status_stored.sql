@@ -0,0 +1,24 @@
+-- Migration 041: units.status as the single stored source of truth
+-- Reservation writes (admin reservations router) now keep units.status in sync
+-- inside their transaction, so readers no longer derive it from reservations.
+
+-- 1. Backfill: units with a converted reservation are sold, units with an active
+--    one are reserved. Every other stored status is left alone: units can be
+--    sold/reserved without a reservation row (CSV estado column, bulk status
+--    updates, PATCH status, the developer agent).
+UPDATE units u SET status = CASE
+        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
+        ELSE 'reserved'
+    END
+WHERE EXISTS (
+        SELECT 1 FROM reservations r
+        WHERE r.unit_id = u.id AND r.status IN ('converted', 'active')
+    )
+  AND u.status IS DISTINCT FROM CASE
+        WHEN EXISTS (SELECT 1 FROM reservations r WHERE r.unit_id = u.id AND r.status = 'converted') THEN 'sold'
+        ELSE 'reserved'
+    END;
+
+-- 2. Indexes for status reads and for the per-unit recompute on reservation writes
+CREATE INDEX IF NOT EXISTS idx_units_project_status ON units (project_id, status);
+CREATE INDEX IF NOT EXISTS idx_reservations_unit_status ON reservations (unit_id, status);
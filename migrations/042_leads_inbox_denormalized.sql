@@ -0,0 +1,40 @@
+-- Migration 042: denormalized inbox fields on leads + keyset indexes
+-- GET /admin/leads used a LATERAL over conversations and an EXISTS over handoffs
+-- per lead, sorted by an expression no index could serve. These columns are kept
+-- current by save_conversation_message, the admin reply endpoint and the handoff
+-- manager.
+
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS organization_id      UUID REFERENCES organizations(id) ON DELETE CASCADE;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_message_at      TIMESTAMPTZ;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_message_preview TEXT;
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_message_role    VARCHAR(10);
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS handoff_active       BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Backfill
+UPDATE leads l SET organization_id = p.organization_id
+FROM projects p
+WHERE p.id = l.project_id AND l.organization_id IS DISTINCT FROM p.organization_id;
+
+UPDATE leads l
+SET last_message_at      = lm.created_at,
+    last_message_preview = LEFT(lm.content, 280),
+    last_message_role    = lm.role
+FROM (
+    SELECT DISTINCT ON (lead_id) lead_id, created_at, content, role
+    FROM conversations
+    ORDER BY lead_id, created_at DESC
+) lm
+WHERE lm.lead_id = l.id;
+
+UPDATE leads l SET handoff_active = TRUE
+WHERE EXISTS (SELECT 1 FROM handoffs h WHERE h.lead_id = l.id AND h.status = 'active');
+
+-- Keyset pagination: (sort key, id) per org and per project
+CREATE INDEX IF NOT EXISTS idx_leads_inbox_org
+    ON leads (organization_id, (COALESCE(last_message_at, last_contact, created_at)) DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS idx_leads_inbox_project
+    ON leads (project_id, (COALESCE(last_message_at, last_contact, created_at)) DESC NULLS LAST, id DESC);
+
+-- Filters
+CREATE INDEX IF NOT EXISTS idx_leads_handoff_active ON leads (organization_id) WHERE handoff_active;
+CREATE INDEX IF NOT EXISTS idx_leads_tags ON leads USING GIN (tags);
@@ -0,0 +1,121 @@
+-- Migration 043: range-partition conversations by month + archive catalog
+-- conversations only grows and every inbox/history/stale-handoff query scanned a
+-- single heap. Monthly partitions keep the hot months small, and old months are
+-- exported to object storage (gzip JSONL) and detached by
+-- POST /admin/jobs/archive-conversations (app/services/conversation_archive.py).
+--
+-- Notes:
+--   * PK becomes (id, created_at): a partitioned table's unique constraints must
+--     include the partition key.
+--   * wa_message_id loses its UNIQUE constraint for the same reason. Inbound
+--     dedup already happens in processed_messages before anything is saved.
+--   * Partitions are named conversations_pYYYYMM; the archive job relies on it.
+
+BEGIN;
+
+ALTER TABLE conversations RENAME TO conversations_unpartitioned;
+ALTER INDEX IF EXISTS idx_conversations_lead RENAME TO idx_conversations_unpartitioned_lead;
+ALTER INDEX IF EXISTS idx_conversations_wa_msg RENAME TO idx_conversations_unpartitioned_wa_msg;
+
+CREATE TABLE conversations (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    lead_id UUID REFERENCES leads(id),
+    wa_message_id TEXT,
+    role VARCHAR(10),
+    sender_type VARCHAR(10) DEFAULT 'agent',
+    sender_id UUID,
+    handoff_id UUID,
+    content TEXT,
+    media_type VARCHAR(20),
+    media_url TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE INDEX idx_conversations_lead ON conversations(lead_id, created_at);
+CREATE INDEX idx_conversations_wa_msg ON conversations(wa_message_id);
+
+-- Creates the partition for the month containing p_month (no-op if it exists).
+CREATE OR REPLACE FUNCTION create_conversations_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::date;
+    v_name  TEXT := 'conversations_p' || to_char(v_start, 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF conversations FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_start, (v_start + INTERVAL '1 month')::date
+        );
+    END IF;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Makes sure the current month and the next p_ahead months have a partition.
+CREATE OR REPLACE FUNCTION ensure_conversations_partitions(p_ahead INT DEFAULT 2)
+RETURNS INT AS $$
+DECLARE
+    i INT;
+BEGIN
+    FOR i IN 0..p_ahead LOOP
+        PERFORM create_conversations_partition((date_trunc('month', NOW()) + make_interval(months => i))::date);
+    END LOOP;
+    RETURN p_ahead + 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Safety net for rows outside any monthly range (e.g. clock skew, missed job).
+CREATE TABLE conversations_default PARTITION OF conversations DEFAULT;
+
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    FOR v_month IN
+        SELECT g::date
+        FROM generate_series(
+            (SELECT date_trunc('month', COALESCE(MIN(created_at), NOW())) FROM conversations_unpartitioned),
+            date_trunc('month', NOW()),
+            INTERVAL '1 month'
+        ) AS g
+    LOOP
+        PERFORM create_conversations_partition(v_month);
+    END LOOP;
+END $$;
+
+SELECT ensure_conversations_partitions(2);
+
+INSERT INTO conversations
+    (id, lead_id, wa_message_id, role, sender_type, sender_id, handoff_id,
+     content, media_type, media_url, created_at)
+SELECT id, lead_id, wa_message_id, role, sender_type, sender_id, handoff_id,
+       content, media_type, media_url, COALESCE(created_at, NOW())
+FROM conversations_unpartitioned;
+
+DROP TABLE conversations_unpartitioned;
+
+-- Archive catalog: one row per exported month, one row per (lead, month) with the
+-- byte range of that lead's gzip member inside the month object, so the transcript
+-- API can range-GET a single lead's history without downloading the whole month.
+CREATE TABLE IF NOT EXISTS conversation_archives (
+    month       DATE PRIMARY KEY,
+    object_key  TEXT NOT NULL,
+    format      VARCHAR(20) NOT NULL DEFAULT 'jsonl.gz',
+    row_count   INT NOT NULL DEFAULT 0,
+    byte_size   BIGINT NOT NULL DEFAULT 0,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS conversation_archive_leads (
+    lead_id       UUID NOT NULL,
+    month         DATE NOT NULL REFERENCES conversation_archives(month) ON DELETE CASCADE,
+    message_count INT NOT NULL,
+    first_at      TIMESTAMPTZ NOT NULL,
+    last_at       TIMESTAMPTZ NOT NULL,
+    byte_offset   BIGINT NOT NULL,
+    byte_length   BIGINT NOT NULL,
+    PRIMARY KEY (lead_id, month)
+);
+
+COMMIT;
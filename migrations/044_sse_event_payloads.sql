@@ -0,0 +1,15 @@
+-- Migration 044: overflow storage for the Postgres SSE broker
+-- NOTIFY payloads must stay under 8000 bytes. Larger inbox events are written
+-- here and only their id travels over the realia_sse channel; listeners fetch
+-- the row. Rows are short-lived: the broker deletes anything older than
+-- 10 minutes as it publishes.
+
+CREATE TABLE IF NOT EXISTS sse_event_payloads (
+    id         BIGSERIAL PRIMARY KEY,
+    tenant_id  TEXT NOT NULL,
+    event      TEXT NOT NULL,
+    data       JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_sse_event_payloads_created ON sse_event_payloads(created_at);
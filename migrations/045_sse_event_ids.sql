@@ -0,0 +1,7 @@
+-- Migration 045: shared SSE event ids
+-- With SSE_BROKER=postgres every worker must agree on an event's id so that a
+-- client reconnecting with Last-Event-ID to a different worker resumes from the
+-- right place. The publishing worker takes the id from this sequence in the
+-- same statement that sends the NOTIFY.
+
+CREATE SEQUENCE IF NOT EXISTS sse_event_seq;
@@ -0,0 +1,6 @@
+-- Migration 046: partial indexes for unread alert counts
+-- The live dashboard counters (app/core/live_metrics.py) recount unread alerts
+-- per organization on every alert write; these keep that an index-only lookup.
+
+CREATE INDEX IF NOT EXISTS idx_project_alerts_unread_project ON project_alerts (project_id) WHERE leida = FALSE;
+CREATE INDEX IF NOT EXISTS idx_project_alerts_unread_org ON project_alerts (organization_id) WHERE leida = FALSE;
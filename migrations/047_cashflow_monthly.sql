@@ -0,0 +1,75 @@
+-- Migration 047: materialized monthly cash flow per project
+-- /cash-flow and /cash-flow-consolidated re-aggregated every payment_record,
+-- factura and installment on each request, filtering with to_char(fecha, 'YYYY-MM')
+-- so no date index could be used. cashflow_monthly keeps one row per
+-- (project, month) and is refreshed by the write paths that touch those tables
+-- (app/services/cashflow_rollup.py); POST /admin/jobs/rebuild-cashflow recomputes
+-- it from scratch.
+--
+-- Amounts are stored per currency, not converted: the ARS → USD rate lives in
+-- project_financials_config and can change at any time, so it is applied when
+-- reading. proyeccion holds every pendiente/vencido installment of the month;
+-- the "from today on" cut is also applied when reading.
+
+CREATE TABLE IF NOT EXISTS cashflow_monthly (
+    project_id     UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    month          DATE NOT NULL,           -- first day of the month
+    ingresos_usd   NUMERIC(16,2) NOT NULL DEFAULT 0,
+    ingresos_ars   NUMERIC(16,2) NOT NULL DEFAULT 0,
+    n_ingresos     INT NOT NULL DEFAULT 0,
+    egresos_usd    NUMERIC(16,2) NOT NULL DEFAULT 0,
+    egresos_ars    NUMERIC(16,2) NOT NULL DEFAULT 0,
+    n_egresos      INT NOT NULL DEFAULT 0,
+    proyeccion_usd NUMERIC(16,2) NOT NULL DEFAULT 0,
+    proyeccion_ars NUMERIC(16,2) NOT NULL DEFAULT 0,
+    n_proyeccion   INT NOT NULL DEFAULT 0,
+    updated_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_id, month)
+);
+
+-- Range predicates used by the bucket refresh
+CREATE INDEX IF NOT EXISTS idx_payment_records_fecha_pago
+    ON payment_records (fecha_pago) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_facturas_egreso_project_fecha
+    ON facturas (project_id, fecha_emision) WHERE categoria = 'egreso' AND deleted_at IS NULL;
+
+-- Backfill (same aggregation as cashflow_rollup.rebuild)
+INSERT INTO cashflow_monthly
+    (project_id, month, ingresos_usd, ingresos_ars, n_ingresos,
+     egresos_usd, egresos_ars, n_egresos, proyeccion_usd, proyeccion_ars, n_proyeccion)
+SELECT project_id, month,
+       SUM(ingresos_usd), SUM(ingresos_ars), SUM(n_ingresos),
+       SUM(egresos_usd), SUM(egresos_ars), SUM(n_egresos),
+       SUM(proyeccion_usd), SUM(proyeccion_ars), SUM(n_proyeccion)
+FROM (
+    SELECT r.project_id, date_trunc('month', pr.fecha_pago)::date AS month,
+           CASE WHEN pr.moneda = 'USD' THEN pr.monto_pagado ELSE 0 END AS ingresos_usd,
+           CASE WHEN pr.moneda = 'USD' THEN 0 ELSE pr.monto_pagado END AS ingresos_ars,
+           1 AS n_ingresos, 0 AS egresos_usd, 0 AS egresos_ars, 0 AS n_egresos,
+           0 AS proyeccion_usd, 0 AS proyeccion_ars, 0 AS n_proyeccion
+    FROM payment_records pr
+    JOIN payment_installments pi ON pi.id = pr.installment_id
+    JOIN payment_plans pp ON pp.id = pi.plan_id
+    JOIN reservations r ON r.id = pp.reservation_id
+    WHERE pr.deleted_at IS NULL
+    UNION ALL
+    SELECT f.project_id, date_trunc('month', f.fecha_emision)::date,
+           0, 0, 0,
+           CASE WHEN f.moneda = 'USD' THEN f.monto_total ELSE COALESCE(f.monto_usd, 0) END,
+           CASE WHEN f.moneda = 'USD' OR f.monto_usd IS NOT NULL THEN 0 ELSE f.monto_total END,
+           1, 0, 0, 0
+    FROM facturas f
+    WHERE f.categoria = 'egreso' AND f.deleted_at IS NULL
+    UNION ALL
+    SELECT r.project_id, date_trunc('month', pi.fecha_vencimiento)::date,
+           0, 0, 0, 0, 0, 0,
+           CASE WHEN pi.moneda = 'USD' THEN pi.monto ELSE 0 END,
+           CASE WHEN pi.moneda = 'USD' THEN 0 ELSE pi.monto END,
+           1
+    FROM payment_installments pi
+    JOIN payment_plans pp ON pp.id = pi.plan_id
+    JOIN reservations r ON r.id = pp.reservation_id
+    WHERE pi.estado IN ('pendiente', 'vencido')
+) src
+GROUP BY project_id, month
+ON CONFLICT (project_id, month) DO NOTHING;
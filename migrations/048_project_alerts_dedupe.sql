@@ -0,0 +1,29 @@
+-- Migration 048: dedupe key for project_alerts
+-- The alerts engine (app/services/alerts_service.py) used to look up
+-- metadata->>'resource_id' (unindexed) before every insert. Each rule is now a
+-- single INSERT ... SELECT ... ON CONFLICT DO NOTHING, and these unique indexes
+-- are what make a condition alert at most once per resource and (UTC) day.
+
+ALTER TABLE project_alerts
+    ADD COLUMN IF NOT EXISTS resource_id TEXT
+        GENERATED ALWAYS AS (metadata->>'resource_id') STORED,
+    ADD COLUMN IF NOT EXISTS alert_day DATE
+        GENERATED ALWAYS AS ((created_at AT TIME ZONE 'UTC')::date) STORED;
+
+-- Drop same-day duplicates left by the old check-then-insert race (keep the first).
+DELETE FROM project_alerts a
+USING project_alerts b
+WHERE a.tipo = b.tipo
+  AND a.resource_id = b.resource_id
+  AND a.alert_day = b.alert_day
+  AND a.project_id IS NOT DISTINCT FROM b.project_id
+  AND a.organization_id IS NOT DISTINCT FROM b.organization_id
+  AND (a.created_at, a.id) > (b.created_at, b.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_project_alerts_project_dedupe
+    ON project_alerts (project_id, tipo, resource_id, alert_day)
+    WHERE project_id IS NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_project_alerts_org_dedupe
+    ON project_alerts (organization_id, tipo, resource_id, alert_day)
+    WHERE project_id IS NULL;
@@ -0,0 +1,21 @@
+-- Migration 049: run history of the in-process job scheduler
+-- Periodic jobs used to be triggered from outside (a Railway function that logged
+-- in to call /admin/jobs/alerts, Render curl crons). They now run inside the app
+-- (app/core/scheduler.py): every worker follows the same cron schedule, and the
+-- unique (job_name, scheduled_for) key makes exactly one of them claim each firing.
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    id            BIGSERIAL PRIMARY KEY,
+    job_name      TEXT NOT NULL,
+    scheduled_for TIMESTAMPTZ NOT NULL,
+    worker_id     TEXT NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'running',   -- running | ok | error
+    started_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at   TIMESTAMPTZ,
+    duration_ms   INT,
+    result        JSONB,
+    error         TEXT,
+    UNIQUE (job_name, scheduled_for)
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_runs_started ON job_runs (started_at DESC);
@@ -0,0 +1,23 @@
+-- Migration 050: last inbound message time per lead, and an index on active handoffs
+-- Closing stale handoffs needed the latest role='user' conversation of every lead
+-- in an active handoff (a correlated MAX(created_at) per handoff, also repeated
+-- inline for every inbound message during a handoff). save_conversation_message
+-- now keeps leads.last_user_message_at current in the same statement as the insert,
+-- so both checks read it directly.
+
+ALTER TABLE leads ADD COLUMN IF NOT EXISTS last_user_message_at TIMESTAMPTZ;
+
+UPDATE leads l
+SET last_user_message_at = m.last_at
+FROM (
+    SELECT lead_id, MAX(created_at) AS last_at
+    FROM conversations
+    WHERE role = 'user'
+    GROUP BY lead_id
+) m
+WHERE l.id = m.lead_id;
+
+-- Active handoffs are well under 1% of rows; the stale-handoff job and the
+-- active-handoff lookups only ever read those.
+CREATE INDEX IF NOT EXISTS idx_handoffs_active
+    ON handoffs (started_at) WHERE status = 'active';
@@ -0,0 +1,15 @@
+-- Migration 051: index for the lead agent's unit search
+-- The lead prompt used to list every available unit of every project on each
+-- turn. It now carries a per-project summary and the agent calls the
+-- buscar_unidades tool (app/modules/agent/unit_search.py), which filters the
+-- available units of the organization's projects by bedrooms, price, floor and
+-- area, cheapest first. Lookups of one unit by identifier (any status) use
+-- idx_units_project_identifier.
+
+CREATE INDEX IF NOT EXISTS idx_units_available_search
+    ON units (project_id, bedrooms, price_usd)
+    INCLUDE (identifier, floor, area_m2)
+    WHERE status = 'available';
+
+CREATE INDEX IF NOT EXISTS idx_units_project_identifier
+    ON units (project_id, upper(identifier));
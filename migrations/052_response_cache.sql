@@ -0,0 +1,96 @@
+-- Migration 052: opt-in per-organization cache of lead agent answers
+-- Leads keep asking the same questions ("¿tienen cochera?", "¿cuándo entregan?");
+-- an organization can let the agent reuse an earlier answer instead of a new
+-- Claude call. Entries are keyed by the organization's context version, which
+-- triggers bump (and clear the cache) on any change to units, projects,
+-- documents or the agent config, so an answer never outlives the data it was
+-- generated from.
+
+ALTER TABLE agent_configs
+    ADD COLUMN IF NOT EXISTS response_cache TEXT NOT NULL DEFAULT 'off'
+        CHECK (response_cache IN ('off', 'exact', 'semantic'));
+
+CREATE TABLE IF NOT EXISTS org_context_versions (
+    organization_id UUID        PRIMARY KEY REFERENCES organizations(id) ON DELETE CASCADE,
+    version         BIGINT      NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    id              UUID        PRIMARY KEY DEFAULT gen_random_uuid(),
+    organization_id UUID        NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    context_version BIGINT      NOT NULL,
+    question_norm   TEXT        NOT NULL,
+    question        TEXT        NOT NULL,
+    answer          TEXT        NOT NULL,
+    embedding       REAL[],                 -- only in 'semantic' mode
+    generation_ms   INT         NOT NULL,   -- what a hit saves
+    hits            INT         NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_hit_at     TIMESTAMPTZ,
+    UNIQUE (organization_id, context_version, question_norm)
+);
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache (created_at);
+
+CREATE TABLE IF NOT EXISTS response_cache_stats (
+    organization_id UUID   NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    day             DATE   NOT NULL,
+    lookups         INT    NOT NULL DEFAULT 0,
+    hits            INT    NOT NULL DEFAULT 0,
+    bypassed        INT    NOT NULL DEFAULT 0,   -- turns not eligible (first contact, personal data, ...)
+    saved_ms        BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (organization_id, day)
+);
+
+CREATE OR REPLACE FUNCTION bump_org_context_version(org UUID) RETURNS void AS $$
+BEGIN
+    IF org IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO org_context_versions (organization_id, version)
+    VALUES (org, 1)
+    ON CONFLICT (organization_id) DO UPDATE
+        SET version = org_context_versions.version + 1, updated_at = NOW();
+    DELETE FROM response_cache WHERE organization_id = org;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION trg_org_context_changed() RETURNS trigger AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+    IF TG_TABLE_NAME IN ('projects', 'agent_configs') THEN
+        PERFORM bump_org_context_version(r.organization_id);
+    ELSE
+        PERFORM bump_org_context_version(p.organization_id)
+        FROM projects p WHERE p.id = r.project_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS org_context_units ON units;
+CREATE TRIGGER org_context_units
+    AFTER INSERT OR UPDATE OR DELETE ON units
+    FOR EACH ROW EXECUTE FUNCTION trg_org_context_changed();
+
+DROP TRIGGER IF EXISTS org_context_documents ON documents;
+CREATE TRIGGER org_context_documents
+    AFTER INSERT OR UPDATE OR DELETE ON documents
+    FOR EACH ROW EXECUTE FUNCTION trg_org_context_changed();
+
+DROP TRIGGER IF EXISTS org_context_projects ON projects;
+CREATE TRIGGER org_context_projects
+    AFTER INSERT OR UPDATE OR DELETE ON projects
+    FOR EACH ROW EXECUTE FUNCTION trg_org_context_changed();
+
+DROP TRIGGER IF EXISTS org_context_agent_configs ON agent_configs;
+CREATE TRIGGER org_context_agent_configs
+    AFTER INSERT OR UPDATE OR DELETE ON agent_configs
+    FOR EACH ROW EXECUTE FUNCTION trg_org_context_changed();
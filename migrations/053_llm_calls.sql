@@ -0,0 +1,26 @@
+-- Migration 053: ledger of LLM calls (app/core/llm_ledger.py)
+-- One row per Claude request: who it was for, why, which model, tokens (including
+-- prompt-cache reads/writes), latency and tool calls. Written in batches by the
+-- backend; aggregated per organization and day by GET /admin/llm-usage.
+-- No foreign keys: rows are appended in bulk and must survive lead/org deletion
+-- for accounting.
+
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id                 BIGSERIAL   PRIMARY KEY,
+    created_at         TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    organization_id    UUID,
+    lead_id            UUID,
+    purpose            TEXT        NOT NULL,   -- reply | extraction | dev | obra_extraction
+    model              TEXT        NOT NULL,
+    input_tokens       INT         NOT NULL DEFAULT 0,
+    output_tokens      INT         NOT NULL DEFAULT 0,
+    cache_read_tokens  INT         NOT NULL DEFAULT 0,
+    cache_write_tokens INT         NOT NULL DEFAULT 0,
+    latency_ms         INT         NOT NULL,
+    tool_calls         TEXT[]      NOT NULL DEFAULT '{}',
+    status             TEXT        NOT NULL DEFAULT 'ok' CHECK (status IN ('ok', 'error')),
+    error              TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_calls_org_created ON llm_calls (organization_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_created ON llm_calls (created_at);
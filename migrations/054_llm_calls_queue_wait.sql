@@ -0,0 +1,4 @@
+-- Migration 054: time each LLM call spent waiting in the rate limiter
+-- (app/core/llm_limiter.py) before being sent, next to its latency.
+
+ALTER TABLE llm_calls ADD COLUMN IF NOT EXISTS queue_wait_ms INT NOT NULL DEFAULT 0;
@@ -0,0 +1,10 @@
+-- Migration 055: per-organization degraded mode for the lead agent (app/core/overload.py)
+-- degradation: 'auto' follows the backend's overload detection, 'off' never
+-- degrades this organization, 'forced' always answers with the acknowledgement
+-- and a deferred reply (maintenance, incidents).
+-- degraded_ack: acknowledgement sent while degraded; NULL = built-in text.
+
+ALTER TABLE agent_configs
+    ADD COLUMN IF NOT EXISTS degradation TEXT NOT NULL DEFAULT 'auto'
+        CHECK (degradation IN ('auto', 'off', 'forced')),
+    ADD COLUMN IF NOT EXISTS degraded_ack TEXT;
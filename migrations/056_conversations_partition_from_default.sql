@@ -0,0 +1,45 @@
+-- Migration 056: create conversation partitions even when DEFAULT holds their rows
+-- conversations_default (migration 043) catches rows outside every monthly
+-- range. Once it holds a row for a month, CREATE TABLE ... PARTITION OF ... FOR
+-- VALUES for that month fails, because Postgres refuses to leave matching rows
+-- in the default partition. The month's partition is now built detached, the
+-- rows are moved out of DEFAULT into it, and it is attached afterwards, all in
+-- the caller's transaction.
+
+CREATE OR REPLACE FUNCTION create_conversations_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::date;
+    v_end   DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::date;
+    v_name  TEXT := 'conversations_p' || to_char(v_start, 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM conversations_default WHERE created_at >= v_start AND created_at < v_end
+    ) THEN
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF conversations FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_start, v_end
+        );
+        RETURN v_name;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE conversations INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    EXECUTE format(
+        'WITH moved AS (
+             DELETE FROM conversations_default WHERE created_at >= %L AND created_at < %L RETURNING *
+         )
+         INSERT INTO %I SELECT * FROM moved',
+        v_start, v_end, v_name
+    );
+    EXECUTE format(
+        'ALTER TABLE conversations ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        v_name, v_start, v_end
+    );
+    RAISE NOTICE 'Moved rows of % out of conversations_default into %', to_char(v_start, 'YYYY-MM'), v_name;
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
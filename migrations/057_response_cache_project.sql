@@ -0,0 +1,25 @@
+-- Migration 057: key the lead agent's response cache by project
+-- The same question has a different answer on each project of an organization
+-- ("¿cuándo entregan?"), so entries now belong to the lead's project as well.
+-- Existing entries have no project and are dropped (they are a cache).
+
+DELETE FROM response_cache;
+
+ALTER TABLE response_cache
+    ADD COLUMN IF NOT EXISTS project_id UUID NOT NULL REFERENCES projects(id) ON DELETE CASCADE;
+
+DO $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    FOR v_name IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'response_cache'::regclass AND contype = 'u'
+    LOOP
+        EXECUTE format('ALTER TABLE response_cache DROP CONSTRAINT %I', v_name);
+    END LOOP;
+END $$;
+
+ALTER TABLE response_cache
+    ADD CONSTRAINT response_cache_question_key
+        UNIQUE (organization_id, context_version, project_id, question_norm);
@@ -0,0 +1,73 @@
+-- Migration 058: bump the organization context version once per statement
+-- The row-level triggers of migration 052 ran bump_org_context_version for every
+-- changed row: a bulk status update or a CSV load of N units did N upserts of the
+-- organization's org_context_versions row and N cache deletes, and held that
+-- row's lock across the whole statement for every concurrent unit write of the
+-- organization. Statement-level triggers with transition tables bump each
+-- affected organization once. Postgres only allows transition tables on
+-- single-event triggers, hence one trigger per event.
+
+CREATE OR REPLACE FUNCTION trg_org_context_changed_stmt() RETURNS trigger AS $$
+DECLARE
+    v_orgs     UUID[];
+    v_projects UUID[];
+    v_more_orgs     UUID[];
+    v_more_projects UUID[];
+    v_org      UUID;
+BEGIN
+    -- Rows carry organization_id (projects, agent_configs) or project_id
+    -- (units, documents); to_jsonb reads either without naming the column.
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT array_agg(DISTINCT (to_jsonb(n) ->> 'organization_id')::uuid),
+               array_agg(DISTINCT (to_jsonb(n) ->> 'project_id')::uuid)
+        INTO v_orgs, v_projects
+        FROM new_rows n;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT array_agg(DISTINCT (to_jsonb(o) ->> 'organization_id')::uuid),
+               array_agg(DISTINCT (to_jsonb(o) ->> 'project_id')::uuid)
+        INTO v_more_orgs, v_more_projects
+        FROM old_rows o;
+        v_orgs := array_cat(v_orgs, v_more_orgs);
+        v_projects := array_cat(v_projects, v_more_projects);
+    END IF;
+
+    FOR v_org IN
+        SELECT org FROM unnest(v_orgs) AS org WHERE org IS NOT NULL
+        UNION
+        SELECT p.organization_id FROM projects p WHERE p.id = ANY (v_projects)
+    LOOP
+        PERFORM bump_org_context_version(v_org);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_table TEXT;
+BEGIN
+    FOREACH v_table IN ARRAY ARRAY['units', 'documents', 'projects', 'agent_configs'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'org_context_' || v_table, v_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'org_context_' || v_table || '_ins', v_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'org_context_' || v_table || '_upd', v_table);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'org_context_' || v_table || '_del', v_table);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION trg_org_context_changed_stmt()',
+            'org_context_' || v_table || '_ins', v_table
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION trg_org_context_changed_stmt()',
+            'org_context_' || v_table || '_upd', v_table
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows
+             FOR EACH STATEMENT EXECUTE FUNCTION trg_org_context_changed_stmt()',
+            'org_context_' || v_table || '_del', v_table
+        );
+    END LOOP;
+END $$;
+
+DROP FUNCTION IF EXISTS trg_org_context_changed();
@@ -0,0 +1,20 @@
+-- Migration 059: persist the lead agent's pending deferred answers
+-- In degraded mode (app/core/overload.py) the lead is told an answer is coming
+-- and it is generated later in the background. The pending state used to live
+-- only in the worker's memory, so a deploy or restart dropped it and two
+-- workers could answer the same lead twice. Now the lead row records it:
+--   deferred_reply_since    latest acknowledged message still waiting for an answer
+--   deferred_channel_id     tenant_channels.id to answer through (TEXT: the local
+--                           dev channel has no row)
+--   deferred_claimed_until  lease of the worker answering it
+--   deferred_claimed_by     that worker (JobScheduler.worker_id)
+-- The answer-deferred-replies job picks up leads whose lease expired.
+
+ALTER TABLE leads
+    ADD COLUMN IF NOT EXISTS deferred_reply_since   TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS deferred_channel_id    TEXT,
+    ADD COLUMN IF NOT EXISTS deferred_claimed_until TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS deferred_claimed_by    TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_leads_deferred_reply
+    ON leads (deferred_reply_since) WHERE deferred_reply_since IS NOT NULL;
@@ -171,3 +171,31 @@ class TestRoutesExist:
         r = client.request(method, path)
         assert r.status_code != 404, f"{method} {path} returned 404 — route not registered"
         assert r.status_code != 500, f"{method} {path} returned 500 — server error"
+
+
+# ---------------------------------------------------------------------------
+# Bulk unit status: malformed input is a 400 / per-item error, never a 500
+# ---------------------------------------------------------------------------
+
+class TestBulkUnitStatusValidation:
+    @pytest.fixture(autouse=True)
+    def _no_db(self):
+        with patch("app.admin.routers.projects.get_pool", AsyncMock(return_value=AsyncMock())):
+            yield
+
+    @pytest.mark.parametrize("body", [[], {"units": "3f1c2a4e"}])
+    def test_wrong_body_type_returns_400(self, client, body):
+        r = client.patch("/admin/units/bulk-status", json=body)
+        assert r.status_code == 400
+
+    def test_invalid_items_get_per_item_errors(self, client):
+        uid = "3f1c2a4e-0000-4000-8000-000000000000"
+        r = client.patch("/admin/units/bulk-status", json={"units": [
+            "not-an-object",
+            {"id": uid, "price_usd": "NaN"},
+            {"id": uid, "price_usd": "Infinity"},
+            {"id": uid, "status": ["sold"]},
+        ]})
+        assert r.status_code == 200
+        errors = [item["error"] for item in r.json()["updated"]]
+        assert errors == ["item must be an object", "Invalid price_usd", "Invalid price_usd", "Invalid status"]
@@ -0,0 +1,126 @@
+"""
+Circuit breaker tests (no network).
+
+Validates that:
+1. the breaker opens once the failure rate passes the threshold, and fails fast
+2. after the open period a single probe goes through and closes it on success
+3. a failed probe reopens it for longer
+4. 4xx answers do not count as failures
+5. sends hitting an open channel are parked and delivered in order once it closes
+6. a provider answering 5xx counts as a failure of its channel
+
+Run: pytest tests/test_circuit_breaker.py -v
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.circuit_breaker import BreakerPolicy, CircuitBreaker, CircuitOpenError, is_failure
+from app.modules.whatsapp.outbound import GuardedProvider, OutboundQueue
+from app.modules.whatsapp.providers.base import TenantChannel
+from app.modules.whatsapp.providers.factory import TwilioProvider
+
+POLICY = BreakerPolicy(timeout=1.0, min_calls=2, failure_rate=0.5, open_seconds=0.05)
+
+
+async def _fail():
+    raise ConnectionError("down")
+
+
+async def _ok():
+    return "ok"
+
+
+def test_opens_and_fails_fast():
+    async def run():
+        breaker = CircuitBreaker("test", POLICY)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await breaker.call(_fail)
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(_ok)
+        return breaker
+    breaker = asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.rejected == 1
+
+
+def test_half_open_probe_closes():
+    async def run():
+        breaker = CircuitBreaker("test", POLICY)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await breaker.call(_fail)
+        await asyncio.sleep(0.06)
+        assert breaker.allow()  # the probe
+        assert not breaker.allow()  # only one at a time
+        breaker.record(True)
+        return breaker.state
+    assert asyncio.run(run()) == "closed"
+
+
+def test_failed_probe_reopens_longer():
+    async def run():
+        breaker = CircuitBreaker("test", POLICY)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await breaker.call(_fail)
+        await asyncio.sleep(0.06)
+        with pytest.raises(ConnectionError):
+            await breaker.call(_fail)
+        return breaker
+    breaker = asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.retry_in() > POLICY.open_seconds
+
+
+def test_client_errors_are_not_failures():
+    assert not is_failure(SimpleNamespace(status_code=404))
+    assert is_failure(SimpleNamespace(status_code=503))
+    assert is_failure(TimeoutError())
+
+
+def test_parked_sends_delivered_in_order():
+    async def run():
+        breaker = CircuitBreaker("meta:test", POLICY)
+        breaker.record(False)
+        breaker.record(False)  # open
+        queue = OutboundQueue(breaker)
+        sent = []
+
+        def send(text):
+            async def _send():
+                sent.append(text)
+            return _send
+
+        first = await queue.send("send_text", send("uno"))
+        await queue.send("send_text", send("dos"))
+        await asyncio.wait_for(queue._drainer, timeout=5)
+        return first, sent, breaker.state
+    first, sent, state = asyncio.run(run())
+    assert first["status"] == "queued"
+    assert sent == ["uno", "dos"]
+    assert state == "closed"
+
+
+def test_provider_5xx_is_a_channel_failure():
+    transport = httpx.MockTransport(lambda request: httpx.Response(503, json={"message": "unavailable"}))
+    real_client = httpx.AsyncClient
+    channel = TenantChannel(
+        id="test-503", organization_id="org", provider="twilio", phone_number="+14155238886",
+        account_sid="AC1", auth_token="secret",
+    )
+
+    async def run():
+        provider = GuardedProvider(TwilioProvider(channel), channel)
+        with patch("httpx.AsyncClient", lambda **kw: real_client(transport=transport, **kw)):
+            with pytest.raises(httpx.HTTPStatusError):
+                await provider.send_text("5491100000000", "hola")
+        return provider._queue.breaker.snapshot()
+
+    snapshot = asyncio.run(run())
+    assert snapshot["window_calls"] == 1
+    assert snapshot["window_failures"] == 1
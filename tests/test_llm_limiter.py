@@ -0,0 +1,83 @@
+"""
+Anthropic rate limiter tests (no API calls).
+
+Validates that:
+1. calls within budget go through without queueing
+2. queued live replies are served before queued background work
+3. one organization over its budget does not hold up another
+4. background work leaves the reserve to live replies
+
+Run: pytest tests/test_llm_limiter.py -v
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.core.llm_limiter import LLMRateLimiter, estimate_request_tokens
+
+
+def _limiter(global_rpm=0, org_rpm=0, reserve=0.0):
+    settings = SimpleNamespace(
+        llm_global_rpm=global_rpm, llm_global_input_tpm=0,
+        llm_org_rpm=org_rpm, llm_org_input_tpm=0, llm_background_reserve=reserve,
+    )
+    with patch("app.core.llm_limiter.get_settings", return_value=settings):
+        limiter = LLMRateLimiter()
+        limiter._configure()
+    return limiter
+
+
+def test_within_budget_no_wait():
+    async def run():
+        limiter = _limiter(global_rpm=60)
+        return [await limiter.acquire("org-a", 100, "reply") for _ in range(3)]
+    assert asyncio.run(run()) == [0.0, 0.0, 0.0]
+
+
+def test_live_served_before_background():
+    async def run():
+        limiter = _limiter(global_rpm=600)
+        limiter._global[0].level = 0  # exhausted: everything queues, one slot per 0.1 s
+        order = []
+
+        async def call(name, purpose):
+            await limiter.acquire("org-a", 10, purpose)
+            order.append(name)
+
+        background = asyncio.create_task(call("extraction", "extraction"))
+        await asyncio.sleep(0)
+        live = asyncio.create_task(call("reply", "reply"))
+        await asyncio.gather(background, live)
+        return order
+    assert asyncio.run(run()) == ["reply", "extraction"]
+
+
+def test_org_over_budget_does_not_block_others():
+    async def run():
+        limiter = _limiter(org_rpm=60)
+        await limiter.acquire("org-a", 10, "reply")
+        limiter._org("org-a")[0].level = -100  # org-a is far over its budget
+        blocked = asyncio.create_task(limiter.acquire("org-a", 10, "reply"))
+        await asyncio.sleep(0)
+        waited = await asyncio.wait_for(limiter.acquire("org-b", 10, "reply"), timeout=1)
+        blocked.cancel()
+        await asyncio.sleep(0)
+        return waited, limiter.queue_depth()
+    waited, depth = asyncio.run(run())
+    assert waited < 0.5
+    assert depth == 0
+
+
+def test_background_keeps_reserve():
+    limiter = _limiter(global_rpm=60, reserve=0.5)
+    limiter._global[0].level = 20
+    assert limiter._global[0].wait_time(1, limiter._global[0]._updated, reserve=0.5) > 0
+    assert limiter._global[0].wait_time(1, limiter._global[0]._updated) == 0
+
+
+def test_estimate_request_tokens():
+    tokens = estimate_request_tokens("x" * 350, [
+        {"role": "user", "content": "y" * 35},
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "z" * 70}]},
+    ])
+    assert tokens == 100 + 10 + 20
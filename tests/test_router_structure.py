@@ -2,12 +2,13 @@
 Structural tests for the api.py split refactor.
 
 These tests validate that:
-- All 12 domain routers import without errors
+- All 13 domain routers import without errors
 - The total route count is preserved (121)
 - Per-domain route counts match what was extracted
 - No (path, method) pair is registered twice
 - All critical endpoint paths exist
 - The aggregator produces the exact same route set as the sum of all domain routers
+- Static paths are not shadowed by path-parameter routes registered before them
 
 No network, no database, no env vars required.
 Run: pytest tests/test_router_structure.py -v
@@ -31,6 +32,7 @@ def all_domain_routers():
         alerts,
         auth,
         channels,
+        dashboard,
         facturas,
         financials,
         investors,
@@ -53,6 +55,7 @@ def all_domain_routers():
         "financials": financials.router,
         "investors": investors.router,
         "alerts": alerts.router,
+        "dashboard": dashboard.router,
         "tools": tools.router,
     }
 
@@ -89,7 +92,7 @@ class TestImports:
         assert hasattr(deps_module, "_require_admin")
 
     def test_all_domain_routers_importable(self, all_domain_routers):
-        assert len(all_domain_routers) == 12
+        assert len(all_domain_routers) == 13
 
     def test_aggregator_importable(self, aggregator_router):
         assert aggregator_router is not None
@@ -106,19 +109,20 @@ class TestImports:
 EXPECTED_DOMAIN_COUNTS = {
     "auth": 11,
     "organizations": 8,
-    "channels": 9,
+    "channels": 10,
     "projects": 14,
-    "leads": 16,
+    "leads": 17,
     "obra": 17,
     "reservations": 13,
     "facturas": 6,
     "financials": 16,
     "investors": 7,
     "alerts": 4,
-    "tools": 5,
+    "dashboard": 1,
+    "tools": 11,
 }
 
-EXPECTED_TOTAL = 126
+EXPECTED_TOTAL = 135
 
 
 class TestRouteCounts:
@@ -185,6 +189,7 @@ CRITICAL_PATHS = [
     ("GET", "/leads"),
     ("PATCH", "/leads/{lead_id}"),
     ("GET", "/leads/{lead_id}"),
+    ("GET", "/leads/{lead_id}/messages"),
     ("GET", "/leads/{lead_id}/handoff"),
     ("POST", "/leads/{lead_id}/handoff/start"),
     ("POST", "/leads/{lead_id}/handoff/close"),
@@ -232,13 +237,22 @@ CRITICAL_PATHS = [
     # alerts
     ("GET", "/alerts"),
     ("POST", "/alerts/read-all"),
+    # dashboard
+    ("GET", "/dashboard"),
     # tools
     ("GET", "/tools/exchange-rates"),
     # jobs
     ("POST", "/jobs/alerts"),
     ("POST", "/jobs/nurturing"),
+    ("POST", "/jobs/archive-conversations"),
+    ("POST", "/jobs/rebuild-cashflow"),
+    ("GET", "/jobs/runs"),
+    ("GET", "/llm-usage"),
+    ("GET", "/llm-status"),
+    ("GET", "/health/dependencies"),
     # channels / kapso
     ("GET", "/tenant-channels"),
+    ("GET", "/agent-config/cache-stats"),
     ("POST", "/kapso/setup-link"),
     ("GET", "/agent-config"),
     # analytics
@@ -279,3 +293,29 @@ class TestDeps:
     def test_get_actor_returns_none_none_without_credentials(self, deps_module):
         result = deps_module._get_actor(None)
         assert result == (None, None)
+
+
+# ---------------------------------------------------------------------------
+# 6. Route resolution (static segments registered before path parameters)
+# ---------------------------------------------------------------------------
+
+def _resolve(router, method: str, path: str):
+    from starlette.routing import Match
+
+    scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+    for route in router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.endpoint
+    return None
+
+
+class TestRouteResolution:
+    @pytest.mark.parametrize("method,path,endpoint", [
+        ("PATCH", "/units/bulk-status", "bulk_update_unit_status"),
+        ("PATCH", "/units/3f1c2a4e-0000-4000-8000-000000000000", "update_unit"),
+        ("PATCH", "/units/3f1c2a4e-0000-4000-8000-000000000000/status", "update_unit_status"),
+    ])
+    def test_path_reaches_handler(self, aggregator_router, method, path, endpoint):
+        resolved = _resolve(aggregator_router, method, path)
+        assert resolved is not None and resolved.__name__ == endpoint
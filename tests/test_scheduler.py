@@ -0,0 +1,88 @@
+"""
+Job scheduler tests (no database required).
+
+Validates that:
+1. cron expressions fire at the expected next time (steps, ranges, day fields)
+2. invalid expressions are rejected
+3. a firing runs only when this worker wins both the advisory lock and the slot
+
+Run: pytest tests/test_scheduler.py -v
+"""
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.scheduler import CronSchedule, Job, JobScheduler
+
+NOW = datetime(2026, 10, 19, 10, 7, 30, tzinfo=timezone.utc)  # a Monday
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("*/30 * * * *", _utc(2026, 10, 19, 10, 30)),
+    ("7 * * * *", _utc(2026, 10, 19, 11, 7)),
+    ("0 8 * * *", _utc(2026, 10, 20, 8, 0)),
+    ("30 4 1 * *", _utc(2026, 11, 1, 4, 30)),
+    ("0 9 * * 6-7", _utc(2026, 10, 24, 9, 0)),
+    ("0 12 * * 0", _utc(2026, 10, 25, 12, 0)),
+    ("0 0 29 2 *", _utc(2028, 2, 29, 0, 0)),
+    # both day fields restricted: either matches
+    ("0 0 1 * 3", _utc(2026, 10, 21, 0, 0)),
+])
+def test_next_after(expr, expected):
+    assert CronSchedule(expr).next_after(NOW) == expected
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "* 24 * * *", "5-1 * * * *", "0 0 31 2 *"])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr).next_after(NOW)
+
+
+def _scheduler_with_conn(lock: bool, run_id):
+    lock_conn = MagicMock()
+    lock_conn.fetchval = AsyncMock(return_value=lock)
+    lock_conn.close = AsyncMock()
+
+    pool = MagicMock()
+    pool.fetchval = AsyncMock(return_value=run_id)
+    pool.fetchrow = AsyncMock(return_value={"id": run_id, "status": "ok"})
+    return lock_conn, pool
+
+
+def _run_once(lock: bool, run_id):
+    lock_conn, pool = _scheduler_with_conn(lock, run_id)
+    func = AsyncMock(return_value={"closed": 2})
+    job = Job("close-stale-handoffs", CronSchedule("*/30 * * * *"), func)
+    with patch("app.database.get_pool", AsyncMock(return_value=pool)), \
+         patch("asyncpg.connect", AsyncMock(return_value=lock_conn)):
+        result = asyncio.run(JobScheduler().run(job, _utc(2026, 10, 19, 10, 30)))
+    return result, func, lock_conn, pool
+
+
+def test_run_when_lock_and_slot_are_won():
+    result, func, lock_conn, pool = _run_once(lock=True, run_id=1)
+    assert result == {"id": 1, "status": "ok"}
+    func.assert_awaited_once()
+    assert "job_runs" in pool.fetchrow.await_args.args[0]
+    lock_conn.close.assert_awaited_once()
+
+
+def test_skip_when_job_running_elsewhere():
+    result, func, lock_conn, pool = _run_once(lock=False, run_id=None)
+    assert result is None
+    func.assert_not_awaited()
+    pool.fetchval.assert_not_awaited()
+    lock_conn.close.assert_awaited_once()
+
+
+def test_skip_when_slot_already_claimed():
+    result, func, lock_conn, pool = _run_once(lock=True, run_id=None)
+    assert result is None
+    func.assert_not_awaited()
+    lock_conn.close.assert_awaited_once()
@@ -0,0 +1,267 @@
+"""
+SSE connection manager / broker tests (no database required).
+
+Validates that:
+1. broadcast reaches every local connection of the tenant, and only that tenant
+2. the Postgres broker delivers other workers' notifications and skips its own
+3. oversize events are published by id instead of inline
+4. queues are bounded and keep only the latest handoff_update per lead
+5. reconnecting with Last-Event-ID replays missed events or asks for a resync
+   (ids reach each worker's connections in order)
+6. `metrics` snapshots are cached per tenant and served without a query
+
+Run: pytest tests/test_sse.py -v
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.sse import (
+    InMemoryBroker,
+    PG_CHANNEL,
+    PG_MAX_INLINE_PAYLOAD,
+    PostgresBroker,
+    SSE_REPLAY_BUFFER,
+    SSEBroker,
+    SSEClientQueue,
+    SSEConnectionManager,
+    SSEEvent,
+)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _event_name(message: str) -> str:
+    return next(line for line in message.split("\n") if line.startswith("event: ")).removeprefix("event: ")
+
+
+class TestInMemoryBroker:
+    def test_broadcast_reaches_tenant_connections_only(self):
+        async def scenario():
+            manager = SSEConnectionManager(InMemoryBroker())
+            await manager.start()
+            a1, a2 = manager.connect("org-a"), manager.connect("org-a")
+            b = manager.connect("org-b")
+            await manager.broadcast("org-a", "message", {"lead_id": "l1"})
+            return a1.qsize(), a2.qsize(), b.qsize(), a1.get_nowait()
+
+        a1, a2, b, ev = _run(scenario())
+        assert (a1, a2, b) == (1, 1, 0)
+        assert _event_name(ev.message) == "message"
+        assert ev.message.startswith(f"id: {ev.id}\n")
+
+    def test_broadcast_without_start_delivers_locally(self):
+        async def scenario():
+            manager = SSEConnectionManager()
+            q = manager.connect("org-a")
+            await manager.broadcast("org-a", "handoff_update", {"lead_id": "l1"})
+            return q.qsize()
+
+        assert _run(scenario()) == 1
+
+
+class TestPostgresBroker:
+    def _manager(self):
+        broker = PostgresBroker("postgresql://unused")
+        manager = SSEConnectionManager(broker)
+        broker._manager = manager
+        return manager, broker
+
+    def test_notification_from_other_worker_is_delivered(self):
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            payload = json.dumps({"w": "other", "t": "org-a", "e": "message", "d": {"x": 1}})
+            broker._on_notify(None, 0, PG_CHANNEL, payload)
+            return q.qsize()
+
+        assert _run(scenario()) == 1
+
+    def test_own_notification_is_skipped(self):
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            payload = json.dumps({"w": broker.worker_id, "t": "org-a", "e": "message", "d": {}})
+            broker._on_notify(None, 0, PG_CHANNEL, payload)
+            return q.qsize()
+
+        assert _run(scenario()) == 0
+
+    def test_oversize_event_is_published_by_id(self):
+        pool = AsyncMock()
+        pool.fetchval.return_value = 42
+
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            with patch("app.database.get_pool", AsyncMock(return_value=pool)):
+                await broker.publish("org-a", "message", {"content": "x" * (PG_MAX_INLINE_PAYLOAD + 1)})
+            return q.qsize()
+
+        assert _run(scenario()) == 1  # local delivery is immediate
+        notify_args = pool.execute.await_args_list[0].args
+        assert notify_args[1] == PG_CHANNEL
+        assert json.loads(notify_args[2])["id"] == 42
+
+
+    def test_stored_payload_fetch_is_tracked_until_delivered(self):
+        pool = AsyncMock()
+        pool.fetchrow.return_value = {"tenant_id": "org-a", "event": "message", "data": '{"x": 1}'}
+
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            with patch("app.database.get_pool", AsyncMock(return_value=pool)):
+                payload = json.dumps({"w": "other", "t": "org-a", "e": "message", "id": 7, "i": 30})
+                broker._on_notify(None, 0, PG_CHANNEL, payload)
+                pending = len(broker._fetches)
+                await asyncio.gather(*broker._fetches)
+            return pending, len(broker._fetches), q.get_nowait().data
+
+        assert _run(scenario()) == (1, 0, {"x": 1})
+
+    def test_out_of_order_ids_are_delivered_in_order(self):
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            for i in (10, 12, 11):
+                payload = json.dumps({"w": "other", "t": "org-a", "e": "message", "d": {}, "i": i})
+                broker._on_notify(None, 0, PG_CHANNEL, payload)
+            return [q.get_nowait().id for _ in range(q.qsize())]
+
+        assert _run(scenario()) == [10, 11, 12]
+
+    def test_missing_id_is_skipped_after_wait(self):
+        async def scenario():
+            manager, broker = self._manager()
+            q = manager.connect("org-a")
+            with patch("app.core.sse.SSE_REORDER_WAIT", 0.01):
+                for i in (10, 12):
+                    payload = json.dumps({"w": "other", "t": "org-a", "e": "message", "d": {}, "i": i})
+                    broker._on_notify(None, 0, PG_CHANNEL, payload)
+                held = q.qsize()
+                await asyncio.sleep(0.05)
+            return held, [q.get_nowait().id for _ in range(q.qsize())]
+
+        assert _run(scenario()) == (1, [10, 12])
+
+
+    def test_broker_must_implement_publish(self):
+        class Incomplete(SSEBroker):
+            pass
+
+        with pytest.raises(TypeError):
+            Incomplete()
+
+
+class TestClientQueue:
+    def test_handoff_updates_coalesce_per_lead(self):
+        async def scenario():
+            q = SSEClientQueue()
+            q.put_nowait(SSEEvent(1, "handoff_update", {"lead_id": "l1", "handoff_active": True}))
+            q.put_nowait(SSEEvent(2, "message", {"lead_id": "l1"}))
+            q.put_nowait(SSEEvent(3, "handoff_update", {"lead_id": "l2", "handoff_active": True}))
+            q.put_nowait(SSEEvent(4, "handoff_update", {"lead_id": "l1", "handoff_active": False}))
+            return [q.get_nowait().id for _ in range(q.qsize())]
+
+        assert _run(scenario()) == [2, 3, 4]
+
+    def test_overflow_drops_oldest(self):
+        async def scenario():
+            q = SSEClientQueue(maxsize=3)
+            for i in range(5):
+                q.put_nowait(SSEEvent(i, "message", {"n": i}))
+            return q.dropped, [q.get_nowait().id for _ in range(q.qsize())]
+
+        assert _run(scenario()) == (2, [2, 3, 4])
+
+
+class TestReplay:
+    def _manager_with_events(self, n: int):
+        manager = SSEConnectionManager()
+        for i in range(1, n + 1):
+            manager.deliver("org-a", "message", {"n": i}, i)
+        return manager
+
+    def test_reconnect_replays_missed_events(self):
+        async def scenario():
+            manager = self._manager_with_events(5)
+            q = manager.connect("org-a", last_event_id=3)
+            return [q.get_nowait().id for _ in range(q.qsize())]
+
+        assert _run(scenario()) == [4, 5]
+
+    def test_reconnect_past_ring_buffer_gets_resync(self):
+        async def scenario():
+            manager = self._manager_with_events(SSE_REPLAY_BUFFER + 10)
+            q = manager.connect("org-a", last_event_id=2)
+            return [q.get_nowait().event for _ in range(q.qsize())]
+
+        assert _run(scenario()) == ["resync"]
+
+    def test_reconnect_with_unknown_id_gets_resync(self):
+        async def scenario():
+            manager = self._manager_with_events(5)
+            q = manager.connect("org-a", last_event_id=9)
+            return [q.get_nowait().event for _ in range(q.qsize())]
+
+        assert _run(scenario()) == ["resync"]
+
+    def test_reconnect_to_fresh_worker_gets_resync(self):
+        async def scenario():
+            q = SSEConnectionManager().connect("org-a", last_event_id=10)
+            return q.get_nowait().event
+
+        assert _run(scenario()) == "resync"
+
+
+class TestMetricsSnapshot:
+    def test_latest_metrics_is_cached_and_coalesced(self):
+        async def scenario():
+            manager = SSEConnectionManager()
+            q = manager.connect("org-a")
+            manager.deliver("org-a", "metrics", {"unread_alerts": 1}, 1)
+            manager.deliver("org-a", "metrics", {"unread_alerts": 2}, 2)
+            return manager.latest("org-a", "metrics"), [q.get_nowait().id for _ in range(q.qsize())]
+
+        latest, queued = _run(scenario())
+        assert latest == {"unread_alerts": 2}
+        assert queued == [2]
+
+    def test_snapshot_served_from_cache(self):
+        from app.core import live_metrics
+
+        pool = AsyncMock()
+
+        async def scenario():
+            with patch.object(live_metrics, "connection_manager", SSEConnectionManager()) as manager, \
+                 patch("app.core.live_metrics.get_pool", AsyncMock(return_value=pool)):
+                manager.remember("org-a", "metrics", {"active_handoffs": 3})
+                return await live_metrics.snapshot("org-a")
+
+        assert _run(scenario()) == {"active_handoffs": 3}
+        pool.fetchrow.assert_not_awaited()
+
+    def test_flush_without_connections_skips_recount(self):
+        from app.core import live_metrics
+
+        pool = AsyncMock()
+
+        async def scenario():
+            with patch.object(live_metrics, "connection_manager", SSEConnectionManager()) as manager, \
+                 patch.object(live_metrics, "DEBOUNCE_SECONDS", 0), \
+                 patch("app.core.live_metrics.get_pool", AsyncMock(return_value=pool)):
+                manager.remember("org-a", "metrics", {"active_handoffs": 3})
+                manager.signal = AsyncMock()
+                live_metrics.touch("org-a")
+                await live_metrics._pending["org-a"]
+                return manager
+
+        manager = _run(scenario())
+        pool.fetchrow.assert_not_awaited()
+        assert manager.latest("org-a", "metrics") is None
+        manager.signal.assert_awaited_once_with("org-a", live_metrics.METRICS_STALE)
@@ -0,0 +1,88 @@
+"""
+Prompt token budget tests (no API calls).
+
+Validates that:
+1. everything is kept when it fits
+2. sections are given up in priority order: documents, then history, then units
+3. history is trimmed from the oldest message and never opens with the assistant
+4. PDF pages are counted from the page objects, or from the file size when
+   they are hidden in object streams
+
+Run: pytest tests/test_token_budget.py -v
+"""
+from app.modules.agent.token_budget import (
+    PDF_BYTES_PER_PAGE,
+    PDF_MAX_BYTES_PER_PAGE,
+    TOKENS_PER_PDF_PAGE,
+    UNITS_TRIMMED_NOTE,
+    count_pdf_pages,
+    estimate_tokens,
+    fit_prompt,
+)
+
+SYSTEM = "Sos un asistente inmobiliario." * 10
+UNITS = "\n".join(f"  - {n} amb: 3 (45 m² a 60 m²; USD 95,000 a USD 120,000)" for n in range(1, 40))
+
+
+def _history(n):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"mensaje número {i} " * 20}
+        for i in range(n)
+    ]
+
+
+def _docs(*pages):
+    return [({"type": "document", "title": f"doc {i}"}, p) for i, p in enumerate(pages)]
+
+
+def _fit(budget, history=None, docs=None, message="Hola, busco un 2 ambientes"):
+    return fit_prompt(budget, SYSTEM, [], message, UNITS, history or [], docs or [])
+
+
+def test_everything_fits():
+    prompt = _fit(100_000, _history(10), _docs(2, 3))
+    assert prompt.unit_state == UNITS
+    assert len(prompt.history) == 10
+    assert len(prompt.documents) == 2
+    assert prompt.sizes["documents"] == 5 * TOKENS_PER_PDF_PAGE
+    assert prompt.sizes["total"] <= 100_000
+
+
+def test_documents_dropped_before_history():
+    base = _fit(100_000, _history(10)).sizes["total"]
+    prompt = _fit(base + TOKENS_PER_PDF_PAGE, _history(10), _docs(5, 1))
+    assert len(prompt.history) == 10
+    assert [b["title"] for b in prompt.documents] == ["doc 1"]
+    assert prompt.dropped == {"history": 0, "documents": 1}
+
+
+def test_history_keeps_newest_and_starts_with_user():
+    full = _fit(100_000, _history(10))
+    prompt = _fit(full.sizes["total"] - full.sizes["history"] // 2, _history(10))
+    assert 0 < len(prompt.history) < 10
+    assert prompt.history[-1] == _history(10)[-1]
+    assert prompt.history[0]["role"] == "user"
+
+
+def test_units_trimmed_last_message_kept():
+    fixed = estimate_tokens(SYSTEM)
+    prompt = _fit(fixed + 100, _history(4), _docs(1))
+    assert prompt.user_message == "Hola, busco un 2 ambientes"
+    assert prompt.unit_state.endswith(UNITS_TRIMMED_NOTE)
+    assert prompt.history == [] and prompt.documents == []
+    assert prompt.sizes["total"] <= fixed + 100
+
+
+def test_count_pdf_pages():
+    pdf = b"%PDF-1.4 1 0 obj <</Type /Pages /Count 2>> 2 0 obj <</Type /Page>> 3 0 obj <</Type/Page /Parent 1 0 R>>"
+    assert count_pdf_pages(pdf) == 2
+    assert count_pdf_pages(b"%PDF-1.4 garbage") == 1
+
+
+def test_count_pdf_pages_falls_back_to_file_size():
+    # PDF 1.5+ with every page object inside a compressed object stream
+    compressed = b"%PDF-1.5 <</Type /ObjStm /Filter /FlateDecode>> stream" + b"\x00" * (PDF_BYTES_PER_PAGE * 12)
+    assert count_pdf_pages(compressed) == 13
+    # One visible page object in a file far too large for a single page
+    hybrid = b"%PDF-1.5 <</Type /Page>>" + b"\x00" * (PDF_MAX_BYTES_PER_PAGE * 3)
+    assert count_pdf_pages(hybrid) == 4